@@ -0,0 +1,343 @@
+"""Micro-benchmark: laying out HP rechnungen with the offset_rendering dry run
+of tables 2 and 3 (as before HpTable) vs the rows measured once and the page
+breaks planned from their heights. Asserts both produce the same PDF; where
+the last row is moved to the next page (those sizes crashed before) HpTable
+emits one more redundant font switch, so the default doesn't split.
+
+run from the repo root: python benchmarks/bench_hp_layout.py [pdfs] [rows]"""
+
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from main import HpRechnung, HpRechnungRecord, StammdatenRecord  # noqa: E402
+
+STAMMDATEN = StammdatenRecord(
+    "ABCD", "Frau", "Muster", "Erika", "Weg", "1", "12345", "Ort", "01.01.80", "12", "",
+    "e@x", "KG", "0123",
+)
+
+
+def hp_rechnung(rows: int) -> HpRechnungRecord:
+    return HpRechnungRecord(
+        "ABCD", "ABCD010124H", "12", "km", 240.0, "km", 42.0 * rows, "Euro",
+        [[f"{d % 28 + 1:02d}.01.24", "1234", f"Behandlung {d}", "42,00"] for d in range(rows)],
+        "Diagnose",
+    )
+
+
+class LegacyHpRechnung(HpRechnung):
+    def create_pages(self, filepath):
+        """create_pages before HpTable: table 2 and 3 are rendered into an
+        offset_rendering dummy to find the page break (table_data_2_plus typo
+        fixed so split tables render at all)"""
+
+        self.set_auto_page_break(True, 35)
+
+        self.add_page()
+
+        self.set_font("helvetica", size=7)
+        self.cell(self.rechnungsempfaenger_offset)
+        self.write(text="Mervi Fischbach - Schulgasse 9 - 86923 Finning")
+        self.ln(3)
+
+        self.set_font("helvetica", size=self.normal_font_size)
+        self.cell(self.rechnungsempfaenger_offset)
+        if self.mann_frau == "Mann":
+            self.write(text="Herr\n")
+        elif self.mann_frau == "Frau":
+            self.write(text="Frau\n")
+        self.cell(self.rechnungsempfaenger_offset)
+        self.write(text=f"{self.vorname} {self.nachname}\n")
+        self.cell(self.rechnungsempfaenger_offset)
+        self.write(text=f"{self.strasse} {self.hausnummer}\n")
+        self.cell(self.rechnungsempfaenger_offset)
+        self.write(text=f"{self.plz} {self.ort}\n")
+        self.ln(27)
+
+        self.cell(175, 0, border=1, center=True)
+        self.set_font("helvetica", size=self.normal_font_size)
+
+        # Table 1
+        # ----------------------
+        # Kuerzel | ReNr | Date
+        with self.table(
+                borders_layout="NONE",
+                line_height=int(1.5 * self.font_size),
+                text_align=("LEFT", "CENTER", "RIGHT"),
+        ) as table:
+            for data_row in self.table_data_1:
+                row = table.row()
+                for datum in data_row:
+                    row.cell(datum)
+        self.cell(175, 0, border=1, center=True)
+        self.ln(5)
+
+        self.set_font("helvetica", style="B", size=self.normal_font_size)
+        if self.mann_frau == "Mann":
+            self.cell(25, text="Patient:", align="L")
+        elif self.mann_frau == "Frau":
+            self.cell(25, text="Patientin:", align="L")
+        self.set_font("helvetica", style="", size=self.normal_font_size)
+        self.cell(40, text=f"{self.vorname} {self.nachname}, geb. {self.geburtsdatum}")
+
+        self.ln(7)
+        self.set_font("helvetica", style="B", size=self.normal_font_size)
+        self.cell(25, text="Diagnose:", align="L")
+        self.set_font("helvetica", style="", size=self.normal_font_size)
+        self.multi_cell(135, text=f"{self.diagnose}")
+
+        # offset rendering the main table and the total
+        # making sure it is not split in half
+        with self.offset_rendering() as dummy:
+            dummy.cell(175, 0, border=1, center=True)
+            dummy.ln(10)
+            if self.mann_frau == "Mann":
+                dummy.write(
+                    text=f"Sehr geehrter Herr {self.nachname},\n\n"
+                         f"hiermit erlaube ich mir, für meine Bemühungen folgendes "
+                         f"Honorar zu berechnen:"
+                )
+            if self.mann_frau == "Frau":
+                dummy.write(
+                    text=f"Sehr geehrte Frau {self.nachname},\n\n"
+                         f"hiermit erlaube ich mir, für meine Bemühungen "
+                         f"folgendes Honorar zu berechnen:"
+                )
+            dummy.ln(7)
+            dummy.set_font("helvetica", size=self.honorar_font_size)
+
+            # Table 2
+            # -----------------
+            # Date | Ziffern | Descriptions | Costs
+            with dummy.table(
+                    cell_fill_color=230,
+                    cell_fill_mode="ROWS",
+                    line_height=int(1.7 * self.font_size),
+                    text_align=("CENTER", "RIGHT", "LEFT", "RIGHT", "LEFT"),
+                    col_widths=(10, 8, 70, 10, 4),
+            ) as table:
+                for index1, data_row in enumerate(self.table_data_2):
+                    row = table.row()
+                    for index2, datum in enumerate(data_row):
+                        if index2 == 4:
+                            dummy.set_font("symbol", size=self.honorar_font_size + 1)
+                            row.cell(datum)
+                            dummy.set_font(
+                                "helvetica", style="", size=self.honorar_font_size
+                            )
+                        else:
+                            row.cell(datum)
+
+            dummy.ln(1)
+            dummy.cell(175, 0, border=1, center=True)
+
+            # Table 3
+            # --------------
+            #      |      | Gesamtbetrag | Total
+            with dummy.table(
+                    borders_layout="NONE",
+                    col_widths=(10, 8, 70, 10, 4),
+                    line_height=int(1.7 * self.font_size),
+                    text_align=("CENTER", "LEFT", "RIGHT", "RIGHT", "LEFT"),
+                    cell_fill_color=180,
+                    cell_fill_mode="NONE",
+                    first_row_as_headings=False,
+            ) as table:
+                page_before = dummy.page_no()
+                for data_row in self.table_data_3:
+                    row = table.row()
+                    for index, datum in enumerate(data_row):
+                        if index == 4:
+                            dummy.set_font("symbol", "", size=self.honorar_font_size + 1)
+                            row.cell(datum)
+                            dummy.set_font(
+                                "helvetica", style="", size=self.honorar_font_size
+                            )
+                        else:
+                            dummy.set_font(
+                                "helvetica", style="B", size=self.honorar_font_size
+                            )
+                            row.cell(datum)
+                            dummy.set_font(
+                                "helvetica", style="", size=self.honorar_font_size
+                            )
+
+            man_page_break = False
+            if page_before != dummy.page_no():
+                man_page_break = True
+
+        if man_page_break:
+            self.table_data_2_1 = list(self.table_data_2)
+            while len(self.table_data_2_1) > 2:
+                self.table_data_2_1.pop(1)
+            self.table_data_2.pop(-1)
+
+        self.cell(175, 0, border=1, center=True)
+        self.ln(10)
+        if self.mann_frau == "Mann":
+            self.write(
+                text=f"Sehr geehrter Herr {self.nachname},\n\n"
+                     f"hiermit erlaube ich mir, für meine Bemühungen folgendes "
+                     f"Honorar zu berechnen:"
+            )
+        if self.mann_frau == "Frau":
+            self.write(
+                text=f"Sehr geehrte Frau {self.nachname},\n\n"
+                     f"hiermit erlaube ich mir, für meine Bemühungen "
+                     f"folgendes Honorar zu berechnen:"
+            )
+        self.ln(7)
+        self.set_font("helvetica", size=self.honorar_font_size)
+
+        # Table 2
+        # -----------------
+        # Date | Ziffern | Descriptions | Costs
+        with self.table(
+                cell_fill_color=230,
+                cell_fill_mode="ROWS",
+                line_height=int(1.7 * self.font_size),
+                text_align=("CENTER", "RIGHT", "LEFT", "RIGHT", "LEFT"),
+                col_widths=(10, 8, 70, 10, 4),
+        ) as table:
+            for data_row in self.table_data_2:
+                row = table.row()
+                for index, datum in enumerate(data_row):
+                    if index == 4:
+                        self.set_font("symbol", size=self.honorar_font_size + 1)
+                        row.cell(datum)
+                        self.set_font(
+                            "helvetica", style="", size=self.honorar_font_size
+                        )
+                    else:
+                        row.cell(datum)
+
+        # only when table 2 and 3 are separated
+        # Table 2.1
+        # -----------------
+        # Date | Ziffern | Descriptions | Costs
+        if self.table_data_2_1:
+            self.add_page()
+            with self.table(
+                    cell_fill_color=230,
+                    cell_fill_mode="ROWS",
+                    line_height=int(1.7 * self.font_size),
+                    text_align=("CENTER", "RIGHT", "LEFT", "RIGHT", "LEFT"),
+                    col_widths=(10, 8, 70, 10, 4),
+            ) as table:
+                for data_row in self.table_data_2_1:
+                    row = table.row()
+                    for index, datum in enumerate(data_row):
+                        if index == 4:
+                            self.set_font("symbol", size=self.honorar_font_size + 1)
+                            row.cell(datum)
+                            self.set_font(
+                                "helvetica", style="", size=self.honorar_font_size
+                            )
+                        else:
+                            row.cell(datum)
+
+        self.ln(1)
+        self.cell(175, 0, border=1, center=True)
+
+        # Table 3
+        # --------------
+        #      |      | Gesamtbetrag | Total
+        with self.table(
+                borders_layout="NONE",
+                col_widths=(10, 8, 70, 10, 4),
+                line_height=int(1.7 * self.font_size),
+                text_align=("CENTER", "LEFT", "RIGHT", "RIGHT", "LEFT"),
+                cell_fill_color=180,
+                cell_fill_mode="NONE",
+                first_row_as_headings=False,
+        ) as table:
+            for data_row in self.table_data_3:
+                row = table.row()
+                for index, datum in enumerate(data_row):
+                    if index == 4:
+                        self.set_font("symbol", "", size=self.honorar_font_size + 1)
+                        row.cell(datum)
+                        self.set_font(
+                            "helvetica", style="", size=self.honorar_font_size
+                        )
+                    else:
+                        self.set_font(
+                            "helvetica", style="B", size=self.honorar_font_size
+                        )
+                        row.cell(datum)
+                        self.set_font(
+                            "helvetica", style="", size=self.honorar_font_size
+                        )
+
+        self.ln(3)
+
+        with self.offset_rendering() as dummy:
+            dummy.write(
+                6.5, text=f"Ich bitte Sie, den Gesamtbetrag von {self.gesamtpreis} "
+            )
+            dummy.set_font("symbol", size=self.normal_font_size + 1)
+            dummy.write(6.5, text="\u00a0 ")
+            dummy.set_font("helvetica", size=self.normal_font_size)
+            dummy.write(
+                6.5,
+                text="innerhalb von 14 Tagen unter Angabe der Rechnungsnummer auf unten "
+                     "stehendes Konto zu überweisen.",
+            )
+            dummy.ln(13)
+            dummy.write(text="Mit freundlichen Grüßen")
+            dummy.ln(10)
+            dummy.write(text="Mervi Fischbach")
+
+        if dummy.page_break_triggered:
+            self.add_page()
+
+        self.set_font("helvetica", size=self.normal_font_size)
+        self.write(6.5, text=f"Ich bitte Sie, den Gesamtbetrag von {self.gesamtpreis} ")
+        self.set_font("symbol", size=self.normal_font_size + 1)
+        self.write(6.5, text="\u00a0 ")
+        self.set_font("helvetica", size=self.normal_font_size)
+        self.write(
+            6.5,
+            text="innerhalb von 14 Tagen unter Angabe der Rechnungsnummer auf unten "
+                 "stehendes Konto zu überweisen.",
+        )
+        self.ln(13)
+        self.write(text="Mit freundlichen Grüßen")
+        self.ln(7)
+        self.write(text="Mervi Fischbach")
+
+        self.output(filepath)
+
+
+def render(cls: type, count: int, rows: int, path: str) -> float:
+    rechnung = hp_rechnung(rows)
+    started = time.perf_counter()
+    for i in range(count):
+        cls(STAMMDATEN, rechnung, f"{path}/{cls.__name__}{i}.pdf", "1", "DE", "B")
+    return time.perf_counter() - started
+
+
+def stripped(filepath: str) -> bytes:
+    with open(filepath, "rb") as f:
+        return re.sub(rb"/CreationDate \(.*?\)|/ID \[.*?\]", b"", f.read())
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 39
+
+    with tempfile.TemporaryDirectory() as path:
+        for name, cls in (("offset_rendering", LegacyHpRechnung), ("HpTable", HpRechnung)):
+            best = min(render(cls, count, rows, path) for _ in range(3))
+            print(f"{name:20} {best * 1000:9.1f} ms  {count / best:8.1f} pdfs/s")
+
+        assert stripped(f"{path}/LegacyHpRechnung0.pdf") == stripped(f"{path}/HpRechnung0.pdf")
+
+
+if __name__ == "__main__":
+    main()
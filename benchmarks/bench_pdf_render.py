@@ -0,0 +1,129 @@
+"""Micro-benchmark: rendering KG/HP rechnungen with the header before PdfAssets,
+which reads ./system/components/images/logo.png again for every document, vs
+the logo shared through PdfAssets.
+
+python benchmarks/bench_pdf_render.py [pdfs] [logo.png]
+runs in a temporary directory, without a logo a random 600x600 png is used"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fpdf.enums import XPos, YPos  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from main import (  # noqa: E402
+    HpRechnung,
+    HpRechnungRecord,
+    KgRechnung,
+    KgRechnungRecord,
+    PdfAssets,
+    StammdatenRecord,
+)
+
+STAMMDATEN = StammdatenRecord(
+    "ABCD", "Frau", "Muster", "Erika", "Weg", "1", "12345", "Ort", "01.01.80", "12", "",
+    "e@x", "KG", "0123",
+)
+
+
+def kg_rechnung(i: int) -> KgRechnungRecord:
+    return KgRechnungRecord(
+        "ABCD", f"ABCD{i % 28 + 1:02d}0124", "12", "km", 240.0, "km", 850.0, "Euro",
+        *[f"{d + 1:02d}.01.24" for d in range(10)],
+        [f"Behandlungsart {b}" for b in range(5)], [b * 10.0 for b in range(5)],
+    )
+
+
+def hp_rechnung(i: int) -> HpRechnungRecord:
+    return HpRechnungRecord(
+        "ABCD", f"ABCD{i % 28 + 1:02d}0124H", "12", "km", 240.0, "km", 850.0, "Euro",
+        [[f"{d + 1:02d}.01.24", "1234", f"Behandlung {d}", "42,00"] for d in range(8)],
+        "Diagnose",
+    )
+
+
+LOGO = "./system/components/images/logo.png"
+
+
+class BaselineHeader:
+    """the header before PdfAssets"""
+
+    def header(self):
+        try:
+            self.image(x=22, y=17, name=LOGO, w=18, alt_text="Logo")
+        except FileNotFoundError:
+            pass
+        self.set_font("helvetica", "B", 14)
+        self.cell(0, new_x=XPos.LMARGIN, new_y=YPos.TMARGIN)
+        self.ln(2.5)
+        self.cell(25)
+        self.cell(0, text="Mervi Fischbach", align="L")
+        self.ln()
+        self.cell(25)
+        self.set_font("helvetica", "B", 12)
+        self.set_text_color(150)
+        self.cell(0, text="Heilpraktikerin &", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        self.cell(25)
+        self.cell(0, text="Physiotherapeutin")
+        self.ln(23)
+
+
+class BaselineKgRechnung(BaselineHeader, KgRechnung):
+    pass
+
+
+class BaselineHpRechnung(BaselineHeader, HpRechnung):
+    pass
+
+
+def render(count: int, path: str, baseline: bool) -> float:
+    # without a logo at PdfAssets.logo_path nothing is shared and the baseline
+    # header reads LOGO itself
+    PdfAssets.logo_path = "./missing.png" if baseline else LOGO
+    PdfAssets.loaded = False
+    kg, hp = (BaselineKgRechnung, BaselineHpRechnung) if baseline else (KgRechnung, HpRechnung)
+
+    started = time.perf_counter()
+    for i in range(count):
+        if i % 2:
+            kg(STAMMDATEN, kg_rechnung(i), f"{path}/{i}.pdf", "1", "DE", "B")
+        else:
+            hp(STAMMDATEN, hp_rechnung(i), f"{path}/{i}.pdf", "1", "DE", "B")
+    return time.perf_counter() - started
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+    logo_arg = os.path.abspath(sys.argv[2]) if len(sys.argv) > 2 else None
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as path:
+        os.chdir(path)
+        os.makedirs(os.path.dirname(LOGO))
+        if logo_arg:
+            shutil.copy(logo_arg, LOGO)
+        else:
+            random.seed(0)
+            logo = Image.new("RGB", (600, 600))
+            logo.putdata(
+                [tuple(random.randrange(256) for _ in range(3)) for _ in range(600 * 600)]
+            )
+            logo.save(LOGO)
+
+        try:
+            for name, baseline in (("baseline header", True), ("PdfAssets", False)):
+                best = min(render(count, path, baseline) for _ in range(3))
+                print(f"{name:20} {best * 1000:9.1f} ms  {count / best:8.1f} pdfs/s")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Micro-benchmark: decoding a year of rechnungen rows with the old
+ast.literal_eval path vs RechnungCodec (json cells).
+
+run from the repo root: python benchmarks/bench_row_codec.py [rows]"""
+
+import ast
+import csv
+import io
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from main import RechnungCodec  # noqa: E402
+
+
+def kg_row(i: int) -> list:
+    return (
+        ["ABCD", f"ABCD{i % 28 + 1:02d}0124", "12", "km", "240.0", "km", "850.0", "Euro"]
+        + [f"{d + 1:02d}.01.24" for d in range(10)]
+        + [[f"Behandlungsart {b}" for b in range(5)], [f"{b}0.00" for b in range(5)]]
+    )
+
+
+def hp_row(i: int) -> list:
+    return [
+        "ABCD", f"ABCD{i % 28 + 1:02d}0124H", "12", "km", "240.0", "km", "850.0", "Euro",
+        [[f"{d + 1:02d}.01.24", "1234", f"Behandlung {d}", "42.00"] for d in range(8)],
+        "Diagnose",
+    ]
+
+
+def csv_text(rows: list) -> str:
+    f = io.StringIO()
+    csv.writer(f, delimiter=";").writerows(rows)
+    return f.getvalue()
+
+
+def legacy_decode(text: str) -> list:
+    """the decoding done before by edit_rechnung_button_event/store_draft"""
+
+    rows = []
+    for row in csv.reader(io.StringIO(text), delimiter=";"):
+        if row[1].endswith("H"):
+            row[8] = ast.literal_eval(row[8])
+        else:
+            row[18] = ast.literal_eval(row[18])
+            row[19] = ast.literal_eval(row[19])
+        rows.append(row)
+    return rows
+
+
+def codec_decode(text: str) -> list:
+    return list(RechnungCodec.iter_decode(io.StringIO(text)))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rows = [kg_row(i) if i % 2 else hp_row(i) for i in range(count)]
+
+    legacy = csv_text(rows)
+    encoded = csv_text([RechnungCodec.encode(row) for row in rows])
+
+    assert legacy_decode(legacy) == codec_decode(encoded) == codec_decode(legacy)
+
+    for name, func, text in (
+            ("ast.literal_eval (legacy rows)", legacy_decode, legacy),
+            (f"RechnungCodec ({RechnungCodec.version} rows)", codec_decode, encoded),
+            ("RechnungCodec (legacy rows)", codec_decode, legacy),
+    ):
+        best = min(timeit.repeat(lambda: func(text), number=1, repeat=5))
+        print(f"{name:32} {best * 1000:9.1f} ms  {count / best:10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
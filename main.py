@@ -1,18 +1,35 @@
+import abc
 import ast
+import collections
+import contextlib
+import copy
 import csv
-import fileinput
+import ctypes
+import ctypes.util
+import hashlib
+import heapq
+import io
+import itertools
+import json
 import logging
+import mmap
 import multiprocessing
 import os
 import platform
+import queue
 import re
+import select
 import shutil
+import sqlite3
+import struct
 import subprocess
 import sys
 import threading
 import time
 import tkinter as tk
 import urllib.request
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from tkinter import filedialog, messagebox, ttk
 from urllib.error import HTTPError, URLError
 
@@ -20,6 +37,7 @@ import customtkinter
 import yaml
 from PIL import Image
 from fpdf import FPDF, XPos, YPos
+from fpdf.table import Table
 
 try:
     from system.updater.updater import Updater
@@ -67,11 +85,33 @@ class App(customtkinter.CTk):
     rechnung_loeschen_interface = None
     documents_interface = None
     einstellungen_interface = None
+    uebersicht_interface = None
     toplevel_window = None
 
     # currently active interface
     open_interface = None
 
+    # storage backend (csv or sqlite)
+    storage_backend = "csv"
+    storage = None
+    journal = None
+    rollups = None
+    integrity_scanner = None
+    stammdaten_repository = None
+    # stammdaten in one file per patient (dateien) or in one file (datei)
+    stammdaten_store = "dateien"
+    file_watcher = None
+    draft_autosave = None
+    draft_registry = None
+    pdf_renderer = None
+    render_cache = None
+    # threads loading the caches in the background after startup
+    warm_up_workers = 4
+    # kuerzel per warm-up task
+    warm_up_chunk = 250
+    # share of deleted rows in rechnungen-{year}.csv that triggers compaction
+    compaction_ratio = 0.25
+
     # default update_availability
     update_available = False
 
@@ -85,6 +125,11 @@ class App(customtkinter.CTk):
     sleep_time = 10
 
     def __init__(self):
+        # startup and first query timings
+        self.start_time = time.perf_counter()
+        self.first_queries = set()
+        self.warm_up_pending = set()
+
         # customtkinter setup
         customtkinter.set_appearance_mode("dark")
         customtkinter.set_default_color_theme("dark-blue")
@@ -120,6 +165,15 @@ class App(customtkinter.CTk):
 
         self.load_user_data()
 
+        self.draft_autosave = DraftAutosave(self)
+        self.bind_all("<KeyRelease>", self.draft_autosave.schedule, add="+")
+        self.bind_all("<ButtonRelease-1>", self.draft_autosave.schedule, add="+")
+        self.pdf_renderer = PdfRenderer(self)
+
+        self.warm_up()
+
+        self.poll_file_events()
+
         self.mainloop()
 
     # Update functions
@@ -516,6 +570,9 @@ class App(customtkinter.CTk):
                         "backups_enabled": self.backups_enabled,
                         "logs_enabled": self.logs_enabled,
                         "log_location": self.log_location,
+                        "storage_backend": self.storage_backend,
+                        "compaction_ratio": self.compaction_ratio,
+                        "stammdaten_store": self.stammdaten_store,
                     },
                     f,
                 )
@@ -536,6 +593,15 @@ class App(customtkinter.CTk):
             self.logs_enabled = properties_dict["logs_enabled"]
             self.log_location = properties_dict["log_location"]
 
+        # properties added in later versions
+        for key in ("storage_backend", "compaction_ratio", "stammdaten_store"):
+            try:
+                setattr(self, key, properties_dict[key])
+            except KeyError:
+                properties_dict[key] = getattr(self, key)
+                with open("./system/properties.yml", "w") as f:
+                    yaml.dump(properties_dict, f)
+
         check_dir(f"{self.log_location}")
         setup_logging()
 
@@ -556,6 +622,9 @@ class App(customtkinter.CTk):
             if check_dir(dir_path):
                 logging.info(f"created {dir_path} dir")
 
+        self.setup_storage()
+        self.journal.replay()
+
     def load_user_data(self):
         """Loads the user data out of csv file"""
 
@@ -615,7 +684,7 @@ class App(customtkinter.CTk):
         """Calls the store_draft function and creates the interface to create a new KGRechnung by
         calling the class KGRechnungInterface.
 
-        :type args: data out of rechnungen-*.csv or *-DRAFT-*.csv"""
+        :type args: KgRechnungRecord out of rechnungen-*.csv or a draft"""
 
         logging.debug("App.kg_rechnung() called")
         if not self.store_draft():
@@ -634,7 +703,7 @@ class App(customtkinter.CTk):
         """Calls the store_draft function and creates the interface to create a new HPRechnung by
         calling the class HPRechnungInterface
 
-        :type args: data out of rechnungen-*.csv or *-DRAFT-*.csv"""
+        :type args: HpRechnungRecord out of rechnungen-*.csv or a draft"""
 
         logging.debug("App.hp_rechnung() called")
         if not self.store_draft():
@@ -693,6 +762,21 @@ class App(customtkinter.CTk):
             self.clear_interfaces()
             self.rechnung_loeschen_interface = RechnungenInterface(self)
 
+    def uebersicht(self):
+        """Calls the store_draft function and creates the Uebersicht Interface by
+        calling the class UebersichtInterface"""
+
+        logging.debug("App.uebersicht() called")
+        if not self.store_draft():
+            return
+        self.open_interface = "ue"
+        if (
+                self.uebersicht_interface is None
+                or not self.uebersicht_interface.winfo_exists()
+        ):
+            self.clear_interfaces()
+            self.uebersicht_interface = UebersichtInterface(self)
+
     def einstellungen(self):
         """Calls the store_draft function and creates the Einstellungen Interface by
         calling the class EinstellungenInterface"""
@@ -751,212 +835,50 @@ class App(customtkinter.CTk):
             self.einstellungen_interface.destroy()
         except AttributeError:
             pass
+        try:
+            self.uebersicht_interface.destroy()
+        except AttributeError:
+            pass
 
         self.kg_interface = None
         self.hp_interface = None
         self.stammdaten_interface = None
         self.rechnung_loeschen_interface = None
         self.einstellungen_interface = None
+        self.uebersicht_interface = None
 
     # universal functions
     def store_draft(self):
-        """Calls store_draft in Backend with the Params:
-        open_interface: str = self.open_interface"""
+        """saves the form of the open KG/HP interface as draft. The write happens in
+        the background and only if the form changed (DraftAutosave), so switching
+        interfaces doesn't ask. Asks to save the changes of the Einstellungen
+        interface. Returns False if the switch is cancelled"""
 
-        # return True
         logging.debug("App.store_draft() called")
 
-        draft_interfaces = [
-            self.kg_interface,
-            self.hp_interface,
-            self.einstellungen_interface,
-        ]
-        if not self.debug_mode and any(draft_interfaces):
-            if draft_interfaces[0]:
-                logging.debug("KG Interface was open before")
-                try:
-                    data = [
-                        self.kg_interface.kuerzel_entry,
-                        self.kg_interface.rechnungsdatum_entry,
-                        self.kg_interface.daten_entries,
-                        self.kg_interface.behandlungsarten_entries_2d_array,
-                    ]
-                except AttributeError:
-                    return True
+        if self.debug_mode:
+            return True
 
-                # check if Behandlungsdaten or Behandlungsarten/Einzelpreise has value
-                if any(
-                        [
-                            [True for i in data[2] if i.get() != ""],
-                            [True for a in data[3] for i in a if i.get() != ""],
-                        ]
-                ):
-                    # Kürzel, Rechnungsnummer
-                    rechnungsdaten = [
-                        data[0].get(),
-                        f'{data[0].get()}{data[1].get().replace(".", "")}',
-                        "km",
-                        "km",
-                        "km",
-                        "km",
-                        "Euro",
-                        "Euro",
-                    ]
-
-                    # Behandlungsdaten
-                    for i in data[2]:
-                        rechnungsdaten.append(i.get())
-
-                    # Behandlungsdaten und Preise
-                    behandlungsarten = []
-                    einzelpreise = []
-                    for i in data[3]:
-                        behandlungsarten.append(i[0].get())
-                        einzelpreise.append(i[1].get())
-                    rechnungsdaten.append(behandlungsarten)
-                    rechnungsdaten.append(einzelpreise)
-                else:
-                    return True
-            elif draft_interfaces[1]:
-                logging.debug("HP Interface was open before")
-                try:
-                    data = [
-                        self.hp_interface.kuerzel_entry,
-                        self.hp_interface.rechnungsdatum_entry,
-                        self.hp_interface.rows_2d_array,
-                        self.hp_interface.diagnose_textbox,
-                    ]
-                except AttributeError:
-                    return True
+        if self.einstellungen_interface:
+            logging.debug("Einstellung Interface was open before")
 
-                data_2 = []
-                for index1, a in enumerate(data[2]):
-                    if index1 != 0:
-                        for index2, i in enumerate(a):
-                            if (
-                                    index2 in (0, 2, 4, 6)
-                                    and i.get("0.0", "end").replace("\n", "") != ""
-                            ):
-                                data_2.append(True)
-
-                data_3 = []
-                try:
-                    if data[3].get("0.0", "end").replace("\n", ""):
-                        data_3.append(True)
-                except tk.TclError:
+            if self.einstellungen_interface.changes:
+                save_changes = messagebox.askyesnocancel(
+                    "Warnung",
+                    "Beim fortfahren gehen alle Änderungen verloren. "
+                    "Sollen die Änderungen gespeichert werden?",
+                )
+                if save_changes:
+                    self.einstellungen_interface.save_property_values()
                     return True
-
-                if any([data_2, data_3]):
-                    # Kürzel, Rechnungsnummer
-                    rechnungsdaten = [
-                        data[0].get(),
-                        f'{data[0].get()}{data[1].get().replace(".", "")}H',
-                        "km",
-                        "km",
-                        "km",
-                        "km",
-                        "Euro",
-                        "Euro",
-                    ]
-
-                    # Behandlungsdaten
-                    array_2d = []
-                    for index1, a in enumerate(data[2]):
-                        if index1 != 0:
-                            array_1d = []
-                            for index2, i in enumerate(a):
-                                if index2 in (0, 2, 4, 6):
-                                    if i.get("0.0", "end")[-1] == "\n":
-                                        array_1d.append(i.get("0.0", "end")[:-1])
-                                    else:
-                                        array_1d.append(i.get("0.0", "end"))
-                            array_2d.append(array_1d)
-                    rechnungsdaten.append(array_2d)
-
-                    # Diagnose
-                    if data[3].get("0.0", "end")[-1] == "\n":
-                        rechnungsdaten.append(data[3].get("0.0", "end")[:-1])
-                    else:
-                        rechnungsdaten.append(data[3].get("0.0", "end"))
-                else:
+                elif save_changes is False:
                     return True
-            elif draft_interfaces[2]:
-                logging.debug("Einstellung Interface was open before")
-
-                if self.einstellungen_interface.changes:
-                    save_changes = messagebox.askyesnocancel(
-                        "Warnung",
-                        "Beim fortfahren gehen alle Änderungen verloren. "
-                        "Sollen die Änderungen gespeichert werden?",
-                    )
-                    if save_changes:
-                        self.einstellungen_interface.save_property_values()
-                        return True
-                    elif save_changes is False:
-                        return True
-                    elif save_changes is None:
-                        return False
-                    else:
-                        return False
                 else:
-                    return True
-            else:
-                return True
-        else:
-            return True
-
-        # check if draft exist and check value
-        if os.path.exists(
-                f"{self.rechnungen_location}/drafts/{rechnungsdaten[1]}DRAFT.csv"
-        ):
-            data = []
-            with open(
-                    f"{self.rechnungen_location}/drafts/{rechnungsdaten[1]}DRAFT.csv",
-                    newline="", encoding='utf-8'
-            ) as f:
-                csvfile = csv.reader(f, delimiter=";")
-                for index, row_1 in enumerate(csvfile):
-                    if index == 0:
-                        data.extend(row_1)
-
-            if draft_interfaces[1]:
-                try:
-                    data_8 = ast.literal_eval(data[8])
-                    data.pop(8)
-                    data.insert(8, data_8)
-                except IndexError:
-                    logging.info("There is no Data")
-
-            if data == rechnungsdaten:
-                return True
-
-        # check if rechnung to rechnungsnummer exists
-        if os.path.exists(
-                f"{self.rechnungen_location}/rechnungen-{self.year}/"
-                f"{rechnungsdaten[1].upper()}.pdf"
-        ):
+                    return False
             return True
 
-        # ask if draft should be saved
-        draft_yesno = messagebox.askyesnocancel(
-            "Do you want to continue?", "Soll ein Entwurf gespeichert werden?"
-        )
-        if draft_yesno:
-            if not os.path.exists(f"{self.rechnungen_location}/drafts/"):
-                os.mkdir(f"{self.rechnungen_location}/drafts/")
-            with open(
-                    f"{self.rechnungen_location}/drafts/{rechnungsdaten[1].upper()}DRAFT.csv",
-                    "w",
-                    newline="", encoding='utf-8'
-            ) as f:
-                csvfile = csv.writer(f, delimiter=";")
-                csvfile.writerow(rechnungsdaten)
-                logging.info("created draft")
-            return True
-        elif draft_yesno is False:
-            return True
-        elif draft_yesno is None:
-            return False
+        self.draft_autosave.flush()
+        return True
 
     def create_backup(self):
         """Creates Backup if enabled in properties.yml."""
@@ -993,8 +915,13 @@ class App(customtkinter.CTk):
             subprocess.call(("xdg-open", filepath))
             logging.info("linux: opened file")
 
-    def clean_remove(self, filepath: str, file: str):
-        """removes Rechnung file and data out of csv file"""
+    def clean_remove(
+            self, filepath: str, file: str, remove_data: bool = True, year=None
+    ):
+        """removes Rechnung file and data out of csv file. With remove_data=False the
+        data and the pdf are kept, because store_rechnung and the PdfRenderer replace
+        them atomically afterwards (or keep the pdf if it is unchanged). year defaults
+        to the program year"""
 
         logging.debug("App.clean_remove() called")
 
@@ -1007,69 +934,212 @@ class App(customtkinter.CTk):
                 return False
             else:
                 logging.debug("Rechnung wird gelöscht")
-                os.remove(filepath)
-                if os.path.exists(
-                        f"{self.rechnungen_location}/rechnungen-csv/rechnungen-{self.year}.csv"
-                ):
-                    with fileinput.FileInput(
-                            f"{self.rechnungen_location}/rechnungen-csv/rechnungen-{self.year}.csv",
-                            inplace=True,
-                    ) as a:
-                        for line in a:
-                            if line == "":
-                                continue
-                            rechnungsnummer = line.split(";")[1]
-                            if file.replace(".pdf", "") == rechnungsnummer:
-                                print("", end="")
-                                logging.debug("deleted line in RechnungenInsgesamt")
-                                continue
-                            else:
-                                print(line, end="")
-                else:
-                    with open(
-                            f"{self.rechnungen_location}/rechnungen-csv/rechnungen-"
-                            f"{self.year}.csv",
-                            "w", encoding='utf-8'
-                    ):
-                        pass
-
-        else:
-            if os.path.exists(
-                    f"{self.rechnungen_location}/rechnungen-csv/rechnungen-{self.year}.csv"
-            ):
-                with fileinput.FileInput(
-                        f"{self.rechnungen_location}/rechnungen-csv/rechnungen-{self.year}.csv",
-                        inplace=True,
-                ) as a:
-                    for line in a:
-                        if line == "":
-                            continue
-                        rechnungsnummer = line.split(";")[1]
-                        if file.replace(".pdf", "") == rechnungsnummer:
-                            print("", end="")
-                            logging.info("deleted line in RechnungenInsgesamt")
-                            continue
-                        else:
-                            print(line, end="")
-            else:
-                with open(
-                        f"{self.rechnungen_location}/rechnungen-csv/rechnungen-{self.year}.csv",
-                        "w", encoding='utf-8'
-                ):
-                    pass
+                if remove_data:
+                    os.remove(filepath)
+                    self.render_cache.discard(filepath)
+                    self.journal.remove(year or self.year, file.replace(".pdf", ""))
+        elif remove_data:
+            self.journal.remove(year or self.year, file.replace(".pdf", ""))
             logging.info("File didn't exist. Cleared RechnungenInsgesamt!")
 
-        try:
-            draft_files = os.listdir(f"{self.rechnungen_location}/drafts/")
-            file_without_extension = os.path.splitext(file)[0]
-            for i in draft_files:
-                if file_without_extension.lower() in i.lower():
-                    os.remove(f"{self.rechnungen_location}/drafts/{i}")
-        except FileNotFoundError:
-            pass
+        if not os.path.exists(filepath) and str(year or self.year) == str(self.year):
+            self.draft_registry.discard_rechnung(os.path.splitext(file)[0])
+        # queued behind pending autosaves, so no draft is written afterwards
+        self.draft_autosave.remove(os.path.splitext(file)[0])
 
         return True
 
+    def setup_storage(self):
+        """creates the storage backend set in properties.yml. Called at startup and
+        when the backend or one of the locations changed"""
+
+        logging.debug("App.setup_storage() called")
+
+        if (
+                self.storage is None
+                or self.storage.name != self.storage_backend
+                or self.storage.rechnungen_location != self.rechnungen_location
+                or self.storage.stammdaten_location != self.stammdaten_location
+        ):
+            if self.storage is not None:
+                self.storage.close()
+            self.storage = Storage.create(
+                self.storage_backend, self.rechnungen_location, self.stammdaten_location
+            )
+            self.storage.compaction_ratio = self.compaction_ratio
+            self.rollups = RechnungenRollups(self.storage)
+            self.journal = RechnungenJournal(self.storage, self.rollups)
+            self.integrity_scanner = IntegrityScanner(self)
+            self.draft_registry = DraftRegistry(self)
+            self.render_cache = RenderCache(self.rechnungen_location)
+            # at startup the registry is loaded by warm_up()
+            if self.draft_autosave is not None:
+                threading.Thread(target=self.draft_registry.load, daemon=True).start()
+            logging.info(f"storage backend: {self.storage.name}")
+
+        self.setup_stammdaten()
+        self.setup_file_watcher()
+
+    def setup_file_watcher(self):
+        """(re)starts the file watcher on the current locations"""
+
+        if (
+                self.file_watcher is not None
+                and self.file_watcher.rechnungen_location == self.rechnungen_location
+                and self.file_watcher.stammdaten_location == self.stammdaten_location
+        ):
+            return
+
+        if self.file_watcher is not None:
+            self.file_watcher.stop()
+        self.file_watcher = FileWatcher(self.rechnungen_location, self.stammdaten_location)
+        self.file_watcher.start()
+
+    def poll_file_events(self):
+        """hands the changes seen by the file watcher to the caches and the open
+        interface. Reschedules itself every 250ms"""
+
+        events = {}
+        while self.file_watcher is not None:
+            try:
+                kind, path = self.file_watcher.events.get_nowait()
+            except queue.Empty:
+                break
+            path = os.path.normpath(path)
+            if kind == "modified" and events.get(path) == "added":
+                continue
+            events[path] = kind
+
+        if events:
+            logging.debug(f"file events: {events}")
+            self.stammdaten_repository.file_events(events)
+            self.draft_registry.file_events(events)
+            self.render_cache.file_events(events)
+            for interface in (self.stammdaten_interface, self.rechnung_loeschen_interface):
+                if interface is not None and interface.winfo_exists():
+                    interface.file_events(events)
+
+        if self.running:
+            self.after(250, self.poll_file_events)
+
+    def warm_up(self):
+        """loads the stammdaten, the ledger of the current year and the directory
+        metadata in a thread pool while the window is already interactive"""
+
+        logging.debug("App.warm_up() called")
+        logging.info(
+            f"startup: window ready after {time.perf_counter() - self.start_time:.3f}s"
+        )
+
+        tasks = []
+        kuerzel = [i[0] for i in self.stammdaten_repository.list()]
+        for start in range(0, len(kuerzel), self.warm_up_chunk):
+            tasks.append((
+                f"stammdaten {start}",
+                lambda chunk=kuerzel[start:start + self.warm_up_chunk]: (
+                    self.stammdaten_repository.preload(chunk)
+                ),
+            ))
+        tasks.append(("rechnungen", self.warm_up_rechnungen))
+        tasks.append(("verzeichnisse", self.warm_up_dirs))
+        tasks.append(("entwürfe", self.draft_registry.load))
+        tasks.append(("render-cache", self.render_cache.prune))
+
+        self.warm_up_pending = {name for name, _ in tasks}
+        executor = ThreadPoolExecutor(
+            max_workers=self.warm_up_workers, thread_name_prefix="warm-up"
+        )
+        for name, task in tasks:
+            executor.submit(self.warm_up_task, name, task)
+        executor.shutdown(wait=False)
+
+    def warm_up_task(self, name: str, task):
+        """runs one warm-up task and logs its timing"""
+
+        started = time.perf_counter()
+        try:
+            task()
+        except (OSError, sqlite3.Error, ValueError) as e:
+            logging.warning(f"warm-up {name} failed: {e}")
+        logging.debug(f"warm-up {name}: {time.perf_counter() - started:.3f}s")
+
+        with self.stammdaten_repository.lock:
+            self.warm_up_pending.discard(name)
+            if self.warm_up_pending:
+                return
+        logging.info(
+            f"startup: warm-up done after {time.perf_counter() - self.start_time:.3f}s"
+        )
+
+    def warm_up_rechnungen(self):
+        """loads the index and streams the rows of the current year's ledger once"""
+
+        self.storage.find_rechnung(self.year, "")
+        rows = sum(1 for _ in self.storage.iter_rechnungen(self.year))
+        logging.debug(f"warm-up: {rows} rechnungen of {self.year}")
+
+    def warm_up_dirs(self):
+        """stats the files of the current year's dir and the drafts"""
+
+        path = f"{self.rechnungen_location}/rechnungen-{self.year}/"
+        if os.path.exists(path):
+            for entry in os.scandir(path):
+                entry.stat()
+        self.storage.list_drafts()
+
+    def log_first_query(self, name: str, started: float):
+        """logs the duration of the first query of an interface, to compare startups
+        with and without a finished warm-up"""
+
+        if name in self.first_queries:
+            return
+        self.first_queries.add(name)
+        logging.info(
+            f"first query {name}: {(time.perf_counter() - started) * 1000:.1f}ms "
+            f"(warm-up {'running' if self.warm_up_pending else 'done'})"
+        )
+
+    def setup_stammdaten(self):
+        """creates the stammdaten repository on the store set in properties.yml"""
+
+        logging.debug("App.setup_stammdaten() called")
+
+        current = self.stammdaten_repository
+        if self.stammdaten_store == "datei":
+            if (
+                    current is not None
+                    and isinstance(current.storage, StammdatenDatenbank)
+                    and current.storage.stammdaten_location == self.stammdaten_location
+            ):
+                return
+            source = StammdatenDatenbank(self.stammdaten_location)
+        else:
+            if current is not None and current.storage is self.storage:
+                return
+            source = self.storage
+
+        if current is not None and isinstance(current.storage, StammdatenDatenbank):
+            current.storage.close()
+        self.stammdaten_repository = StammdatenRepository(source)
+        threading.Thread(target=self.stammdaten_repository.build_trie, daemon=True).start()
+        logging.info(f"stammdaten store: {self.stammdaten_store}")
+
+    def store_rechnung(self, rechnungsdaten: list):
+        """stores the rechnungsdaten of the program year through the journal. Replaces
+        the stored rows of the same rechnungsnummer in the same atomic record"""
+
+        logging.debug("App.store_rechnung() called")
+
+        self.journal.save(self.year, rechnungsdaten)
+        self.draft_registry.add_rechnung(rechnungsdaten[1])
+
+    def find_rechnung(self, rechnungsnummer: str, year=None) -> list:
+        """returns all stored rows with the given rechnungsnummer"""
+
+        logging.debug("App.find_rechnung() called")
+
+        return self.storage.find_rechnung(year or self.year, rechnungsnummer)
+
     def on_startup(self):
         """removes not necessary components/files"""
 
@@ -1102,6 +1172,12 @@ class App(customtkinter.CTk):
 
         self.setup_working_dirs_and_logging()
 
+        self.draft_autosave.close()
+        self.pdf_renderer.close()
+        self.rollups.close()
+        self.storage.compact()
+        self.file_watcher.stop()
+
         if not self.create_backup():
             logging.info("No backup created")
         else:
@@ -1175,6 +1251,9 @@ class Sidebar(customtkinter.CTkFrame):
         self.button_7 = customtkinter.CTkButton(
             self, text="Dokumente", command=lambda: self.parent.documents()
         )
+        self.button_8 = customtkinter.CTkButton(
+            self, text="Übersicht", command=lambda: self.parent.uebersicht()
+        )
         self.label_1 = customtkinter.CTkLabel(
             self,
             text="Main Error\nCouldn't download version.txt!\nTry again later!",
@@ -1234,6 +1313,7 @@ class Sidebar(customtkinter.CTkFrame):
         self.button_3.pack(padx=20, pady=(10, 0), side="top", fill="x")
         self.button_4.pack(padx=20, pady=(10, 0), side="top", fill="x")
         self.button_7.pack(padx=20, pady=(10, 0), side="top", fill="x")
+        self.button_8.pack(padx=20, pady=(10, 0), side="top", fill="x")
         self.button_5.pack(padx=20, pady=(10, 20), side="bottom", fill="x")
 
         if self.parent.debug_mode:
@@ -1275,6 +1355,92 @@ class BottomNav(customtkinter.CTkFrame):
         self.bottom_nav_warning.pack(side="right", fill=None, expand=False, padx=20)
 
 
+class KuerzelDropdown(tk.Listbox):
+    """Live dropdown under a Kürzel entry with the matches of the kuerzel trie.
+    Clicking a match (or Return on it) puts its kuerzel into the entry, Down moves
+    from the entry into the list and Escape closes it."""
+
+    limit = 8
+
+    def __init__(self, master, entry: customtkinter.CTkEntry, app):
+        super().__init__(
+            master,
+            height=self.limit,
+            bg="#343638",
+            fg="white",
+            selectbackground="#1f538d",
+            highlightthickness=0,
+            borderwidth=0,
+            activestyle="none",
+            font=("Arial", 13),
+        )
+        self.entry = entry
+        self.app = app
+        self.matches = []
+
+        self.bind("<ButtonRelease-1>", lambda e: self.select_event())
+        self.bind("<Return>", lambda e: self.select_event())
+        self.bind("<Escape>", lambda e: self.hide())
+        self.bind("<FocusOut>", lambda e: self.after(100, self.hide_unless_focused))
+        self.entry.bind("<Down>", lambda e: self.focus_event())
+        self.entry.bind("<Escape>", lambda e: self.hide())
+        self.entry.bind("<FocusOut>", lambda e: self.after(100, self.hide_unless_focused))
+
+    def update_matches(self, text: str):
+        """shows the matches of text below the entry, hides the dropdown if there
+        are none"""
+
+        self.matches = self.app.stammdaten_repository.complete(text, self.limit)
+        if not text or [i[0] for i in self.matches] in ([], [text.upper()]):
+            return self.hide()
+
+        self.delete(0, tk.END)
+        for kuerzel, label in self.matches:
+            self.insert(tk.END, f"{kuerzel}   {label}")
+        self.configure(height=len(self.matches))
+
+        x = self.entry.winfo_rootx() - self.master.winfo_rootx()
+        y = self.entry.winfo_rooty() - self.master.winfo_rooty() + self.entry.winfo_height()
+        tk.Listbox.place(self, x=x, y=y, width=max(self.entry.winfo_width(), 260))
+        self.lift()
+
+    def focus_event(self):
+        """moves the focus from the entry into the list"""
+
+        if self.winfo_ismapped():
+            self.focus_set()
+            self.selection_clear(0, tk.END)
+            self.selection_set(0)
+            self.activate(0)
+
+    def select_event(self):
+        """puts the selected kuerzel into the entry"""
+
+        selection = self.curselection()
+        if not selection:
+            return
+        kuerzel = self.matches[selection[0]][0]
+        self.hide()
+        self.entry.delete(0, tk.END)
+        self.entry.insert(0, kuerzel)
+        self.entry.focus_set()
+
+    def hide(self):
+        """hides the dropdown"""
+
+        self.place_forget()
+
+    def hide_unless_focused(self):
+        """hides the dropdown unless the entry or the list has the focus"""
+
+        try:
+            focus = self.focus_get()
+        except (KeyError, tk.TclError):
+            focus = None
+        if focus is not self and not str(focus).startswith(str(self.entry)):
+            self.hide()
+
+
 class KGRechnungInterface(customtkinter.CTkScrollableFrame):
     """Creating the KGRechnungInterface frame and widgets_part_1"""
 
@@ -1293,6 +1459,8 @@ class KGRechnungInterface(customtkinter.CTkScrollableFrame):
 
     # count for the Behandlungsarten
     row_count = 0
+    # rechnungsnummer the form was autosaved as last
+    draft_rechnungsnummer = None
 
     def __init__(self, parent):
         super().__init__(parent)
@@ -1338,6 +1506,7 @@ class KGRechnungInterface(customtkinter.CTkScrollableFrame):
             validate="key",
             validatecommand=(self.register(self.kuerzel_entry_validation), "%P"),
         )
+        self.kuerzel_dropdown = KuerzelDropdown(self, self.kuerzel_entry, self.parent)
 
         self.frame_1_warning = customtkinter.CTkLabel(
             self.frame_1, textvariable=self.frame_1_warning_var, text=""
@@ -1510,9 +1679,11 @@ class KGRechnungInterface(customtkinter.CTkScrollableFrame):
             except AttributeError:
                 pass
 
-        # checking if draft can and should be stored
-        if not self.parent.store_draft():
-            return False
+        # the form is saved once the input pauses
+        self.parent.draft_autosave.schedule()
+
+        if len(text_after_action) <= 4:
+            self.kuerzel_dropdown.update_matches(text_after_action)
 
         # entry can't be kuerzel (len() < 4). Letting change pass
         if len(text_after_action) < 4:
@@ -1531,16 +1702,8 @@ class KGRechnungInterface(customtkinter.CTkScrollableFrame):
         elif len(text_after_action) == 4:
             logging.debug("kuerzel len == 4")
 
-            if os.path.exists(
-                    f"{self.parent.stammdaten_location}/{text_after_action.upper()}.txt"
-            ):
+            if self.parent.stammdaten_repository.known(text_after_action.upper()):
                 logging.info(f'stammdatei "{text_after_action}.txt" exists')
-                with open(
-                        f"{self.parent.stammdaten_location}/{text_after_action}.txt", "r"
-                ) as f:
-                    stammdaten = f.readlines()
-                    for i, line in enumerate(stammdaten):
-                        stammdaten[i] = line.replace("\n", "")
 
                 self.frame_1_warning_var.set(f"Stammdatei gefunden!")
                 self.frame_1_warning.configure(text_color="green")
@@ -1699,14 +1862,11 @@ class KGRechnungInterface(customtkinter.CTkScrollableFrame):
 
         logging.debug("KGRechnungInterface.kg_rechnung_erstellen_button_event() called")
 
-        # KG Rechnung erstellt
+        # KG Rechnung erstellt, the pdf is reported by the PdfRenderer
         if self.validate_kg_entries():
             self.kuerzel_entry.delete(0, tk.END)
             self.rechnungsdatum_entry.delete(0, tk.END)
             self.rechnungsdatum_entry.insert(0, f'{time.strftime("%d.%m.%y")}')
-            self.parent.bottom_nav.bottom_nav_warning.configure(
-                text=f"Rechnung erstellt und Daten gespeichert!", fg_color="green"
-            )
         # KG Rechnung nicht erstellt
         else:
             return False
@@ -1720,16 +1880,9 @@ class KGRechnungInterface(customtkinter.CTkScrollableFrame):
 
         # validate kuerzel + getting stammdaten
         if len(self.kuerzel_entry.get()) == 4:
-            if os.path.exists(
-                    f"{self.parent.stammdaten_location}/{self.kuerzel_entry.get()}.txt"
-            ):
-                with open(
-                        f"{self.parent.stammdaten_location}/{self.kuerzel_entry.get()}.txt",
-                        "r",
-                ) as f:
-                    self.stammdaten = f.readlines()
-                    for i, line in enumerate(self.stammdaten):
-                        self.stammdaten[i] = line.replace("\n", "")
+            stammdaten = self.parent.stammdaten_repository.get(self.kuerzel_entry.get())
+            if stammdaten is not None:
+                self.stammdaten = stammdaten
             else:
                 logging.warning(f"kuerzel not found, check code and check kuerzel")
                 messagebox.showwarning(
@@ -1745,7 +1898,7 @@ class KGRechnungInterface(customtkinter.CTkScrollableFrame):
 
         # validate rechnungsdatum
         if re.match(
-                r"(^0[1-9]|[12][0-9]|3[01]).(0[1-9]|1[0-2]).(\d{2}$)",
+                RechnungValidator.datum_pattern,
                 self.rechnungsdatum_entry.get(),
         ):
             self.rechnungsdatum = self.rechnungsdatum_entry.get()
@@ -1764,7 +1917,7 @@ class KGRechnungInterface(customtkinter.CTkScrollableFrame):
         self.dates = []
         empty_dates = []
         for index, i in enumerate(self.daten_entries):
-            if re.match(r"(^0[1-9]|[12][0-9]|3[01]).(0[1-9]|1[0-2]).(\d{2}$)", i.get()):
+            if re.match(RechnungValidator.datum_pattern, i.get()):
                 self.dates.append(str(i.get()))
                 self.datenanzahl += 1
             elif i.get() == "":
@@ -1837,34 +1990,13 @@ class KGRechnungInterface(customtkinter.CTkScrollableFrame):
         logging.debug(f"einzelpreise: {self.einzelpreise}")
 
         # validate Stammdatei
-        for index, i in enumerate(self.stammdaten):
-            if index == 9:
-                try:
-                    float(i)
-                except ValueError:
-                    logging.debug(
-                        f"Stammdatei/Kilometer zu Fahren has non float convertible value, exiting"
-                    )
-                    self.parent.bottom_nav.bottom_nav_warning.configure(
-                        text=f"Stammdatei - Kilometer keine Zahl: -> z.B. 3.40 oder 10; Ändern "
-                             f"unter stammdaten!",
-                        fg_color="red",
-                    )
-                    return False
-            if i == "":
-                if index in (8, 10, 11, 12, 13):
-                    pass
-                else:
-                    logging.debug(
-                        f"Stammdatei has no value in line {index + 1}, exiting"
-                    )
-                    self.parent.bottom_nav.bottom_nav_warning.configure(
-                        text=f"Stammdatei hat keinen Wert in Linie {index + 1}. Stammdatei "
-                             f"überprüfen!",
-                        fg_color="red",
-                    )
-                    return False
-            logging.debug(f"Stammdatei[{index}]: {i}")
+        error = RechnungValidator.stammdaten_error(self.stammdaten)
+        if error:
+            logging.debug(f"Stammdatei invalid, exiting")
+            self.parent.bottom_nav.bottom_nav_warning.configure(
+                text=error, fg_color="red"
+            )
+            return False
 
         self.parent.bottom_nav.bottom_nav_warning.configure(fg_color="transparent")
 
@@ -1884,12 +2016,12 @@ class KGRechnungInterface(customtkinter.CTkScrollableFrame):
 
         # validate Rechnungsnummer
         self.rechnungsnummer = (
-            f'{self.stammdaten[0]}{self.rechnungsdatum.replace(".", "")}'
+            f'{self.stammdaten.kuerzel}{self.rechnungsdatum.replace(".", "")}'
         )
         logging.debug(f"rechnungsnummer: {self.rechnungsnummer}")
 
         # calculating km total
-        km_total = 2 * float(self.stammdaten[9]) * float(self.datenanzahl)
+        km_total = 2 * self.stammdaten.kilometer * float(self.datenanzahl)
         logging.debug(f"km insgesamt: {km_total}")
 
         # calculating gesamtpreis
@@ -1899,36 +2031,29 @@ class KGRechnungInterface(customtkinter.CTkScrollableFrame):
             self.gesamtpreis += float(self.datenanzahl) * float(data)
         logging.debug(f"gesamtpreis: {self.gesamtpreis}")
 
-        rechnungsdaten = [
-            self.stammdaten[0],
+        self.rechnung = KgRechnungRecord(
+            self.stammdaten.kuerzel,
             self.rechnungsnummer,
-            self.stammdaten[9],
+            self.stammdaten.km,
             "km",
             km_total,
             "km",
             self.gesamtpreis,
             "Euro",
-        ]
-        rechnungsdaten.extend(self.dates)
-        rechnungsdaten.append(self.behandlungsarten)
-        rechnungsdaten.append(self.einzelpreise)
+            *self.dates,
+            self.behandlungsarten,
+            self.einzelpreise,
+        )
 
         if not self.parent.clean_remove(
                 f"{self.parent.rechnungen_location}/rechnungen-{self.parent.year}/"
                 f"{self.rechnungsnummer}.pdf",
                 f"{self.rechnungsnummer}.pdf",
+                remove_data=False,
         ):
             return False
         else:
-            with open(
-                    f"{self.parent.rechnungen_location}/rechnungen-csv/rechnungen-"
-                    f"{self.parent.year}.csv",
-                    "a",
-                    newline="", encoding='utf-8'
-            ) as f:
-                csvfile = csv.writer(f, delimiter=";")
-                csvfile.writerow(rechnungsdaten)
-                logging.info("wrote new line in RechnungenInsgesamt")
+            self.parent.store_rechnung(self.rechnung)
             return True
 
     def create_kg_pdf(self):
@@ -1953,69 +2078,89 @@ class KGRechnungInterface(customtkinter.CTkScrollableFrame):
             ):
                 return False
 
-        KgRechnung(
-            self,
-            self.stammdaten,
-            self.rechnungsnummer,
-            self.rechnungsdatum,
-            self.gesamtpreis,
-            self.dates,
-            self.datenanzahl,
-            self.behandlungsarten,
-            self.einzelpreise,
+        # rendered by the worker process, PdfRenderer.poll opens it once it is done
+        self.parent.pdf_renderer.submit(
+            KgRechnung,
             filepath,
-            self.parent.steuer_id,
-            self.parent.iban,
-            self.parent.bic,
+            "Rechnung erstellt und Daten gespeichert!",
+            stammdaten=self.stammdaten,
+            rechnung=self.rechnung,
+            steuer_id=self.parent.steuer_id,
+            iban=self.parent.iban,
+            bic=self.parent.bic,
         )
 
-        # PDF Öffnen
-        self.parent.open_file(filepath)
-
         return True
 
-    def insert_data(self, data: list):
-        """Inserts the data given into the KGRechnungInterface.
-        Params: data: list = data out of rechnungen-*.csv or *-DRAFT-*.csv"""
+    def draft_record(self):
+        """returns the form as KgRechnungRecord for a draft. None if no
+        behandlungsdatum, behandlungsart or einzelpreis has a value"""
+
+        try:
+            daten = [i.get() for i in self.daten_entries]
+            behandlungsarten = [i[0].get() for i in self.behandlungsarten_entries_2d_array]
+            einzelpreise = [i[1].get() for i in self.behandlungsarten_entries_2d_array]
+            kuerzel = self.kuerzel_entry.get()
+            rechnungsdatum = self.rechnungsdatum_entry.get()
+        except (AttributeError, tk.TclError):
+            return None
+
+        if not self.parent.draft_autosave.complete(kuerzel, rechnungsdatum):
+            return None
+        if not any(daten) and not any(behandlungsarten) and not any(einzelpreise):
+            return None
+        if len(daten) != 10:
+            return None
+
+        return KgRechnungRecord(
+            kuerzel,
+            f'{kuerzel}{rechnungsdatum.replace(".", "")}',
+            "km",
+            "km",
+            "km",
+            "km",
+            "Euro",
+            "Euro",
+            *daten,
+            behandlungsarten,
+            einzelpreise,
+        )
+
+    def insert_data(self, rechnung: "KgRechnungRecord"):
+        """Inserts the rechnung given into the KGRechnungInterface.
+        Params: rechnung: KgRechnungRecord = out of rechnungen-*.csv or a draft"""
 
         logging.debug(f"KGRechnungInterface.insert_data() called")
 
         # inserts the given kuerzel and rechnungsdatum into the KGRechnungInterface
-        self.kuerzel_entry.insert(0, data[0])
+        self.kuerzel_entry.insert(0, rechnung.kuerzel)
         self.rechnungsdatum_entry.delete(0, tk.END)
-        self.rechnungsdatum_entry.insert(
-            0, f"{data[1][4:6]}.{data[1][6:8]}.{data[1][8:10]}"
-        )
+        self.rechnungsdatum_entry.insert(0, rechnung.rechnungsdatum)
 
         # inserts the rechnungsdaten into the KGRechnungInterface
-        for index, i in enumerate(data[8:18]):
+        for index, i in enumerate(rechnung.behandlungsdaten):
             self.daten_entries[index].insert(0, i)
 
-        # checks the amount of given entries of behandlungsarten
-        row_count = int(len(data[18:]) / 2)
-
         # runs the behandlungsarten_add_event() for the amount of behandlungsarten
-        while True:
-            if row_count != 0:
-                self.behandlungsarten_add_event()
-                row_count -= 1
-                continue
-            else:
-                break
+        for _ in rechnung.behandlungsarten:
+            self.behandlungsarten_add_event()
 
         # inserts the behandlungsart and einzelpreis into the created rows
-        for index_1, i in enumerate(self.behandlungsarten_entries_2d_array):
-            for index_2, a in enumerate(i):
-                if index_2 == 0:
-                    a.insert(0, data[18 + index_1])
-                else:
-                    a.insert(0, data[18 + index_1 + int(len(data[18:]) / 2)])
+        for entries, behandlungsart, einzelpreis in zip(
+                self.behandlungsarten_entries_2d_array,
+                rechnung.behandlungsarten,
+                rechnung.einzelpreise,
+        ):
+            entries[0].insert(0, str(behandlungsart))
+            entries[1].insert(0, str(einzelpreis))
 
 
 class HPRechnungInterface(customtkinter.CTkScrollableFrame):
     """Creating the HPRechnungInterface frame and widgets_part_1"""
 
     row_count = 1
+    # rechnungsnummer the form was autosaved as last
+    draft_rechnungsnummer = None
 
     def __init__(self, parent):
         super().__init__(parent)
@@ -2062,6 +2207,7 @@ class HPRechnungInterface(customtkinter.CTkScrollableFrame):
             validate="key",
             validatecommand=(self.register(self.kuerzel_entry_validation), "%P"),
         )
+        self.kuerzel_dropdown = KuerzelDropdown(self, self.kuerzel_entry, self.parent)
 
         self.frame_1_warning = customtkinter.CTkLabel(
             self.frame_1, textvariable=self.frame_1_warning_var, text=""
@@ -2295,9 +2441,11 @@ class HPRechnungInterface(customtkinter.CTkScrollableFrame):
             except AttributeError:
                 pass
 
-        # checking if draft can and should be stored
-        if not self.parent.store_draft():
-            return False
+        # the form is saved once the input pauses
+        self.parent.draft_autosave.schedule()
+
+        if len(text_after_action) <= 4:
+            self.kuerzel_dropdown.update_matches(text_after_action)
 
         # entry can't be kuerzel (len() < 4). Letting change pass
         if len(text_after_action) < 4:
@@ -2316,16 +2464,8 @@ class HPRechnungInterface(customtkinter.CTkScrollableFrame):
         elif len(text_after_action) == 4:
             logging.debug("kuerzel len == 4")
 
-            if os.path.exists(
-                    f"{self.parent.stammdaten_location}/{text_after_action.upper()}.txt"
-            ):
+            if self.parent.stammdaten_repository.known(text_after_action.upper()):
                 logging.info(f'stammdatei "{text_after_action}.txt" exists')
-                with open(
-                        f"{self.parent.stammdaten_location}/{text_after_action}.txt", "r"
-                ) as f:
-                    stammdaten = f.readlines()
-                    for i, line in enumerate(stammdaten):
-                        stammdaten[i] = line.replace("\n", "")
 
                 self.frame_1_warning_var.set(f"Stammdatei gefunden!")
                 self.frame_1_warning.configure(text_color="green")
@@ -2468,14 +2608,11 @@ class HPRechnungInterface(customtkinter.CTkScrollableFrame):
 
         logging.debug("HPRechnungInterface.hp_rechnung_erstellen_button_event() called")
 
-        # HP Rechnung erstellt
+        # HP Rechnung erstellt, the pdf is reported by the PdfRenderer
         if self.validate_hp_entries():
             self.kuerzel_entry.delete(0, tk.END)
             self.rechnungsdatum_entry.delete(0, tk.END)
             self.rechnungsdatum_entry.insert(0, f'{time.strftime("%d.%m.%y")}')
-            self.parent.bottom_nav.bottom_nav_warning.configure(
-                text=f"Rechnung erstellt und Daten gespeichert!", fg_color="green"
-            )
         # HP Rechnung nicht erstellt
         else:
             return False
@@ -2488,16 +2625,9 @@ class HPRechnungInterface(customtkinter.CTkScrollableFrame):
 
         # validate kuerzel + getting stammdaten
         if len(self.kuerzel_entry.get()) == 4:
-            if os.path.exists(
-                    f"{self.parent.stammdaten_location}/{self.kuerzel_entry.get()}.txt"
-            ):
-                with open(
-                        f"{self.parent.stammdaten_location}/{self.kuerzel_entry.get()}.txt",
-                        "r",
-                ) as f:
-                    self.stammdaten = f.readlines()
-                    for i, line in enumerate(self.stammdaten):
-                        self.stammdaten[i] = line.replace("\n", "")
+            stammdaten = self.parent.stammdaten_repository.get(self.kuerzel_entry.get())
+            if stammdaten is not None:
+                self.stammdaten = stammdaten
             else:
                 logging.warning(f"kuerzel not found, check code and check kuerzel")
                 messagebox.showwarning(
@@ -2513,7 +2643,7 @@ class HPRechnungInterface(customtkinter.CTkScrollableFrame):
 
         # validate rechnungsdatum
         if re.match(
-                r"(^0[1-9]|[12][0-9]|3[01]).(0[1-9]|1[0-2]).(\d{2}$)",
+                RechnungValidator.datum_pattern,
                 self.rechnungsdatum_entry.get(),
         ):
             self.rechnungsdatum = self.rechnungsdatum_entry.get()
@@ -2546,7 +2676,7 @@ class HPRechnungInterface(customtkinter.CTkScrollableFrame):
                                 fg_color="red",
                             )
                         if not re.match(
-                                r"(^0[1-9]|[12][0-9]|3[01]).(0[1-9]|1[0-2]).(\d{2}$)",
+                                RechnungValidator.datum_pattern,
                                 data[0].replace("\t", ""),
                         ):
                             return self.parent.bottom_nav.bottom_nav_warning.configure(
@@ -2613,38 +2743,18 @@ class HPRechnungInterface(customtkinter.CTkScrollableFrame):
 
         # validate Diagnose
         self.diagnose = self.diagnose_textbox.get("0.0", "end")
-        self.diagnose.replace("\n", "")
+        if self.diagnose[-1:] == "\n":
+            self.diagnose = self.diagnose[:-1]
         logging.debug(f"diagnose: {self.diagnose}")
 
         # validate Stammdatei
-        for index, i in enumerate(self.stammdaten):
-            if index == 9:
-                try:
-                    float(i)
-                except ValueError:
-                    logging.debug(
-                        f"Stammdatei/Kilometer zu Fahren has non float convertible value, exiting"
-                    )
-                    self.parent.bottom_nav.bottom_nav_warning.configure(
-                        text=f"Stammdatei - Kilometer keine Zahl: -> z.B. 3.40 oder 10; Ändern "
-                             f"unter stammdaten!",
-                        fg_color="red",
-                    )
-                    return False
-            if i == "":
-                if index in (8, 10, 11, 12, 13):
-                    pass
-                else:
-                    logging.debug(
-                        f"Stammdatei has no value in line {index + 1}, exiting"
-                    )
-                    self.parent.bottom_nav.bottom_nav_warning.configure(
-                        text=f"Stammdatei hat keinen Wert in Linie {index + 1}. Stammdatei "
-                             f"überprüfen!",
-                        fg_color="red",
-                    )
-                    return False
-            logging.debug(f"Stammdatei[{index}]: {i}")
+        error = RechnungValidator.stammdaten_error(self.stammdaten)
+        if error:
+            logging.debug(f"Stammdatei invalid, exiting")
+            self.parent.bottom_nav.bottom_nav_warning.configure(
+                text=error, fg_color="red"
+            )
+            return False
 
         self.parent.bottom_nav.bottom_nav_warning.configure(fg_color="transparent")
 
@@ -2664,108 +2774,127 @@ class HPRechnungInterface(customtkinter.CTkScrollableFrame):
 
         # validate Rechnungsnummer
         self.rechnungsnummer = (
-            f'{self.stammdaten[0]}{self.rechnungsdatum.replace(".", "")}H'
+            f'{self.stammdaten.kuerzel}{self.rechnungsdatum.replace(".", "")}H'
         )
         logging.debug(f"rechnungsnummer: {self.rechnungsnummer}")
 
         # calculating km total
-        km_total = 2 * float(self.stammdaten[9]) * float(len(self.rows_2d_array) - 1)
+        km_total = 2 * self.stammdaten.kilometer * float(len(self.rows_2d_array) - 1)
         logging.debug(f"km insgesamt: {km_total}")
 
-        rechnungsdaten = [
-            self.stammdaten[0],
+        self.rechnung = HpRechnungRecord(
+            self.stammdaten.kuerzel,
             self.rechnungsnummer,
-            self.stammdaten[9],
+            self.stammdaten.km,
             "km",
             km_total,
             "km",
             self.gesamtpreis,
             "Euro",
             self.behandlungsdaten,
-            self.diagnose.replace("\n", ""),
-        ]
+            self.diagnose,
+        )
 
         if not self.parent.clean_remove(
                 f"{self.parent.rechnungen_location}/rechnungen-{self.parent.year}/"
                 f"{self.rechnungsnummer}.pdf",
                 f"{self.rechnungsnummer}.pdf",
+                remove_data=False,
         ):
             return False
         else:
-            with open(
-                    f"{self.parent.rechnungen_location}/rechnungen-csv/rechnungen-"
-                    f"{self.parent.year}.csv",
-                    "a",
-                    newline="", encoding='utf-8'
-            ) as f:
-                csvfile = csv.writer(f, delimiter=";")
-                csvfile.writerow(rechnungsdaten)
-                logging.info("wrote new line in RechnungenInsgesamt")
+            self.parent.store_rechnung(self.rechnung)
             return True
 
     def create_hp_pdf(self):
         """passes user data to HpRechnung Class that creates the Hp
         PDF"""
 
-        logging.debug("Backend.create_kg_pdf() called")
+        logging.debug("HPRechnungInterface.create_hp_pdf() called")
 
         filepath = (
             f"{self.parent.rechnungen_location}/rechnungen-{self.parent.year}"
             f"/{self.rechnungsnummer}.pdf"
         )
 
-        HpRechnung(
-            self.stammdaten,
-            self.rechnungsnummer,
-            self.rechnungsdatum,
-            self.gesamtpreis,
-            self.behandlungsdaten,
-            self.diagnose,
+        # rendered by the worker process, PdfRenderer.poll opens it once it is done
+        self.parent.pdf_renderer.submit(
+            HpRechnung,
             filepath,
-            self.parent.steuer_id,
-            self.parent.iban,
-            self.parent.bic,
+            "Rechnung erstellt und Daten gespeichert!",
+            stammdaten=self.stammdaten,
+            rechnung=self.rechnung,
+            steuer_id=self.parent.steuer_id,
+            iban=self.parent.iban,
+            bic=self.parent.bic,
         )
-
-        # PDF Öffnen
-        self.parent.open_file(filepath)
         return True
 
-    def insert_data(self, data: list):
-        """Inserts the data given into the HPRechnungInterface.
-        Params: data: list = data out of rechnungen-*.csv or *-DRAFT-*.csv"""
+    def draft_record(self):
+        """returns the form as HpRechnungRecord for a draft. None if neither the
+        behandlungsdaten nor the diagnose have a value"""
+
+        try:
+            # Behandlungsdaten
+            behandlungsdaten = []
+            for i in self.rows_2d_array[1:]:
+                row = []
+                for a in i[0:8:2]:
+                    text = a.get("0.0", "end")
+                    row.append(text[:-1] if text[-1] == "\n" else text)
+                behandlungsdaten.append(row)
+
+            # Diagnose
+            diagnose = self.diagnose_textbox.get("0.0", "end")
+            if diagnose[-1:] == "\n":
+                diagnose = diagnose[:-1]
+
+            kuerzel = self.kuerzel_entry.get()
+            rechnungsdatum = self.rechnungsdatum_entry.get()
+        except (AttributeError, tk.TclError):
+            return None
+
+        if not self.parent.draft_autosave.complete(kuerzel, rechnungsdatum):
+            return None
+        if not diagnose.replace("\n", "") and not any(
+                i.replace("\n", "") for row in behandlungsdaten for i in row
+        ):
+            return None
+
+        return HpRechnungRecord(
+            kuerzel,
+            f'{kuerzel}{rechnungsdatum.replace(".", "")}H',
+            "km",
+            "km",
+            "km",
+            "km",
+            "Euro",
+            "Euro",
+            behandlungsdaten,
+            diagnose,
+        )
+
+    def insert_data(self, rechnung: "HpRechnungRecord"):
+        """Inserts the rechnung given into the HPRechnungInterface.
+        Params: rechnung: HpRechnungRecord = out of rechnungen-*.csv or a draft"""
 
         logging.debug(f"HPRechnungInterface.insert_data() called")
 
-        # inserts the given kuerzel and rechnungsdatum into the KGRechnungInterface
-        self.kuerzel_entry.insert(0, data[0])
+        # inserts the given kuerzel and rechnungsdatum into the HPRechnungInterface
+        self.kuerzel_entry.insert(0, rechnung.kuerzel)
         self.rechnungsdatum_entry.delete(0, tk.END)
-        self.rechnungsdatum_entry.insert(
-            0, f"{data[1][4:6]}.{data[1][6:8]}.{data[1][8:10]}"
-        )
+        self.rechnungsdatum_entry.insert(0, rechnung.rechnungsdatum)
 
-        # checks the amount of given entries of behandlungsarten
-        row_count = len(data[8])
+        # runs the behandlungsdaten_add_event() for the amount of behandlungsdaten,
+        # the first row already exists
+        for _ in range(len(rechnung.behandlungsdaten) - 1):
+            self.behandlungsdaten_add_event()
 
-        # runs the behandlungsdaten_add_event() for the amount of behandlungsarten
-        while True:
-            if row_count != 1:
-                self.behandlungsdaten_add_event()
-                row_count -= 1
-                continue
-            else:
-                break
+        for i, behandlungsdatum in zip(self.rows_2d_array[1:], rechnung.behandlungsdaten):
+            for index, a in enumerate(i[0:8:2]):
+                a.insert("0.0", behandlungsdatum[index])
 
-        for index_1, i in enumerate(self.rows_2d_array):
-            if index_1 == 0:
-                continue
-            index = 0
-            for index_2, a in enumerate(i):
-                if index_2 in (0, 2, 4, 6):
-                    a.insert("0.0", data[8][index_1 - 1][index])
-                    index += 1
-
-        self.diagnose_textbox.insert("0.0", data[-1])
+        self.diagnose_textbox.insert("0.0", rechnung.diagnose)
 
 
 class StammdatenInterface(customtkinter.CTkFrame):
@@ -2842,6 +2971,18 @@ class StammdatenInterface(customtkinter.CTkFrame):
             image=self.parent.search_img,
             command=lambda: self.aktualisieren_event(),
         )
+        self.import_button = customtkinter.CTkButton(
+            self.frame_1,
+            width=20,
+            text="importieren",
+            command=lambda: self.import_button_event(),
+        )
+        self.export_button = customtkinter.CTkButton(
+            self.frame_1,
+            width=20,
+            text="exportieren",
+            command=lambda: self.export_button_event(),
+        )
 
         # Separator
         self.separator_2 = ttk.Separator(self, orient="horizontal")
@@ -2865,6 +3006,8 @@ class StammdatenInterface(customtkinter.CTkFrame):
         self.search_entry.grid(row=1, column=1, sticky="w")
         self.segmented_button_1.grid(row=1, column=2, pady=4, padx=10)
         self.aktualisieren_button.grid(row=1, column=4)
+        self.import_button.grid(row=1, column=5, padx=(10, 0))
+        self.export_button.grid(row=1, column=6, padx=10)
 
         # Separator
         self.separator_2.pack(fill="x", expand=False)
@@ -2928,11 +3071,7 @@ class StammdatenInterface(customtkinter.CTkFrame):
                         time.strftime(
                             "%d.%m.%y at %H:%M",
                             time.strptime(
-                                time.ctime(
-                                    os.path.getctime(
-                                        f"{self.parent.stammdaten_location}/{i}"
-                                    )
-                                )
+                                time.ctime(self.file_times[i][0])
                             ),
                         )
                     ),
@@ -2945,11 +3084,7 @@ class StammdatenInterface(customtkinter.CTkFrame):
                         time.strftime(
                             "%d.%m.%y at %H:%M",
                             time.strptime(
-                                time.ctime(
-                                    os.path.getmtime(
-                                        f"{self.parent.stammdaten_location}/{i}"
-                                    )
-                                )
+                                time.ctime(self.file_times[i][1])
                             ),
                         )
                     ),
@@ -3159,78 +3294,71 @@ class StammdatenInterface(customtkinter.CTkFrame):
         logging.debug(
             f"StammdatenInterface.aktualisieren_event() called; args = {args}"
         )
+        started = time.perf_counter()
 
-        def destroy_frame():
-            """destroys the widgets and layout part_2"""
+        # fetches names and times of the stammdateien in storage
+        self.file_times = {}
+        self.files_in_dir_unsorted = []
+        for kuerzel, created, modified in self.parent.stammdaten_repository.list():
+            self.files_in_dir_unsorted.append(f"{kuerzel}.txt")
+            self.file_times[f"{kuerzel}.txt"] = (created, modified)
 
-            logging.debug(
-                "StammdatenInterface.aktualisieren_event.destroy_frame() called"
-            )
+        self.filter_files()
+        self.parent.log_first_query("stammdaten", started)
 
-            try:
-                self.frame_2.pack_forget()
-                self.frame_2.destroy()
-            except AttributeError:
-                pass
+    def filter_files(self, focus: bool = True):
+        """filters the listed stammdateien through the search index and updates the
+        widgets and layout part_2"""
 
-        def create_frame():
-            """runs the creation widgets and layout part_2 functions"""
+        logging.debug("StammdatenInterface.filter_files() called")
 
-            logging.debug(
-                "StammdatenInterface.aktualisieren_event.create_frame() called"
+        # index lookup -> no stammdatei has to be read
+        self.files_in_dir = [
+            f"{i}.txt"
+            for i in self.parent.stammdaten_repository.search(
+                self.search_entry.get(), self.segmented_button_1.get()
             )
+            if f"{i}.txt" in self.file_times
+        ]
 
-            self.create_widgets_part_2()
-            self.create_layout_part_2()
-            self.parent.focus_set()
+        try:
+            self.frame_2.pack_forget()
+            self.frame_2.destroy()
+        except AttributeError:
+            pass
 
-        # fetches names of files in dir
-        self.files_in_dir = []
-        self.files_in_dir_unsorted = os.listdir(f"{self.parent.stammdaten_location}/")
+        self.create_widgets_part_2()
+        self.create_layout_part_2()
+        if focus:
+            self.parent.focus_set()
 
-        # checks if file meets filter criteria
-        for i in self.files_in_dir_unsorted:
-            if i == ".DS_Store":
-                continue
-            if self.segmented_button_1.get() == "Alle":
-                with open(f"{self.parent.stammdaten_location}/{i}", "r") as f:
-                    f = f.readlines()
-                    for a in f:
-                        if self.search_entry.get() in a or self.search_entry.get() in i:
-                            self.files_in_dir.append(i)
-                            break
-            elif self.segmented_button_1.get() == "KG":
-                with open(f"{self.parent.stammdaten_location}/{i}", "r") as f:
-                    f = f.readlines()
-                    for a in f:
-                        try:
-                            if f[12].replace("\n", "") == "KG" and (
-                                    self.search_entry.get() in a
-                                    or self.search_entry.get() in i
-                            ):
-                                self.files_in_dir.append(i)
-                                break
-                        except IndexError:
-                            pass
-            elif self.segmented_button_1.get() == "HP":
-                with open(f"{self.parent.stammdaten_location}/{i}", "r") as f:
-                    f = f.readlines()
-                    for a in f:
-                        try:
-                            if f[12].replace("\n", "") == "HP" and (
-                                    self.search_entry.get() in a
-                                    or self.search_entry.get() in i
-                            ):
-                                self.files_in_dir.append(i)
-                                break
-                        except IndexError:
-                            pass
+    def file_events(self, events: dict):
+        """updates the list with the stammdateien changed on disk, without
+        listing the dir again (events: path -> added/modified/deleted)"""
 
-        # sorts the filenames alphabetically
-        self.files_in_dir.sort()
+        if isinstance(self.parent.stammdaten_repository.storage, StammdatenDatenbank):
+            return
 
-        destroy_frame()
-        create_frame()
+        directory = os.path.normpath(self.parent.stammdaten_location)
+        changed = False
+        for path in events:
+            if os.path.dirname(path) != directory or not path.endswith(".txt"):
+                continue
+            name = os.path.basename(path)
+            if name.startswith("."):
+                continue
+            try:
+                self.file_times[name] = (os.path.getctime(path), os.path.getmtime(path))
+                if name not in self.files_in_dir_unsorted:
+                    self.files_in_dir_unsorted.append(name)
+            except OSError:
+                self.file_times.pop(name, None)
+                if name in self.files_in_dir_unsorted:
+                    self.files_in_dir_unsorted.remove(name)
+            changed = True
+
+        if changed:
+            self.filter_files(focus=False)
 
     def open_stammdatei_button_event(self, row):
         """being called when open button of specific file is pressed and
@@ -3241,7 +3369,9 @@ class StammdatenInterface(customtkinter.CTkFrame):
         )
 
         self.parent.open_file(
-            f"{self.parent.stammdaten_location}/{self.files_in_dir[row]}"
+            self.parent.stammdaten_repository.stammdatei_path(
+                self.files_in_dir[row][:-len(".txt")]
+            )
         )
 
     def edit_stammdatei_button_event(self, row):
@@ -3256,16 +3386,14 @@ class StammdatenInterface(customtkinter.CTkFrame):
         self.create_layout_part_3()
 
         # inserts the values in the entries
-        filepath = f"{self.parent.stammdaten_location}/{self.files_in_dir[row]}"
-        if os.path.exists(filepath):
-            with open(filepath, "r") as f:
-                f = f.readlines()
-                for i in range(14):
-                    try:
-                        self.stammdaten_entries[i].insert(0, f[i].replace("\n", ""))
-                    except IndexError:
-                        logging.info(f"stammdatei {self.files_in_dir[row]} corrupt")
-                        break
+        f = self.parent.stammdaten_repository.get(self.files_in_dir[row][:-len(".txt")])
+        if f is not None:
+            for i in range(14):
+                try:
+                    self.stammdaten_entries[i].insert(0, f[i])
+                except IndexError:
+                    logging.info(f"stammdatei {self.files_in_dir[row]} corrupt")
+                    break
 
     def delete_stammdatei_button_event(self, row):
         """being called when delete button of specific file is pressed and
@@ -3275,9 +3403,11 @@ class StammdatenInterface(customtkinter.CTkFrame):
             f"StammdatenInterface.delete_stammdatei_button_event() called, row={row}"
         )
 
-        filepath = f"{self.parent.stammdaten_location}/{self.files_in_dir[row]}"
+        kuerzel = self.files_in_dir[row][:-len(".txt")]
+        filepath = self.parent.storage.stammdatei_path(kuerzel)
 
-        self.parent.clean_remove(filepath, self.files_in_dir[row])
+        if self.parent.clean_remove(filepath, self.files_in_dir[row]):
+            self.parent.stammdaten_repository.remove(kuerzel)
 
         self.aktualisieren_event()
 
@@ -3306,37 +3436,13 @@ class StammdatenInterface(customtkinter.CTkFrame):
 
         self.parent.bottom_nav.bottom_nav_warning.configure(text="")
 
-        if len(self.stammdaten[0].get()) != 4:
-            self.stammdaten[0].select_range(0, tk.END)
-            self.stammdaten[0].focus_set()
-            return self.parent.bottom_nav.bottom_nav_warning.configure(
-                text=f"Kürzel mehr/weniger als 4 Buchstaben!", fg_color="red"
-            )
-
-        if self.stammdaten[1].get() != "Mann" and self.stammdaten[1].get() != "Frau":
-            self.stammdaten[1].select_range(0, tk.END)
-            self.stammdaten[1].focus_set()
-            return self.parent.bottom_nav.bottom_nav_warning.configure(
-                text=f'Mann/Frau muss "Mann" oder "Frau" sein', fg_color="red"
-            )
-
-        try:
-            float(self.stammdaten[9].get())
-        except ValueError:
-            self.stammdaten[9].select_range(0, tk.END)
-            self.stammdaten[9].focus_set()
-            return self.parent.bottom_nav.bottom_nav_warning.configure(
-                text=f"Kilometer zu fahren muss int oder float sein!", fg_color="red"
-            )
-
-        if (
-                not self.stammdaten[12].get() == "HP"
-                and not self.stammdaten[12].get() == "KG"
-        ):
-            self.stammdaten[12].select_range(0, tk.END)
-            self.stammdaten[12].focus_set()
+        error = StammdatenImport.entry_error([i.get() for i in self.stammdaten])
+        if error:
+            index, warning = error
+            self.stammdaten[index].select_range(0, tk.END)
+            self.stammdaten[index].focus_set()
             return self.parent.bottom_nav.bottom_nav_warning.configure(
-                text=f"Nicht HP oder KG eingegeben!", fg_color="red"
+                text=warning, fg_color="red"
             )
 
         self.parent.bottom_nav.bottom_nav_warning.configure(fg_color="transparent")
@@ -3357,9 +3463,7 @@ class StammdatenInterface(customtkinter.CTkFrame):
 
         logging.debug("Backend.store_stammdaten_data() called")
 
-        if os.path.exists(
-                f"{self.parent.stammdaten_location}/{self.stammdaten[0].get()}.txt"
-        ):
+        if self.parent.stammdaten_repository.exists(self.stammdaten[0].get()):
             if not messagebox.askyesno(
                     "Do you want to continue?",
                     f"Stammdatei zu {self.stammdaten[0].get()} existiert bereits und wird beim "
@@ -3369,26 +3473,111 @@ class StammdatenInterface(customtkinter.CTkFrame):
                 return False
             else:
                 logging.debug("Stammdatei wird überschrieben")
-                with open(
-                        f"{self.parent.stammdaten_location}/{self.stammdaten[0].get()}.txt",
-                        "w",
-                ) as f:
-                    for index, i in enumerate(self.stammdaten):
-                        if index != 13:
-                            f.write(f"{i.get()}\n")
-                        else:
-                            f.write(f"{i.get()}")
-                return True
+
+        self.parent.stammdaten_repository.store([i.get() for i in self.stammdaten])
+        return True
+
+    def import_button_event(self):
+        """imports stammdaten out of a csv/vcard file in the background"""
+
+        logging.debug("StammdatenInterface.import_button_event() called")
+
+        filepath = filedialog.askopenfilename(
+            title="Stammdaten importieren",
+            filetypes=[("CSV/vCard", "*.csv *.vcf"), ("Alle Dateien", "*")],
+        )
+        if not filepath:
+            return
+
+        self.import_button.configure(state="disabled")
+        stammdaten_import = StammdatenImport(self.parent)
+        threading.Thread(
+            target=stammdaten_import.run, args=(filepath,), daemon=True
+        ).start()
+        self.parent.after(200, self.poll_import, stammdaten_import)
+
+    def poll_import(self, stammdaten_import: "StammdatenImport"):
+        """shows the progress of the import and the result when it is done"""
+
+        if not stammdaten_import.done:
+            self.parent.bottom_nav.bottom_nav_warning.configure(
+                text=f"Import: {stammdaten_import.progress}", fg_color="orange"
+            )
+            self.parent.after(200, self.poll_import, stammdaten_import)
+            return
+
+        if stammdaten_import.errors:
+            try:
+                report = stammdaten_import.write_report()
+            except OSError as e:
+                logging.error(f"couldn't write import report: {e}")
+                report = "-"
+            self.parent.bottom_nav.bottom_nav_warning.configure(
+                text=f"{stammdaten_import.imported} Stammdateien importiert, "
+                     f"{len(stammdaten_import.errors)} Fehler",
+                fg_color="orange",
+            )
+            messagebox.showwarning(
+                "Import Fehler",
+                "\n".join(
+                    f"Eintrag {line} {kuerzel}: {error}"
+                    for line, kuerzel, error in stammdaten_import.errors[:10]
+                )
+                + f"\n\nAlle Fehler: {report}",
+            )
         else:
-            with open(
-                    f"{self.parent.stammdaten_location}/{self.stammdaten[0].get()}.txt", "w"
-            ) as f:
-                for index, i in enumerate(self.stammdaten):
-                    if index != 13:
-                        f.write(f"{i.get()}\n")
-                    else:
-                        f.write(f"{i.get()}")
-            return True
+            self.parent.bottom_nav.bottom_nav_warning.configure(
+                text=f"{stammdaten_import.imported} Stammdateien importiert!",
+                fg_color="green",
+            )
+
+        if self.parent.stammdaten_interface is self and self.winfo_exists():
+            self.import_button.configure(state="normal")
+            self.aktualisieren_event()
+
+    def export_button_event(self):
+        """exports all stammdaten into a csv/vcard file in the background"""
+
+        logging.debug("StammdatenInterface.export_button_event() called")
+
+        filepath = filedialog.asksaveasfilename(
+            title="Stammdaten exportieren",
+            initialfile="stammdaten.csv",
+            filetypes=[("CSV", "*.csv"), ("vCard", "*.vcf")],
+        )
+        if not filepath:
+            return
+
+        self.export_button.configure(state="disabled")
+        stammdaten_export = StammdatenExport(self.parent)
+        threading.Thread(
+            target=stammdaten_export.run, args=(filepath,), daemon=True
+        ).start()
+        self.parent.after(200, self.poll_export, stammdaten_export)
+
+    def poll_export(self, stammdaten_export: "StammdatenExport"):
+        """shows the progress of the export and the result when it is done"""
+
+        if not stammdaten_export.done:
+            self.parent.bottom_nav.bottom_nav_warning.configure(
+                text=f"Export: {stammdaten_export.exported} Stammdateien",
+                fg_color="orange",
+            )
+            self.parent.after(200, self.poll_export, stammdaten_export)
+            return
+
+        if stammdaten_export.error:
+            self.parent.bottom_nav.bottom_nav_warning.configure(
+                text=f"Export fehlgeschlagen: {stammdaten_export.error}", fg_color="red"
+            )
+        else:
+            self.parent.bottom_nav.bottom_nav_warning.configure(
+                text=f"{stammdaten_export.exported} Stammdateien exportiert!",
+                fg_color="green",
+            )
+
+        if self.parent.stammdaten_interface is self and self.winfo_exists():
+            self.export_button.configure(state="normal")
 
 
 class RechnungenInterface(customtkinter.CTkFrame):
@@ -3407,6 +3596,18 @@ class RechnungenInterface(customtkinter.CTkFrame):
 
         self.place(relx=0.2, y=0, relwidth=0.8, relheight=0.90)
 
+        # cross year search
+        self.search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="search")
+        self.search_generation = 0
+        self.search_futures = []
+        self.file_rows = []
+        self.file_paths = {}
+        self.file_years = {}
+
+        # listed dir, kept for the file watcher events
+        self.list_path = None
+        self.list_draft = False
+
         self.create_widgets_part_1()
         self.create_layout_part_1()
         self.aktualisieren_event()
@@ -3438,6 +3639,13 @@ class RechnungenInterface(customtkinter.CTkFrame):
             command=lambda x: self.aktualisieren_event(x),
         )
         self.segmented_button_1.set("Alle")
+        self.all_years_switch = customtkinter.CTkSwitch(
+            self.frame_1,
+            text="alle Jahre",
+            onvalue="on",
+            offvalue="off",
+            command=lambda: self.aktualisieren_event(),
+        )
         self.aktualisieren_button = customtkinter.CTkButton(
             self.frame_1,
             width=20,
@@ -3445,6 +3653,18 @@ class RechnungenInterface(customtkinter.CTkFrame):
             image=self.parent.search_img,
             command=lambda: self.aktualisieren_event(),
         )
+        self.import_button = customtkinter.CTkButton(
+            self.frame_1,
+            width=20,
+            text="importieren",
+            command=lambda: self.import_button_event(),
+        )
+        self.render_button = customtkinter.CTkButton(
+            self.frame_1,
+            width=20,
+            text="PDFs neu erstellen",
+            command=lambda: self.render_button_event(),
+        )
 
         # Separator
         self.separator_2 = ttk.Separator(self, orient="horizontal")
@@ -3467,7 +3687,10 @@ class RechnungenInterface(customtkinter.CTkFrame):
         self.search_label.grid(row=1, column=0, padx=10, pady=4, sticky="w")
         self.search_entry.grid(row=1, column=1, sticky="w")
         self.segmented_button_1.grid(row=1, column=2, pady=4, padx=10)
+        self.all_years_switch.grid(row=1, column=3, pady=4, padx=10, sticky="w")
         self.aktualisieren_button.grid(row=1, column=4)
+        self.import_button.grid(row=1, column=5, padx=10)
+        self.render_button.grid(row=1, column=6, padx=(0, 10))
 
         # Separator
         self.separator_2.pack(fill="x", expand=False)
@@ -3525,7 +3748,7 @@ class RechnungenInterface(customtkinter.CTkFrame):
                         time.strftime(
                             "%d.%m.%y at %H:%M",
                             time.strptime(
-                                time.ctime(os.path.getctime(f"{path}" f"{i}"))
+                                time.ctime(self.file_times[self.file_key(index)][0])
                             ),
                         )
                     ),
@@ -3538,7 +3761,7 @@ class RechnungenInterface(customtkinter.CTkFrame):
                         time.strftime(
                             "%d.%m.%y at %H:%M",
                             time.strptime(
-                                time.ctime(os.path.getmtime(f"{path}" f"{i}"))
+                                time.ctime(self.file_times[self.file_key(index)][1])
                             ),
                         )
                     ),
@@ -3599,7 +3822,7 @@ class RechnungenInterface(customtkinter.CTkFrame):
                         a.grid(row=0, column=index_2, padx=5, pady=6)
                         a.configure(
                             command=lambda row=index_1: self.open_rechnung_button_event(
-                                row, path
+                                row, self.file_paths.get(self.file_key(row), path)
                             )
                         )
                     else:
@@ -3608,14 +3831,14 @@ class RechnungenInterface(customtkinter.CTkFrame):
                     a.grid(row=0, column=index_2, padx=5, pady=6)
                     a.configure(
                         command=lambda row=index_1: self.edit_rechnung_button_event(
-                            row, path, draft
+                            row, self.file_paths.get(self.file_key(row), path), draft
                         )
                     )
                 elif index_2 == 8:
                     a.grid(row=0, column=index_2, padx=(5, 20), pady=6)
                     a.configure(
                         command=lambda row=index_1: self.delete_rechnung_button_event(
-                            row, path
+                            row, self.file_paths.get(self.file_key(row), path)
                         )
                     )
                 else:
@@ -3658,22 +3881,68 @@ class RechnungenInterface(customtkinter.CTkFrame):
             self.create_layout_part_2(path, draft)
             self.parent.focus_set()
 
+        started = time.perf_counter()
+
         # checks in what directory to search
         self.files_in_dir = []
-        if self.segmented_button_1.get() == "Entwürfe":
+        self.file_rows = []
+        self.file_paths = {}
+        self.file_years = {}
+        self.cancel_search()
+        self.search_generation += 1
+        if (
+                self.all_years_switch.get() == "on"
+                and self.segmented_button_1.get() != "Entwürfe"
+        ):
+            path = ""
+            draft = False
+            self.file_times = {}
+            self.list_path = None
+
+            destroy_frame()
+            create_frame()
+            self.search_all_years()
+            return
+        elif self.segmented_button_1.get() == "Entwürfe":
             path = f"{self.parent.rechnungen_location}/drafts/"
             draft = True
         else:
             path = f"{self.parent.rechnungen_location}/rechnungen-{self.parent.year}/"
             draft = False
 
-        if not os.path.exists(path):
-            os.makedirs(path)
+        # fetches names and times of the files in dir or the drafts in storage
+        self.file_times = {}
+        if draft:
+            self.files_in_dir_unsorted = []
+            for name, created, modified in self.parent.storage.list_drafts():
+                self.files_in_dir_unsorted.append(name)
+                self.file_times[name] = (created, modified)
+        else:
+            if not os.path.exists(path):
+                os.makedirs(path)
+            self.files_in_dir_unsorted = os.listdir(path)
+            for i in self.files_in_dir_unsorted:
+                self.file_times[i] = (
+                    os.path.getctime(f"{path}{i}"),
+                    os.path.getmtime(f"{path}{i}"),
+                )
 
-        # fetches names of files in dir
-        self.files_in_dir_unsorted = os.listdir(path)
+        self.list_path = path
+        self.list_draft = draft
+        self.filter_files()
+        self.parent.log_first_query("rechnungen", started)
+
+    def filter_files(self, focus: bool = True):
+        """filters the listed files with the filter criteria and updates the
+        widgets and layout part_2"""
+
+        logging.debug("RechnungenInterface.filter_files() called")
+
+        path = self.list_path
+        draft = self.list_draft
 
         # checks if file meets filter criteria
+        self.files_in_dir = []
         for i in self.files_in_dir_unsorted:
             if i == ".DS_Store":
                 continue
@@ -3689,8 +3958,174 @@ class RechnungenInterface(customtkinter.CTkFrame):
             elif self.segmented_button_1.get() == "Entwürfe":
                 self.files_in_dir = self.files_in_dir_unsorted
 
-        destroy_frame()
-        create_frame()
+        try:
+            self.frame_2.pack_forget()
+            self.frame_2.destroy()
+        except AttributeError:
+            pass
+
+        self.create_widgets_part_2(path)
+        self.create_layout_part_2(path, draft)
+        if focus:
+            self.parent.focus_set()
+
+    def file_events(self, events: dict):
+        """updates the list with the files changed on disk, without listing the
+        dir again (events: path -> added/modified/deleted)"""
+
+        # the cross year search and the sqlite drafts don't list a dir
+        if self.list_path is None:
+            return
+        if self.list_draft and not isinstance(self.parent.storage, CsvStorage):
+            return
+
+        directory = os.path.normpath(self.list_path)
+        changed = False
+        for path in events:
+            if os.path.dirname(path) != directory:
+                continue
+            name = os.path.basename(path)
+            if name.startswith("."):
+                continue
+            try:
+                self.file_times[name] = (os.path.getctime(path), os.path.getmtime(path))
+                if name not in self.files_in_dir_unsorted:
+                    self.files_in_dir_unsorted.append(name)
+            except OSError:
+                self.file_times.pop(name, None)
+                if name in self.files_in_dir_unsorted:
+                    self.files_in_dir_unsorted.remove(name)
+            changed = True
+
+        if changed:
+            self.filter_files(focus=False)
+
+    def file_key(self, row: int):
+        """returns the key of the listed file of row into file_times, file_paths and
+        file_years: (year, filename) in the cross year search, else the filename"""
+
+        if self.file_rows:
+            return self.file_rows[row]
+        return self.files_in_dir[row]
+
+    def rechnungen_years(self) -> list:
+        """returns all years with a rechnungen-{year} dir or stored rechnungen"""
+
+        years = set(self.parent.storage.rechnungen_years())
+        for i in os.listdir(self.parent.rechnungen_location):
+            if re.match(r"^rechnungen-\d{4}$", i):
+                years.add(i[len("rechnungen-"):])
+        return sorted(years, reverse=True)
+
+    @staticmethod
+    def search_year(storage, rechnungen_location: str, year: str, search: str, kind: str):
+        """scans rechnungen-{year}/ and the stored rows of year. Runs in the search
+        pool. Returns (filename, path, year, created, modified) of every rechnung
+        whose filename or stored row contains search"""
+
+        path = f"{rechnungen_location}/rechnungen-{year}/"
+        if not os.path.exists(path):
+            return []
+
+        matching_rows = set()
+        if search:
+            for row in storage.iter_rechnungen(year):
+                if any(search in str(i).upper() for i in row):
+                    matching_rows.add(f"{row[1]}.pdf")
+
+        results = []
+        for i in os.listdir(path):
+            if i == ".DS_Store":
+                continue
+            if kind == "KG" and i[:-4][-1:] == "H":
+                continue
+            if kind == "HP" and not i[:-4][-1:] == "H":
+                continue
+            if search in i or i in matching_rows:
+                results.append(
+                    (
+                        i,
+                        path,
+                        year,
+                        os.path.getctime(f"{path}{i}"),
+                        os.path.getmtime(f"{path}{i}"),
+                    )
+                )
+        return results
+
+    def search_all_years(self):
+        """searches all years concurrently. The results of every year are merged
+        into the list as soon as the year is done"""
+
+        logging.debug("RechnungenInterface.search_all_years() called")
+
+        search = self.search_entry.get().upper()
+        kind = self.segmented_button_1.get()
+
+        self.search_futures = [
+            self.search_executor.submit(
+                self.search_year,
+                self.parent.storage,
+                self.parent.rechnungen_location,
+                year,
+                search,
+                kind,
+            )
+            for year in self.rechnungen_years()
+        ]
+
+        self.after(50, self.poll_search, self.search_generation)
+
+    def cancel_search(self):
+        """cancels the years of the running search that haven't started yet"""
+
+        for i in self.search_futures:
+            i.cancel()
+        self.search_futures = []
+
+    def destroy(self):
+        """stops the search pool with the interface"""
+
+        self.cancel_search()
+        self.search_executor.shutdown(wait=False)
+        super().destroy()
+
+    def poll_search(self, generation: int):
+        """merges the finished years into the list. Stops when a newer search was
+        started or all years are done"""
+
+        if generation != self.search_generation or not self.winfo_exists():
+            return
+
+        done = [i for i in self.search_futures if i.done()]
+        self.search_futures = [i for i in self.search_futures if not i.done()]
+
+        if done:
+            for future in done:
+                try:
+                    results = future.result()
+                except (OSError, ValueError, csv.Error, sqlite3.Error) as e:
+                    # e.g. a corrupt ledger, the other years are still listed
+                    logging.warning(f"cross year search failed: {e}")
+                    continue
+                # the same rechnungsnummer can exist in several years
+                for name, path, year, created, modified in results:
+                    self.file_rows.append((year, name))
+                    self.file_paths[(year, name)] = path
+                    self.file_years[(year, name)] = year
+                    self.file_times[(year, name)] = (created, modified)
+
+            # newest year first, alphabetically inside a year
+            self.file_rows.sort(key=lambda i: (-int(i[0]), i[1]))
+            self.files_in_dir = [name for year, name in self.file_rows]
+
+            self.frame_2.pack_forget()
+            self.frame_2.destroy()
+            self.create_widgets_part_2("")
+            self.create_layout_part_2("", False)
+
+        if self.search_futures:
+            self.after(50, self.poll_search, generation)
 
     def open_rechnung_button_event(self, row: int, path: str):
         """being called when open button of specific file is pressed and
@@ -3711,17 +4146,26 @@ class RechnungenInterface(customtkinter.CTkFrame):
         )
 
         filepath = f"{path}{self.files_in_dir[row]}"
-        path_head_tail = os.path.split(filepath)
         row_count = 0
         data = []
 
+        # rechnungen are always stored in the program year
+        year = self.file_years.get(self.file_key(row), self.parent.year)
+        if str(year) != str(self.parent.year):
+            return messagebox.showinfo(
+                "Rechnung bearbeiten",
+                f"{self.files_in_dir[row]} ist aus {year}. Zum Bearbeiten das "
+                f"Programmjahr auf {year} ändern!",
+            )
+
         # checks if file is a draft
         if draft:
-            with open(filepath, newline="", encoding='utf-8') as f:
-                csvfile = csv.reader(f, delimiter=";")
-                for index, row_1 in enumerate(csvfile):
-                    if index == 0:
-                        data.extend(row_1)
+            data.extend(
+                self.parent.storage.load_draft(
+                    self.files_in_dir[row].replace("DRAFT.csv", "")
+                )
+                or []
+            )
         else:
             if not os.path.exists(filepath):
                 logging.debug(
@@ -3731,16 +4175,7 @@ class RechnungenInterface(customtkinter.CTkFrame):
             else:
                 logging.debug(f"Rechnung {self.files_in_dir_unsorted[row]} found.")
 
-            if not os.path.exists(
-                    f"{self.parent.rechnungen_location}/rechnungen-"
-                    f"csv/rechnungen-{self.parent.year}.csv"
-            ):
-                with open(
-                        f"{self.parent.rechnungen_location}/rechnungen-"
-                        f"csv/rechnungen-{self.parent.year}.csv",
-                        "w",
-                ):
-                    pass
+            if not self.parent.storage.check_rechnungen(self.parent.year):
                 logging.error(
                     f"rechnungen-csv Error: rechnungen-{self.parent.year}.csv just created. Error "
                     f"in filestructure!"
@@ -3751,16 +4186,12 @@ class RechnungenInterface(customtkinter.CTkFrame):
                     f"Struktur!",
                 )
 
-            with open(
-                    f"{self.parent.rechnungen_location}/rechnungen-"
-                    f"csv/rechnungen-{self.parent.year}.csv",
-                    newline="", encoding='utf-8'
-            ) as f:
-                csvfile = csv.reader(f, delimiter=";")
-                for row_1 in csvfile:
-                    if self.files_in_dir[row].replace(".pdf", "") in row_1:
-                        row_count += 1
-                        data.extend(row_1)
+            # index lookup -> one seek instead of scanning the csv file
+            for row_1 in self.parent.find_rechnung(
+                    self.files_in_dir[row].replace(".pdf", "")
+            ):
+                row_count += 1
+                data.extend(row_1)
 
             if row_count > 1:
                 logging.error(
@@ -3784,7 +4215,7 @@ class RechnungenInterface(customtkinter.CTkFrame):
                 )
 
         # checks if stammdatei exists
-        if not os.path.exists(f"{self.parent.stammdaten_location}/{data[0]}.txt"):
+        if not self.parent.stammdaten_repository.exists(data[0]):
             logging.error(
                 f"stammdatei Error: stammdatei {data[0]}.txt "
                 f"not found, create it again to edit this rechnung!"
@@ -3795,33 +4226,14 @@ class RechnungenInterface(customtkinter.CTkFrame):
                 f"erstellen um Rechnung zu bearbeiten!",
             )
 
-        if os.path.splitext(path_head_tail[1])[0].replace("DRAFT", "")[-1] == "H":
-            logging.info("editing HPRechnung")
-
-            try:
-                data_8 = ast.literal_eval(data[8])
-                data.pop(8)
-                data.insert(8, data_8)
-            except IndexError:
-                logging.info("There is no Data")
+        rechnung = RechnungRecord.create(RechnungCodec.decode(data))
 
-            self.parent.hp_rechnung(data)
+        if rechnung.is_hp:
+            logging.info("editing HPRechnung")
+            self.parent.hp_rechnung(rechnung)
         else:
             logging.info("editing KGRechnung")
-
-            try:
-                data_18 = ast.literal_eval(data[18])
-                data.pop(18)
-                for index, i in enumerate(data_18):
-                    data.insert(int(18 + index), str(i))
-                data_end = ast.literal_eval(data[-1])
-                data.pop(-1)
-                for index, i in enumerate(data_end):
-                    data.append(str(i))
-            except IndexError:
-                logging.info("There is no Data")
-
-            self.parent.kg_rechnung(data)
+            self.parent.kg_rechnung(rechnung)
 
     def delete_rechnung_button_event(self, row: int, path: str):
         """being called when delete button of specific file is pressed and
@@ -3830,42 +4242,172 @@ class RechnungenInterface(customtkinter.CTkFrame):
         logging.debug(f"RechnungenInterface.delete_rechnung() called, row={row}")
 
         filepath = f"{path}/{self.files_in_dir[row]}"
+        year = self.file_years.get(self.file_key(row), self.parent.year)
+
+        # drafts of the sqlite storage have no file, clean_remove wouldn't ask
+        if not os.path.exists(filepath) and self.files_in_dir[row].endswith("DRAFT.csv"):
+            if not messagebox.askyesno(
+                    "Do you want to continue?",
+                    f"Beim fortfahren wird der Entwurf {self.files_in_dir[row]} gelöscht!",
+            ):
+                return
 
-        self.parent.clean_remove(filepath, self.files_in_dir[row])
+        self.parent.clean_remove(filepath, self.files_in_dir[row], year=year)
 
         self.aktualisieren_event()
 
+    def import_button_event(self):
+        """imports historical rechnungen out of a csv/json file in the background"""
 
-class DocumentsInterface(customtkinter.CTkFrame):
-    """Creating the DocumentsInterface frame and widgets."""
+        logging.debug("RechnungenInterface.import_button_event() called")
 
-    def __init__(self, parent):
-        super().__init__(parent)
+        filepath = filedialog.askopenfilename(
+            title="Rechnungen importieren",
+            filetypes=[("CSV/JSON", "*.csv *.json"), ("Alle Dateien", "*")],
+        )
+        if not filepath:
+            return
 
-        logging.info("class DocumentsInterface() called")
+        create_pdfs = messagebox.askyesno(
+            "PDFs erstellen?",
+            "Sollen für die importierten Rechnungen PDFs erstellt werden?",
+        )
 
-        self.parent = parent
+        self.import_button.configure(state="disabled")
+        rechnungen_import = RechnungenImport(self.parent)
+        threading.Thread(
+            target=rechnungen_import.run, args=(filepath, create_pdfs), daemon=True
+        ).start()
+        self.parent.after(200, self.poll_import, rechnungen_import)
 
-        self.configure(fg_color="gray16", corner_radius=0)
-        self.place(relx=0.2, y=0, relwidth=0.8, relheight=0.90)
+    def poll_import(self, rechnungen_import: "RechnungenImport"):
+        """shows the progress of the import and the result when it is done"""
 
-        # tk variables
-        self.frame_1_warning_var = tk.StringVar()
+        if not rechnungen_import.done:
+            self.parent.bottom_nav.bottom_nav_warning.configure(
+                text=f"Import: {rechnungen_import.progress}", fg_color="orange"
+            )
+            self.parent.after(200, self.poll_import, rechnungen_import)
+            return
 
-        self.create_widgets_part_1()
-        self.create_layout_part_1()
+        if rechnungen_import.errors:
+            try:
+                report = rechnungen_import.write_report()
+            except OSError as e:
+                logging.error(f"couldn't write import report: {e}")
+                report = "-"
+            self.parent.bottom_nav.bottom_nav_warning.configure(
+                text=f"{rechnungen_import.imported} Rechnungen importiert, "
+                     f"{len(rechnungen_import.errors)} Fehler",
+                fg_color="orange",
+            )
+            messagebox.showwarning(
+                "Import Fehler",
+                "\n".join(
+                    f"Zeile {line} {nummer}: {error}"
+                    for line, nummer, error in rechnungen_import.errors[:10]
+                )
+                + f"\n\nAlle Fehler: {report}",
+            )
+        else:
+            self.parent.bottom_nav.bottom_nav_warning.configure(
+                text=f"{rechnungen_import.imported} Rechnungen importiert!",
+                fg_color="green",
+            )
 
-    def create_widgets_part_1(self):
-        """Creating the widgets_part_1 of frame/class DocumentsInterface"""
+        if self.parent.rechnung_loeschen_interface is self and self.winfo_exists():
+            self.import_button.configure(state="normal")
+            self.aktualisieren_event()
 
-        logging.debug("DocumentsInterface.create_widgets_part_1() called")
+    def render_button_event(self):
+        """opens the window to render the pdfs of a year again"""
 
-        # heading section
-        self.heading_1 = customtkinter.CTkLabel(
-            self, text="Dokumente", font=self.parent.large_heading
-        )
+        logging.debug("RechnungenInterface.render_button_event() called")
 
-        # Separator
+        if (
+                self.parent.toplevel_window is None
+                or not self.parent.toplevel_window.winfo_exists()
+        ):
+            self.parent.toplevel_window = RenderToplevelWindow(self.parent, self)
+
+    def render(self, year: str, kuerzel: str = "", von: str = "", bis: str = ""):
+        """renders the pdfs of year matching the filter in the background"""
+
+        logging.debug("RechnungenInterface.render() called")
+
+        self.render_button.configure(state="disabled")
+        rechnungen_render = RechnungenRender(self.parent)
+        threading.Thread(
+            target=rechnungen_render.run, args=(year, kuerzel, von, bis), daemon=True
+        ).start()
+        self.parent.after(200, self.poll_render, rechnungen_render)
+
+    def poll_render(self, rechnungen_render: "RechnungenRender"):
+        """shows the progress and throughput of the rendering and the result when it
+        is done"""
+
+        if not rechnungen_render.done:
+            self.parent.bottom_nav.bottom_nav_warning.configure(
+                text=f"PDFs: {rechnungen_render.progress}", fg_color="orange"
+            )
+            self.parent.after(200, self.poll_render, rechnungen_render)
+            return
+
+        summary = (
+            f"{rechnungen_render.rendered}/{rechnungen_render.total} PDFs in "
+            f"{rechnungen_render.duration:.1f}s neu erstellt, "
+            f"{rechnungen_render.unchanged} unverändert"
+        )
+        if rechnungen_render.errors:
+            self.parent.bottom_nav.bottom_nav_warning.configure(
+                text=f"{summary}, {len(rechnungen_render.errors)} Fehler", fg_color="orange"
+            )
+            messagebox.showwarning(
+                "PDF Fehler",
+                "\n".join(
+                    f"{nummer}: {error}" for nummer, error in rechnungen_render.errors[:10]
+                ),
+            )
+        else:
+            self.parent.bottom_nav.bottom_nav_warning.configure(
+                text=f"{summary}!", fg_color="green"
+            )
+
+        if self.parent.rechnung_loeschen_interface is self and self.winfo_exists():
+            self.render_button.configure(state="normal")
+            self.aktualisieren_event()
+
+
+class DocumentsInterface(customtkinter.CTkFrame):
+    """Creating the DocumentsInterface frame and widgets."""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+
+        logging.info("class DocumentsInterface() called")
+
+        self.parent = parent
+
+        self.configure(fg_color="gray16", corner_radius=0)
+        self.place(relx=0.2, y=0, relwidth=0.8, relheight=0.90)
+
+        # tk variables
+        self.frame_1_warning_var = tk.StringVar()
+
+        self.create_widgets_part_1()
+        self.create_layout_part_1()
+
+    def create_widgets_part_1(self):
+        """Creating the widgets_part_1 of frame/class DocumentsInterface"""
+
+        logging.debug("DocumentsInterface.create_widgets_part_1() called")
+
+        # heading section
+        self.heading_1 = customtkinter.CTkLabel(
+            self, text="Dokumente", font=self.parent.large_heading
+        )
+
+        # Separator
         self.separator_1 = ttk.Separator(self, orient="horizontal")
 
         # kuerzel section
@@ -3879,6 +4421,7 @@ class DocumentsInterface(customtkinter.CTkFrame):
             validate="key",
             validatecommand=(self.register(self.kuerzel_entry_validation), "%P"),
         )
+        self.kuerzel_dropdown = KuerzelDropdown(self, self.kuerzel_entry, self.parent)
 
         self.frame_1_warning = customtkinter.CTkLabel(
             self.frame_1, textvariable=self.frame_1_warning_var, text=""
@@ -4011,6 +4554,9 @@ class DocumentsInterface(customtkinter.CTkFrame):
         if not self.parent.store_draft():
             return False
 
+        if len(text_after_action) <= 4:
+            self.kuerzel_dropdown.update_matches(text_after_action)
+
         # entry can't be kuerzel (len() < 4). Letting change pass
         if len(text_after_action) < 4:
             logging.debug("kuerzel len < 4, letting change pass")
@@ -4028,16 +4574,8 @@ class DocumentsInterface(customtkinter.CTkFrame):
         elif len(text_after_action) == 4:
             logging.debug("kuerzel len == 4")
 
-            if os.path.exists(
-                    f"{self.parent.stammdaten_location}/{text_after_action.upper()}.txt"
-            ):
+            if self.parent.stammdaten_repository.known(text_after_action.upper()):
                 logging.info(f'stammdatei "{text_after_action}.txt" exists')
-                with open(
-                        f"{self.parent.stammdaten_location}/{text_after_action}.txt", "r"
-                ) as f:
-                    stammdaten = f.readlines()
-                    for i, line in enumerate(stammdaten):
-                        stammdaten[i] = line.replace("\n", "")
 
                 self.frame_1_warning_var.set(f"Stammdatei gefunden!")
                 self.frame_1_warning.configure(text_color="green")
@@ -4072,16 +4610,9 @@ class DocumentsInterface(customtkinter.CTkFrame):
         self.parent.bottom_nav.bottom_nav_warning.configure(text="")
 
         if len(self.kuerzel_entry.get()) == 4:
-            if os.path.exists(
-                    f"{self.parent.stammdaten_location}/{self.kuerzel_entry.get()}.txt"
-            ):
-                with open(
-                        f"{self.parent.stammdaten_location}/{self.kuerzel_entry.get()}.txt",
-                        "r",
-                ) as f:
-                    self.stammdaten = f.readlines()
-                    for i, line in enumerate(self.stammdaten):
-                        self.stammdaten[i] = line.replace("\n", "")
+            stammdaten = self.parent.stammdaten_repository.get(self.kuerzel_entry.get())
+            if stammdaten is not None:
+                self.stammdaten = stammdaten
             else:
                 logging.warning(f"kuerzel not found, check code and check kuerzel")
                 messagebox.showwarning(
@@ -4104,11 +4635,10 @@ class DocumentsInterface(customtkinter.CTkFrame):
         filepath = f"{os.getcwd()}/system/tmp/{self.kuerzel_entry.get()}-datenschutzerklärung.pdf"
 
         if self.validate_stammdaten():
-            Privacy(self.stammdaten, filepath)
-            self.parent.bottom_nav.bottom_nav_warning.configure(
-                text=f"Datenschutzerklärung erstellt!", fg_color="green"
+            self.parent.pdf_renderer.submit(
+                Privacy, filepath, "Datenschutzerklärung erstellt!",
+                stammdaten=self.stammdaten,
             )
-            self.parent.open_file(filepath)
         else:
             return False
 
@@ -4120,15 +4650,280 @@ class DocumentsInterface(customtkinter.CTkFrame):
         filepath = f"{os.getcwd()}/system/tmp/{self.kuerzel_entry.get()}-therapievereinbarung.pdf"
 
         if self.validate_stammdaten():
-            Therapy(self.stammdaten, filepath, self.price_from_entry.get(), self.price_to_entry.get())
-            self.parent.bottom_nav.bottom_nav_warning.configure(
-                text=f"Therapievereinbarung erstellt!", fg_color="green"
+            self.parent.pdf_renderer.submit(
+                Therapy, filepath, "Therapievereinbarung erstellt!",
+                stammdaten=self.stammdaten,
+                price_from=self.price_from_entry.get(),
+                price_to=self.price_to_entry.get(),
             )
-            self.parent.open_file(filepath)
         else:
             return False
 
 
+class UebersichtInterface(customtkinter.CTkFrame):
+    """Creating the UebersichtInterface frame and widgets. Shows the revenue and
+    mileage per month and patient out of the rollups"""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+
+        logging.info("class UebersichtInterface() called")
+
+        self.parent = parent
+
+        self.configure(fg_color="gray16", corner_radius=0)
+        self.place(relx=0.2, y=0, relwidth=0.8, relheight=0.90)
+
+        self.create_widgets_part_1()
+        self.create_layout_part_1()
+        self.aktualisieren_event()
+        self.integrity_event()
+
+    def create_widgets_part_1(self):
+        """Creating the widgets_part_1 of frame/class UebersichtInterface"""
+
+        logging.debug("UebersichtInterface.create_widgets_part_1() called")
+
+        # heading section
+        self.heading_1 = customtkinter.CTkLabel(
+            self, text="Übersicht", font=self.parent.large_heading
+        )
+
+        # Separator
+        self.separator_1 = ttk.Separator(self, orient="horizontal")
+
+        # Filter
+        self.frame_1 = customtkinter.CTkFrame(self, fg_color="gray16")
+        self.heading_2 = customtkinter.CTkLabel(
+            self.frame_1, text="Filter", font=self.parent.small_heading
+        )
+        self.search_label = customtkinter.CTkLabel(self.frame_1, text="Kürzel:")
+        self.search_entry = customtkinter.CTkEntry(self.frame_1)
+
+        years = self.parent.rollups.years()
+        if str(self.parent.year) not in years:
+            years.insert(0, str(self.parent.year))
+        self.year_option_menu = customtkinter.CTkOptionMenu(
+            self.frame_1,
+            values=years,
+            width=90,
+            command=lambda x: self.aktualisieren_event(),
+        )
+        self.year_option_menu.set(str(self.parent.year))
+
+        self.segmented_button_1 = customtkinter.CTkSegmentedButton(
+            self.frame_1,
+            values=["Alle", "KG", "HP"],
+            command=lambda x: self.aktualisieren_event(),
+        )
+        self.segmented_button_1.set("Alle")
+        self.aktualisieren_button = customtkinter.CTkButton(
+            self.frame_1,
+            width=20,
+            text="suchen",
+            image=self.parent.search_img,
+            command=lambda: self.aktualisieren_event(),
+        )
+        self.rebuild_button = customtkinter.CTkButton(
+            self.frame_1,
+            width=20,
+            text="neu berechnen",
+            command=lambda: self.rebuild_event(),
+        )
+
+        # Separator
+        self.separator_2 = ttk.Separator(self, orient="horizontal")
+
+        # Integrity
+        self.frame_3 = customtkinter.CTkFrame(self, fg_color="gray16")
+        self.heading_4 = customtkinter.CTkLabel(
+            self.frame_3, text="Integrität", font=self.parent.small_heading
+        )
+        self.integrity_label = customtkinter.CTkLabel(self.frame_3, text="")
+        self.integrity_button = customtkinter.CTkButton(
+            self.frame_3,
+            width=20,
+            text="prüfen",
+            command=lambda: self.integrity_event(force=True),
+        )
+        self.integrity_textbox = customtkinter.CTkTextbox(self.frame_3, height=120)
+
+    def create_layout_part_1(self):
+        """Creating the layout_part_1 of frame/class UebersichtInterface"""
+
+        logging.debug("UebersichtInterface.create_layout_part_1() called")
+
+        # heading section
+        self.heading_1.pack(side="top", fill="x", expand=False, pady=(20, 30), padx=20)
+
+        # Separator
+        self.separator_1.pack(fill="x", expand=False)
+
+        # Filter section
+        self.frame_1.grid_columnconfigure(4, weight=1)
+        self.frame_1.pack(fill="x", expand=False, pady=(15, 15), padx=20)
+        self.heading_2.grid(row=0, column=0, padx=10, pady=4, columnspan=2, sticky="w")
+        self.search_label.grid(row=1, column=0, padx=10, pady=4, sticky="w")
+        self.search_entry.grid(row=1, column=1, sticky="w")
+        self.year_option_menu.grid(row=1, column=2, pady=4, padx=10)
+        self.segmented_button_1.grid(row=1, column=3, pady=4, padx=10)
+        self.aktualisieren_button.grid(row=1, column=5)
+        self.rebuild_button.grid(row=1, column=6, padx=10)
+
+        # Separator
+        self.separator_2.pack(fill="x", expand=False)
+
+        # Integrity section
+        self.frame_3.grid_columnconfigure(1, weight=1)
+        self.frame_3.pack(side="bottom", fill="x", expand=False, pady=(0, 15), padx=20)
+        self.heading_4.grid(row=0, column=0, padx=10, pady=4, sticky="w")
+        self.integrity_label.grid(row=0, column=1, padx=10, pady=4, sticky="w")
+        self.integrity_button.grid(row=0, column=2, padx=10, pady=4)
+        self.integrity_textbox.grid(
+            row=1, column=0, columnspan=3, padx=10, pady=4, sticky="ew"
+        )
+
+    def create_widgets_part_2(self):
+        """Creating the widgets_part_2 of frame/class UebersichtInterface
+        -> being called by aktualisieren_event"""
+
+        logging.debug("UebersichtInterface.create_widgets_part_2() called")
+
+        self.frame_2 = customtkinter.CTkScrollableFrame(self, corner_radius=0)
+
+        headings = ["Monat", "Kürzel", "Art", "Anzahl", "km", "Umsatz"]
+        rows = [
+            [month, kuerzel, art, str(anzahl), f"{km:.1f}", f"{umsatz:.2f} €"]
+            for month, kuerzel, art, anzahl, umsatz, km in self.summary
+        ]
+        rows.append(
+            [
+                "Gesamt",
+                "",
+                "",
+                str(sum(i[3] for i in self.summary)),
+                f"{sum(i[5] for i in self.summary):.1f}",
+                f"{sum(i[4] for i in self.summary):.2f} €",
+            ]
+        )
+
+        self.row_frames = []
+        for index, row in enumerate([headings] + rows):
+            if index % 2 != 0:
+                frame = customtkinter.CTkFrame(
+                    self.frame_2, corner_radius=0, fg_color="gray25"
+                )
+            else:
+                frame = customtkinter.CTkFrame(self.frame_2, corner_radius=0)
+            self.row_frames.append(
+                (
+                    frame,
+                    [
+                        customtkinter.CTkLabel(
+                            frame,
+                            width=100,
+                            text=i,
+                            font=self.parent.small_heading
+                            if index in (0, len(rows))
+                            else None,
+                        )
+                        for i in row
+                    ],
+                )
+            )
+
+    def create_layout_part_2(self):
+        """Creating the layout_part_2 of frame/class UebersichtInterface
+        -> being called by aktualisieren_event"""
+
+        logging.debug("UebersichtInterface.create_layout_part_2() called")
+
+        self.frame_2.pack(side="top", fill="both", expand=True, pady=20, padx=20)
+        self.frame_2.grid_columnconfigure(0, weight=1)
+
+        for index, (frame, labels) in enumerate(self.row_frames):
+            frame.grid(row=index, column=0, sticky="nsew")
+            for column, label in enumerate(labels):
+                frame.grid_columnconfigure(column, weight=1)
+                label.grid(row=0, column=column, ipadx=10, ipady=6, sticky="ew")
+
+    def aktualisieren_event(self):
+        """reads the rollups with the filter criteria and updates the widgets and
+        layout part_2"""
+
+        logging.debug("UebersichtInterface.aktualisieren_event() called")
+        started = time.perf_counter()
+
+        try:
+            self.frame_2.pack_forget()
+            self.frame_2.destroy()
+        except AttributeError:
+            pass
+
+        self.summary = self.parent.rollups.summary(
+            self.year_option_menu.get(),
+            self.segmented_button_1.get(),
+            self.search_entry.get(),
+        )
+
+        self.create_widgets_part_2()
+        self.create_layout_part_2()
+        self.parent.focus_set()
+        self.parent.log_first_query("übersicht", started)
+
+    def rebuild_event(self):
+        """recomputes the rollups out of all stored rechnungen"""
+
+        logging.debug("UebersichtInterface.rebuild_event() called")
+
+        self.parent.rollups.rebuild()
+        self.year_option_menu.configure(
+            values=self.parent.rollups.years() or [str(self.parent.year)]
+        )
+        self.aktualisieren_event()
+
+        self.parent.bottom_nav.bottom_nav_warning.configure(
+            text="Übersicht neu berechnet!", fg_color="green"
+        )
+
+    def integrity_event(self, force: bool = False):
+        """starts the integrity scan in the background if the cached findings are
+        outdated (or always with force) and shows the findings"""
+
+        logging.debug("UebersichtInterface.integrity_event() called")
+
+        self.parent.integrity_scanner.start(force)
+        self.poll_integrity()
+
+    def poll_integrity(self):
+        """shows the progress of the scan, the findings when it is done"""
+
+        if not self.winfo_exists():
+            return
+
+        scanner = self.parent.integrity_scanner
+        if scanner.running:
+            self.integrity_button.configure(state="disabled")
+            self.integrity_label.configure(text=scanner.progress)
+            self.after(200, self.poll_integrity)
+            return
+
+        self.integrity_button.configure(state="normal")
+        if scanner.signature is None:
+            self.integrity_label.configure(text=scanner.progress)
+            return
+
+        self.integrity_label.configure(
+            text=f"{len(scanner.findings)} Auffälligkeit(en)"
+            if scanner.findings
+            else "in Ordnung"
+        )
+        self.integrity_textbox.configure(state="normal")
+        self.integrity_textbox.delete("0.0", "end")
+        self.integrity_textbox.insert("0.0", scanner.report())
+        self.integrity_textbox.configure(state="disabled")
+
+
 class EinstellungInterface(customtkinter.CTkScrollableFrame):
     """Creating the Einstellung Interface frame, widgets and layout part_1.
     Main setting Interface!"""
@@ -4185,6 +4980,12 @@ class EinstellungInterface(customtkinter.CTkScrollableFrame):
         self.frame_3_logs_folder_location_var = tk.StringVar(
             value=f"{self.parent.log_location}"
         )
+        self.frame_3_storage_backend_var = tk.StringVar(
+            value=f"{self.parent.storage_backend}"
+        )
+        self.frame_3_stammdaten_store_var = tk.StringVar(
+            value=f"{self.parent.stammdaten_store}"
+        )
         self.frame_4_steuer_id_var = tk.StringVar(value=f"{self.parent.steuer_id}")
         self.frame_4_iban_var = tk.StringVar(value=f"{self.parent.iban}")
         self.frame_4_bic_var = tk.StringVar(value=f"{self.parent.bic}")
@@ -4528,6 +5329,29 @@ class EinstellungInterface(customtkinter.CTkScrollableFrame):
             command=lambda: self.change_dir_path("log_location"),
         )
 
+        # Separator
+        self.separator_9 = ttk.Separator(self.frame_3, orient="horizontal")
+
+        # Storage backend
+        self.storage_backend_label = customtkinter.CTkLabel(
+            self.frame_3, text="Datenspeicherung:"
+        )
+        self.storage_backend_segmented_button = customtkinter.CTkSegmentedButton(
+            self.frame_3,
+            values=["csv", "sqlite"],
+            variable=self.frame_3_storage_backend_var,
+            command=lambda x: self.detect_change(x, "storage_backend"),
+        )
+        self.stammdaten_store_label = customtkinter.CTkLabel(
+            self.frame_3, text="Stammdaten in:"
+        )
+        self.stammdaten_store_segmented_button = customtkinter.CTkSegmentedButton(
+            self.frame_3,
+            values=["dateien", "datei"],
+            variable=self.frame_3_stammdaten_store_var,
+            command=lambda x: self.detect_change(x, "stammdaten_store"),
+        )
+
     def create_layout_part_2(self):
         """Creating the layout_part_2 of frame/class EinstellungenInterface"""
 
@@ -4598,6 +5422,18 @@ class EinstellungInterface(customtkinter.CTkScrollableFrame):
         self.log_location_entry.grid(row=11, column=1, padx=10, pady=4, sticky="ew")
         self.log_location_button.grid(row=11, column=2, padx=10, pady=4, sticky="w")
 
+        # Separator
+        self.separator_9.grid(row=12, column=0, columnspan=10, pady=20, sticky="ew")
+
+        self.storage_backend_label.grid(row=13, column=0, padx=10, pady=4, sticky="w")
+        self.storage_backend_segmented_button.grid(
+            row=13, column=1, padx=10, pady=4, sticky="w"
+        )
+        self.stammdaten_store_label.grid(row=14, column=0, padx=10, pady=4, sticky="w")
+        self.stammdaten_store_segmented_button.grid(
+            row=14, column=1, padx=10, pady=4, sticky="w"
+        )
+
     def advanced_options_switch_event(self):
         """Creates/destroys/toggles the frame for advanced options."""
 
@@ -4649,6 +5485,8 @@ class EinstellungInterface(customtkinter.CTkScrollableFrame):
             "stammdaten_location",
             "backup_location",
             "log_location",
+            "storage_backend",
+            "stammdaten_store",
         ]:
             if kind not in self.changes and text_after_action != getattr(
                     self.parent, kind):
@@ -4749,6 +5587,62 @@ class EinstellungInterface(customtkinter.CTkScrollableFrame):
                         yaml.dump(properties_dict, f)
 
                     logging.info("log location changed successfully")
+                elif kind == "storage_backend":
+                    old_storage = self.parent.storage
+                    self.parent.storage_backend = self.frame_3_storage_backend_var.get()
+
+                    if not os.path.exists("./system/properties.yml"):
+                        self.parent.setup_working_dirs_and_logging()
+
+                    with open("./system/properties.yml", "r") as a:
+                        properties_dict = yaml.safe_load(a)
+                        properties_dict["storage_backend"] = self.parent.storage_backend
+                    with open("./system/properties.yml", "w") as f:
+                        yaml.dump(properties_dict, f)
+
+                    self.parent.storage = None
+                    self.parent.setup_storage()
+
+                    # one shot migration/export of the existing data
+                    if old_storage is not None:
+                        if messagebox.askyesno(
+                                "Datenspeicherung",
+                                f"Sollen die vorhandenen Daten aus {old_storage.name} nach "
+                                f"{self.parent.storage.name} übernommen werden?",
+                        ):
+                            self.parent.storage.copy_from(old_storage)
+                            self.parent.rollups.rebuild()
+                        old_storage.close()
+
+                    logging.info("storage backend changed successfully")
+                elif kind == "stammdaten_store":
+                    old_repository = self.parent.stammdaten_repository
+                    self.parent.stammdaten_store = self.frame_3_stammdaten_store_var.get()
+
+                    if not os.path.exists("./system/properties.yml"):
+                        self.parent.setup_working_dirs_and_logging()
+
+                    with open("./system/properties.yml", "r") as a:
+                        properties_dict = yaml.safe_load(a)
+                        properties_dict["stammdaten_store"] = self.parent.stammdaten_store
+                    with open("./system/properties.yml", "w") as f:
+                        yaml.dump(properties_dict, f)
+
+                    # keep the old store open for the migration/export
+                    old_source = old_repository.storage if old_repository else None
+                    self.parent.stammdaten_repository = None
+                    self.parent.setup_stammdaten()
+
+                    if old_source is not None:
+                        if messagebox.askyesno(
+                                "Stammdaten",
+                                "Sollen die vorhandenen Stammdaten übernommen werden?",
+                        ):
+                            self.parent.stammdaten_repository.copy_from(old_source)
+                        if isinstance(old_source, StammdatenDatenbank):
+                            old_source.close()
+
+                    logging.info("stammdaten store changed successfully")
 
                 elif kind == "debug_mode":
                     if self.frame_3_switch_var_1.get() == "off":
@@ -4915,6 +5809,8 @@ class EinstellungInterface(customtkinter.CTkScrollableFrame):
 
                     logging.info("price_to changed successfully")
 
+            self.parent.setup_storage()
+
         self.parent.bottom_nav.bottom_nav_warning.configure(
             text="Änderungen gespeichert!", fg_color="green"
         )
@@ -5014,111 +5910,3891 @@ class UpdateYearToplevelWindow(customtkinter.CTkToplevel):
             self.label_var.set("Format Datum -> YYYY / 2023")
 
 
-class KgPdf(FPDF):
-    """overwrites the default FPDF2 header and footer functions for KG Rechnung."""
+class RenderToplevelWindow(customtkinter.CTkToplevel):
+    """spawns the toplevel window to render the pdfs of a year again"""
 
-    def __init__(self, rechnungsnummer: str, steuer_id: str, iban: str, bic: str):
-        super().__init__()
-        self.rechnungsnummer = rechnungsnummer
-        self.steuer_id = steuer_id
-        self.iban = iban
-        self.bic = bic
+    window_width = 300
+    window_height = 330
 
-    def header(self):
-        """New PDF header section"""
+    def __init__(self, parent, interface):
+        """creates widgets and layout of the toplevel window."""
+        super().__init__(parent)
 
-        # Logo
-        try:
-            self.image(
-                x=22,
-                y=17,
-                name="./system/components/images/logo.png",
-                w=18,
-                alt_text="Logo",
+        logging.info("class RenderToplevelWindow() called")
+
+        self.parent = parent
+        self.interface = interface
+
+        # text variables
+        self.year_var = tk.StringVar(value=str(self.parent.year))
+        self.kuerzel_var = tk.StringVar()
+        self.von_var = tk.StringVar()
+        self.bis_var = tk.StringVar()
+        self.label_var = tk.StringVar()
+
+        self.wm_transient(parent)
+        self.grab_set()
+
+        screen_width = self.winfo_screenwidth()
+        screen_height = self.winfo_screenheight()
+        x_coordinate = int((screen_width / 2) - (int(self.window_width) / 2))
+        y_coordinate = int((screen_height / 2) - (int(self.window_height) / 2))
+        self.title("PDFs neu erstellen")
+        self.resizable(False, False)
+        self.geometry(
+            f"{self.window_width}x{self.window_height}+{x_coordinate}+{y_coordinate}"
+        )
+        self.configure(fg_color="gray16")
+
+        for text, variable in (
+                ("Jahr:", self.year_var),
+                ("Kürzel (optional):", self.kuerzel_var),
+                ("Rechnungsdatum von (optional):", self.von_var),
+                ("Rechnungsdatum bis (optional):", self.bis_var),
+        ):
+            customtkinter.CTkLabel(self, text=text).pack(padx=20, pady=(4, 0))
+            entry = customtkinter.CTkEntry(self, textvariable=variable)
+            entry.bind("<Return>", self.render_button_event)
+            entry.pack(padx=20, pady=(0, 4))
+
+        self.button = customtkinter.CTkButton(
+            self, text="Erstellen", command=lambda: self.render_button_event()
+        )
+        self.button.pack(padx=20, pady=4)
+
+        self.label_2 = customtkinter.CTkLabel(
+            self, text="", textvariable=self.label_var, text_color="red"
+        )
+        self.label_2.pack(padx=20, pady=(4, 20))
+
+    def render_button_event(self, *args):
+        """Triggered when Erstellen is pressed. Checks the entries, starts the
+        rendering in the interface and destroys the window"""
+
+        logging.debug(f"RenderToplevelWindow.render_button_event() called; args = {args}")
+
+        year = self.year_var.get().strip()
+        kuerzel = self.kuerzel_var.get().strip()
+        von = self.von_var.get().strip()
+        bis = self.bis_var.get().strip()
+
+        if not re.match("^[12][0-9]{3}$", year):
+            return self.label_var.set("Format Jahr -> YYYY / 2023")
+        if kuerzel and len(kuerzel) != 4:
+            return self.label_var.set("Kürzel muss 4 Zeichen lang sein!")
+        for datum in (von, bis):
+            if datum and not RechnungValidator.is_datum(datum):
+                return self.label_var.set("Format Datum -> dd.mm.yy")
+
+        self.interface.render(year, kuerzel, von, bis)
+        self.destroy()
+
+
+class RechnungCodec:
+    """Encodes/decodes the rows of rechnungen-{year}.csv and drafts.
+
+    KG rows: kuerzel, rechnungsnummer, km, "km", km total, "km", gesamtpreis,
+    "Euro", 10 behandlungsdaten, behandlungsarten (list), einzelpreise (list).
+    HP rows (rechnungsnummer ends with H): the 8 common columns, behandlungsdaten
+    (2d list), diagnose.
+
+    Version 2 rows store the list cells as json and end with the cell "v2".
+    Version 3 rows ("v3") also store the diagnose as json, so its line breaks
+    survive without breaking the line based readers of the ledger. Older rows hold
+    python reprs of the lists, they are still read (json first, falls back to
+    ast.literal_eval for reprs json can't parse)."""
+
+    version = "v3"
+    versions = ("v2", "v3")
+
+    @staticmethod
+    def list_columns(row: list) -> tuple:
+        """returns the indices of the list cells of the row"""
+
+        if len(row) > 1 and str(row[1]).endswith("H"):
+            return (8,)
+        return 18, 19
+
+    @staticmethod
+    def text_columns(row: list) -> tuple:
+        """returns the indices of the multi line text cells of the row"""
+
+        if len(row) > 1 and str(row[1]).endswith("H"):
+            return (9,)
+        return ()
+
+    @classmethod
+    def encode(cls, row: list) -> list:
+        """returns the cells of the row at the current version (cls.version)"""
+
+        columns = cls.list_columns(row)
+        text_columns = cls.text_columns(row)
+        cells = []
+        for index, i in enumerate(row):
+            if index in columns and isinstance(i, (list, tuple)):
+                cells.append(json.dumps(i, ensure_ascii=False, separators=(",", ":")))
+            elif index in text_columns:
+                cells.append(json.dumps("" if i is None else str(i), ensure_ascii=False))
+            else:
+                cells.append("" if i is None else str(i))
+        cells.append(cls.version)
+        return cells
+
+    @staticmethod
+    def decode_cell(cell: str, legacy: bool):
+        """parses a list cell"""
+
+        if not legacy:
+            return json.loads(cell)
+        try:
+            return json.loads(cell)
+        except ValueError:
+            return ast.literal_eval(cell)
+
+    @classmethod
+    def decode(cls, cells: list) -> list:
+        """returns the row of the cells with the list cells parsed"""
+
+        version = cells[-1] if cells and cells[-1] in cls.versions else None
+        legacy = version is None
+        row = list(cells) if legacy else cells[:-1]
+
+        for index in cls.list_columns(row):
+            if index < len(row):
+                try:
+                    row[index] = cls.decode_cell(row[index], legacy)
+                except (ValueError, SyntaxError):
+                    logging.warning(f"RechnungCodec: cell {index} of {row[1]} corrupt")
+        if version == "v3":
+            for index in cls.text_columns(row):
+                if index < len(row):
+                    try:
+                        row[index] = json.loads(row[index])
+                    except ValueError:
+                        logging.warning(f"RechnungCodec: cell {index} of {row[1]} corrupt")
+        return row
+
+    @classmethod
+    def iter_decode(cls, lines):
+        """streaming decoder: yields the decoded rows of csv lines (a file object
+        or any iterable of lines)"""
+
+        for cells in csv.reader(lines, delimiter=";"):
+            if len(cells) > 1 and cells[0] != RechnungenIndex.tombstone:
+                yield cls.decode(cells)
+
+
+class RechnungRecord:
+    """Base of KgRechnungRecord and HpRechnungRecord. The records are tuples over
+    the cells of a decoded row (see RechnungCodec), so they are stored, encoded and
+    compared like the row itself."""
+
+    __slots__ = ()
+
+    # indices of the list cells
+    list_columns = ()
+
+    @staticmethod
+    def create(row):
+        """returns the HpRechnungRecord or KgRechnungRecord of the decoded row"""
+
+        if isinstance(row, RechnungRecord):
+            return row
+        if len(row) > 1 and str(row[1]).endswith("H"):
+            return HpRechnungRecord.from_row(row)
+        return KgRechnungRecord.from_row(row)
+
+    @classmethod
+    def from_row(cls, row):
+        """creates the record out of the row, the cells are not copied. Missing
+        cells are empty, surplus cells are dropped"""
+
+        if len(row) == len(cls._fields):
+            return cls._make(row)
+
+        cells = list(row[:len(cls._fields)])
+        for index in range(len(cells), len(cls._fields)):
+            cells.append([] if index in cls.list_columns else "")
+        return cls._make(cells)
+
+    @property
+    def rechnungsdatum(self) -> str:
+        """dd.mm.yy out of the rechnungsnummer"""
+
+        datum = self.rechnungsnummer[len(self.kuerzel):len(self.kuerzel) + 6]
+        return f"{datum[:2]}.{datum[2:4]}.{datum[4:6]}"
+
+
+class KgRechnungRecord(
+    RechnungRecord,
+    collections.namedtuple(
+        "KgRechnungRecord",
+        "kuerzel rechnungsnummer km km_einheit km_total km_total_einheit gesamtpreis "
+        "waehrung datum_1 datum_2 datum_3 datum_4 datum_5 datum_6 datum_7 datum_8 "
+        "datum_9 datum_10 behandlungsarten einzelpreise",
+    ),
+):
+    """One KG rechnung: the 8 common cells, 10 behandlungsdaten (empty ones last),
+    the behandlungsarten and their einzelpreise"""
+
+    __slots__ = ()
+
+    list_columns = (18, 19)
+    is_hp = False
+
+    @property
+    def behandlungsdaten(self) -> tuple:
+        return self[8:18]
+
+    @property
+    def datenanzahl(self) -> int:
+        """number of given behandlungsdaten"""
+
+        return sum(1 for i in self[8:18] if i)
+
+
+class HpRechnungRecord(
+    RechnungRecord,
+    collections.namedtuple(
+        "HpRechnungRecord",
+        "kuerzel rechnungsnummer km km_einheit km_total km_total_einheit gesamtpreis "
+        "waehrung behandlungsdaten diagnose",
+    ),
+):
+    """One HP rechnung: the 8 common cells, the behandlungsdaten (rows of datum,
+    ziffern, behandlungen, betraege) and the diagnose"""
+
+    __slots__ = ()
+
+    list_columns = (8,)
+    is_hp = True
+
+
+class DraftRecord(collections.namedtuple("DraftRecord", "filename created modified")):
+    """One draft as listed by Storage.list_drafts"""
+
+    __slots__ = ()
+
+    @property
+    def rechnungsnummer(self) -> str:
+        return self.filename.replace("DRAFT.csv", "")
+
+
+class RechnungenIndex:
+    """Sidecar index for rechnungen-{year}.csv. Maps every Rechnungsnummer to the
+    byte offset(s) of its row(s), so a Rechnung is found with one seek instead of
+    scanning the whole csv file.
+
+    The index file (rechnungen-{year}.idx) is append only. Every line holds
+    rechnungsnummer;offset;csv size after the row. The size of the last line is
+    compared with the csv file to detect a stale index, which is rebuilt then.
+
+    Deleted Rechnungen aren't removed from the csv file. A tombstone row
+    (#DELETED;rechnungsnummer) is appended instead, which hides all rows of the
+    rechnungsnummer before it. Tombstones are stored with offset -1 in the index.
+    The dead rows are removed by compaction (CsvStorage.compact)."""
+
+    tombstone = "#DELETED"
+
+    def __init__(self, csv_path: str):
+        self.csv_path = csv_path
+        self.index_path = f"{os.path.splitext(csv_path)[0]}.idx"
+        self.offsets = {}
+        self.indexed_size = 0
+        self.total_rows = 0
+        self.dead_rows = 0
+        self.lock = threading.RLock()
+
+        self.load()
+
+    def load(self):
+        """reads the index file. Rebuilds the index if it is missing or stale"""
+
+        logging.debug("RechnungenIndex.load() called")
+
+        with self.lock:
+            self.offsets = {}
+            self.indexed_size = 0
+            self.total_rows = 0
+            self.dead_rows = 0
+
+            if os.path.exists(self.index_path):
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            rechnungsnummer, offset, size = line.rstrip("\n").split(";")
+                            if rechnungsnummer:
+                                self.register(rechnungsnummer, int(offset))
+                            self.indexed_size = int(size)
+                        except ValueError:
+                            logging.info(f"{self.index_path} corrupt, rebuilding")
+                            return self.rebuild()
+
+            if self.is_stale():
+                self.rebuild()
+
+    def register(self, rechnungsnummer: str, offset: int):
+        """adds a row or tombstone (offset -1) to the in memory index"""
+
+        self.total_rows += 1
+        if offset == -1:
+            self.dead_rows += len(self.offsets.pop(rechnungsnummer, [])) + 1
+        else:
+            self.offsets.setdefault(rechnungsnummer, []).append(offset)
+
+    def dead_ratio(self) -> float:
+        """returns the share of dead rows (deleted rows and tombstones) in the csv"""
+
+        if not self.total_rows:
+            return 0.0
+        return self.dead_rows / self.total_rows
+
+    def csv_size(self) -> int:
+        """returns the current size of the csv file in bytes"""
+
+        try:
+            return os.path.getsize(self.csv_path)
+        except FileNotFoundError:
+            return 0
+
+    def is_stale(self) -> bool:
+        """index is stale when the csv file was changed without updating the index"""
+
+        return self.csv_size() != self.indexed_size
+
+    def rebuild(self):
+        """scans the csv file once and rewrites the index file"""
+
+        logging.debug("RechnungenIndex.rebuild() called")
+
+        with self.lock:
+            self.offsets = {}
+            self.total_rows = 0
+            self.dead_rows = 0
+            lines = []
+            offset = 0
+
+            with LedgerReader(self.csv_path) as reader:
+                for record in reader.records():
+                    if record.rechnungsnummer:
+                        row_offset = -1 if record.tombstone else record.offset
+                        self.register(record.rechnungsnummer, row_offset)
+                        lines.append(
+                            f"{record.rechnungsnummer};{row_offset};{record.end}\n"
+                        )
+                offset = reader.size()
+
+            self.indexed_size = offset
+
+            with open(f"{self.index_path}.tmp", "w", encoding="utf-8") as f:
+                f.writelines(lines)
+                # remembers the csv size, also for an empty index or trailing blank lines
+                f.write(f";0;{offset}\n")
+            os.replace(f"{self.index_path}.tmp", self.index_path)
+
+            logging.info(f"rebuilt {os.path.basename(self.index_path)}")
+
+    @staticmethod
+    def parse_line(line) -> list:
+        """returns the parsed row of a raw csv line (bytes or a memoryview)"""
+
+        return next(csv.reader([str(line, "utf-8")], delimiter=";"), [])
+
+    def add(self, rechnungsnummer: str, offset: int, size: int, tombstone=False):
+        """registers a row or tombstone appended to the csv file at offset"""
+
+        with self.lock:
+            if self.indexed_size != offset:
+                # csv was changed by someone else in the meantime
+                self.rebuild()
+                return
+
+            if tombstone:
+                offset = -1
+            self.register(rechnungsnummer, offset)
+            self.indexed_size = size
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(f"{rechnungsnummer};{offset};{size}\n")
+
+    def add_many(self, entries: list, offset: int, size: int):
+        """registers (rechnungsnummer, offset) of rows appended together to the csv
+        file, which grew from offset to size"""
+
+        with self.lock:
+            if self.indexed_size != offset:
+                self.rebuild()
+                return
+
+            for rechnungsnummer, row_offset in entries:
+                self.register(rechnungsnummer, row_offset)
+            self.indexed_size = size
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.writelines(f"{i};{o};{size}\n" for i, o in entries)
+
+    def read_row(self, offset: int) -> list:
+        """reads and parses the single csv row starting at offset"""
+
+        with open(self.csv_path, "rb") as f:
+            f.seek(offset)
+            line = f.readline()
+        return self.parse_line(line)
+
+    def find(self, rechnungsnummer: str) -> list:
+        """returns all live rows with the given rechnungsnummer (normally exactly one)"""
+
+        logging.debug("RechnungenIndex.find() called")
+
+        with self.lock:
+            if self.is_stale():
+                self.rebuild()
+
+            rows = [self.read_row(i) for i in self.offsets.get(rechnungsnummer, [])]
+            if any(
+                    len(row) < 2 or row[1] != rechnungsnummer or row[0] == self.tombstone
+                    for row in rows
+            ):
+                # csv was rewritten without changing its size
+                self.rebuild()
+                rows = [self.read_row(i) for i in self.offsets.get(rechnungsnummer, [])]
+
+            return rows
+
+
+class LedgerRecord(collections.namedtuple("LedgerRecord", "offset end cells")):
+    """One row of rechnungen-{year}.csv and the byte offsets it starts and ends at"""
+
+    __slots__ = ()
+
+    @property
+    def tombstone(self) -> bool:
+        return self.cells[0] == RechnungenIndex.tombstone
+
+    @property
+    def kuerzel(self) -> str:
+        return self.cells[0]
+
+    @property
+    def rechnungsnummer(self) -> str:
+        return self.cells[1]
+
+    @property
+    def art(self) -> str:
+        return "HP" if self.cells[1].endswith("H") else "KG"
+
+    @property
+    def km_total(self) -> float:
+        return RechnungenRollups.number(self.cells[4]) if len(self.cells) > 4 else 0.0
+
+    @property
+    def gesamtpreis(self) -> float:
+        return RechnungenRollups.number(self.cells[6]) if len(self.cells) > 6 else 0.0
+
+
+class LedgerReader:
+    """Memory-maps rechnungen-{year}.csv and yields its rows lazily, forwards or
+    backwards (newest first), without reading the file into memory. Use it as a
+    context manager so the mapping is closed again."""
+
+    def __init__(self, csv_path: str):
+        self.csv_path = csv_path
+        self.file = None
+        self.mm = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self):
+        """maps the file. Missing and empty files can't be mapped and yield nothing"""
+
+        try:
+            self.file = open(self.csv_path, "rb")
+        except FileNotFoundError:
+            return
+        if os.fstat(self.file.fileno()).st_size:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        """closes the mapping and the file"""
+
+        if self.mm is not None:
+            try:
+                self.mm.close()
+            except BufferError:
+                # a line of an unfinished lines() is still referenced, the mapping is
+                # unmapped once it is gone
+                logging.debug(f"{self.csv_path} still has line views, not unmapped yet")
+            self.mm = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def size(self) -> int:
+        """returns the size of the mapped file"""
+
+        return len(self.mm) if self.mm is not None else 0
+
+    def lines(self, offset: int = 0):
+        """yields (offset, line) from offset to the end of the file. line is a
+        memoryview into the mapping, nothing is copied. It has to be released (or
+        dropped) before the reader is closed, an open view keeps the mapping busy"""
+
+        if self.mm is None:
+            return
+
+        view = memoryview(self.mm)
+        try:
+            while offset < len(self.mm):
+                end = self.mm.find(b"\n", offset)
+                end = len(self.mm) if end == -1 else end + 1
+                yield offset, view[offset:end]
+                offset = end
+        finally:
+            view.release()
+
+    def reversed_lines(self):
+        """yields (offset, line) from the end to the start of the file, line is a
+        memoryview like in lines()"""
+
+        if self.mm is None:
+            return
+
+        view = memoryview(self.mm)
+        try:
+            end = len(self.mm)
+            while end > 0:
+                start = self.mm.rfind(b"\n", 0, end - 1) + 1
+                yield start, view[start:end]
+                end = start
+        finally:
+            view.release()
+
+    def records(self, offset: int = 0, reverse: bool = False):
+        """yields a LedgerRecord for every non empty row"""
+
+        lines = self.reversed_lines() if reverse else self.lines(offset)
+        for line_offset, line in lines:
+            with line:
+                cells = RechnungenIndex.parse_line(line)
+                end = line_offset + len(line)
+            if len(cells) > 1:
+                yield LedgerRecord(line_offset, end, cells)
+
+    def record_at(self, offset: int):
+        """seeks to offset and returns the record of the row starting there"""
+
+        for record in self.records(offset):
+            return record
+        return None
+
+    def live_records(self, reverse: bool = False, live_offsets=None):
+        """yields the records not hidden by a tombstone. Backwards the tombstones are
+        seen before the rows they hide. Forwards live_offsets (out of the
+        RechnungenIndex) tells which rows are alive"""
+
+        if reverse:
+            deleted = set()
+            for record in self.records(reverse=True):
+                if record.tombstone:
+                    deleted.add(record.rechnungsnummer)
+                elif record.rechnungsnummer not in deleted:
+                    yield record
+        else:
+            for record in self.records():
+                if not record.tombstone and (
+                        live_offsets is None or record.offset in live_offsets
+                ):
+                    yield record
+
+
+class StammdatenRecord(
+    collections.namedtuple(
+        "StammdatenRecord",
+        "kuerzel mann_frau nachname vorname strasse hausnummer plz ort geburtsdatum "
+        "km hausarzt email kg_hp telefon",
+    )
+):
+    """One stammdatei. The fields are the 14 lines of {kuerzel}.txt in the order of
+    StammdatenInterface.stammdaten_label_names. Being a tuple, the record can still
+    be indexed and iterated like the line list."""
+
+    __slots__ = ()
+
+    @classmethod
+    def from_lines(cls, lines: list):
+        """creates the record out of the lines. Missing lines are empty"""
+
+        lines = list(lines[:len(cls._fields)])
+        lines.extend([""] * (len(cls._fields) - len(lines)))
+        return cls(*lines)
+
+    @property
+    def kilometer(self) -> float:
+        """km as float. Raises ValueError"""
+
+        return float(self.km)
+
+    @property
+    def is_hp(self) -> bool:
+        """checks if the patient is a HP patient"""
+
+        return self.kg_hp == "HP"
+
+
+class StammdatenIndex:
+    """Trigram inverted index over all fields of the stammdaten
+    ({stammdaten_location}/stammdaten-index.json).
+
+    Every stammdatei is stored as one text (its fields and filename), together
+    with the modified time it was indexed at. A query is looked up through the
+    intersection of the posting sets of its trigrams, and the few candidates are
+    then checked with the same substring match the list always used. refresh()
+    brings the index up to date with the listing of the storage, re-reading only
+    stammdateien whose modified time changed."""
+
+    def __init__(self, repository: "StammdatenRepository"):
+        self.repository = repository
+        self.path = f"{repository.storage.stammdaten_location}/stammdaten-index.json"
+        # shared with the repository, which it reads records from
+        self.lock = repository.lock
+        # kuerzel -> [modified, text, KG/HP]
+        self.docs = {}
+        self.trigrams = {}
+
+        self.load()
+
+    def load(self):
+        """reads the persisted index. Starts empty if it is missing or corrupt"""
+
+        logging.debug("StammdatenIndex.load() called")
+
+        with self.lock:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self.docs = data["docs"]
+                self.trigrams = {key: set(value) for key, value in data["trigrams"].items()}
+            except FileNotFoundError:
+                pass
+            except (ValueError, KeyError, TypeError, AttributeError):
+                logging.info("stammdaten-index.json corrupt, rebuilding")
+                self.docs = {}
+                self.trigrams = {}
+
+    def save(self):
+        """writes stammdaten-index.json"""
+
+        with self.lock:
+            try:
+                with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                    json.dump(
+                        {
+                            "docs": self.docs,
+                            "trigrams": {
+                                key: sorted(value) for key, value in self.trigrams.items()
+                            },
+                        },
+                        f,
+                        ensure_ascii=False,
+                    )
+                os.replace(f"{self.path}.tmp", self.path)
+            except OSError as e:
+                logging.warning(f"couldn't write stammdaten-index.json: {e}")
+
+    @staticmethod
+    def split(text: str) -> set:
+        """returns the lowercase trigrams of text"""
+
+        text = text.lower()
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def add(self, kuerzel: str, record, modified=None, save=True):
+        """(re)indexes the record. modified None means the record was just stored
+        and takes the modified time of the next listing"""
+
+        with self.lock:
+            self.discard(kuerzel, save=False)
+            text = "\n".join([*record, f"{kuerzel}.txt"])
+            self.docs[kuerzel] = [modified, text, record[12]]
+            for i in text.split("\n"):
+                for trigram in self.split(i):
+                    self.trigrams.setdefault(trigram, set()).add(kuerzel)
+            if save:
+                self.save()
+
+    def discard(self, kuerzel: str, save=True):
+        """removes kuerzel out of the index"""
+
+        with self.lock:
+            doc = self.docs.pop(kuerzel, None)
+            if doc is None:
+                return
+            for i in doc[1].split("\n"):
+                for trigram in self.split(i):
+                    postings = self.trigrams.get(trigram)
+                    if postings is not None:
+                        postings.discard(kuerzel)
+                        if not postings:
+                            self.trigrams.pop(trigram)
+            if save:
+                self.save()
+
+    def refresh(self, listing: list):
+        """updates the index with the listing (kuerzel, created, modified) of the
+        storage"""
+
+        with self.lock:
+            changed = False
+            current = {kuerzel: modified for kuerzel, created, modified in listing}
+
+            for kuerzel in set(self.docs) - set(current):
+                self.discard(kuerzel, save=False)
+                changed = True
+
+            for kuerzel, modified in current.items():
+                doc = self.docs.get(kuerzel)
+                if doc is not None and doc[0] is None:
+                    doc[0] = modified
+                    changed = True
+                elif doc is None or doc[0] != modified:
+                    record = self.repository.get(kuerzel)
+                    if record is None:
+                        self.discard(kuerzel, save=False)
+                    else:
+                        self.add(kuerzel, record, modified, save=False)
+                    changed = True
+
+            if changed:
+                self.save()
+
+    def search(self, query: str, art: str = "Alle") -> list:
+        """returns the sorted kuerzel whose fields or filename contain query
+        (KG/HP only with art)"""
+
+        with self.lock:
+            trigrams = self.split(query)
+            if trigrams:
+                postings = sorted(
+                    (self.trigrams.get(i, set()) for i in trigrams), key=len
+                )
+                candidates = set.intersection(*postings)
+            else:
+                candidates = self.docs
+
+            return sorted(
+                kuerzel
+                for kuerzel in candidates
+                if art in ("Alle", self.docs[kuerzel][2])
+                and query in self.docs[kuerzel][1]
+            )
+
+
+class KuerzelTrie:
+    """Prefix trie over the kuerzel and the names (nachname, vorname) of all
+    patients. complete() walks only the nodes below the typed prefix, so a lookup
+    never touches the disk."""
+
+    def __init__(self):
+        # char -> child node; the key "" holds the kuerzel whose word ends here
+        self.root = {}
+        # kuerzel -> (words, label)
+        self.entries = {}
+
+    def add(self, kuerzel: str, record: "StammdatenRecord"):
+        """(re)inserts the kuerzel and names of record"""
+
+        self.discard(kuerzel)
+        words = {
+            i.lower() for i in (kuerzel, record.nachname, record.vorname) if i.strip()
+        }
+        for word in words:
+            node = self.root
+            for char in word:
+                node = node.setdefault(char, {})
+            node.setdefault("", set()).add(kuerzel)
+        label = ", ".join(i for i in (record.nachname, record.vorname) if i)
+        self.entries[kuerzel] = (words, label)
+
+    def discard(self, kuerzel: str):
+        """removes kuerzel"""
+
+        entry = self.entries.pop(kuerzel, None)
+        if entry is None:
+            return
+        for word in entry[0]:
+            node = self.root
+            for char in word:
+                node = node.get(char)
+                if node is None:
+                    break
+            else:
+                node.get("", set()).discard(kuerzel)
+
+    def __contains__(self, kuerzel: str) -> bool:
+        return kuerzel in self.entries
+
+    def complete(self, prefix: str, limit: int = 8) -> list:
+        """returns up to limit (kuerzel, label) whose kuerzel or name starts with
+        prefix, shortest words first"""
+
+        node = self.root
+        for char in prefix.lower():
+            node = node.get(char)
+            if node is None:
+                return []
+
+        matches = []
+        level = [node]
+        while level and len(matches) < limit:
+            next_level = []
+            for node in level:
+                for kuerzel in heapq.nsmallest(limit, node.get("", ())):
+                    if kuerzel not in matches:
+                        matches.append(kuerzel)
+                if len(matches) >= limit:
+                    break
+                next_level.extend(node[i] for i in sorted(node) if i)
+            level = next_level
+
+        return [(i, self.entries[i][1]) for i in matches[:limit]]
+
+
+class StammdatenRepository:
+    """Process wide cache of the stammdaten. Every record is loaded once and served
+    out of memory until the signature of its stammdatei (mtime and size of the
+    file, the modified time of the row in sqlite) changes."""
+
+    def __init__(self, storage: "Storage"):
+        self.storage = storage
+        self.lock = threading.RLock()
+        self.records = {}
+        self.index = StammdatenIndex(self)
+        self.trie = KuerzelTrie()
+        self.trie_ready = False
+
+    def get(self, kuerzel: str):
+        """returns the StammdatenRecord of kuerzel, None if there is none"""
+
+        with self.lock:
+            signature = self.storage.stammdaten_signature(kuerzel)
+            if signature is None:
+                self.records.pop(kuerzel, None)
+                return None
+
+            cached = self.records.get(kuerzel)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+            lines = self.storage.load_stammdaten(kuerzel)
+            if lines is None:
+                self.records.pop(kuerzel, None)
+                return None
+            record = StammdatenRecord.from_lines(lines)
+            self.records[kuerzel] = (signature, record)
+            return record
+
+    def preload(self, kuerzels):
+        """loads the records of kuerzels into the cache. The files are read outside
+        the lock, so several preloads can run in parallel"""
+
+        for kuerzel in kuerzels:
+            signature = self.storage.stammdaten_signature(kuerzel)
+            if signature is None:
+                continue
+            with self.lock:
+                cached = self.records.get(kuerzel)
+                if cached is not None and cached[0] == signature:
+                    continue
+            lines = self.storage.load_stammdaten(kuerzel)
+            if lines is None:
+                continue
+            record = StammdatenRecord.from_lines(lines)
+            with self.lock:
+                if kuerzel not in self.records:
+                    self.records[kuerzel] = (signature, record)
+
+    def exists(self, kuerzel: str) -> bool:
+        """checks if there are stammdaten for kuerzel"""
+
+        return self.storage.stammdaten_signature(kuerzel) is not None
+
+    def list(self) -> list:
+        """returns (kuerzel, created, modified) of all stammdaten"""
+
+        return self.storage.list_stammdaten()
+
+    def copy_from(self, source):
+        """copies all stammdaten of source (a storage or StammdatenDatenbank) with
+        their times. Migrates to and exports from the consolidated store"""
+
+        logging.debug("StammdatenRepository.copy_from() called")
+
+        with self.lock:
+            for kuerzel, created, modified in source.list_stammdaten():
+                stammdaten = source.load_stammdaten(kuerzel)
+                if stammdaten is not None:
+                    self.storage.store_stammdaten(stammdaten, created, modified)
+                    self.records.pop(kuerzel, None)
+            self.index.refresh(self.list())
+
+        logging.info("copied stammdaten")
+
+    def stammdatei_path(self, kuerzel: str) -> str:
+        """returns the path of a file holding the stammdatei, for opening it"""
+
+        return self.storage.stammdatei_path(kuerzel)
+
+    def file_events(self, events: dict):
+        """drops the cached records of the stammdateien changed on disk and updates
+        the search index (events: path -> added/modified/deleted)"""
+
+        if isinstance(self.storage, StammdatenDatenbank):
+            return
+
+        directory = os.path.normpath(self.storage.stammdaten_location)
+        with self.lock:
+            changed = False
+            for path, kind in events.items():
+                if os.path.dirname(path) != directory or not path.endswith(".txt"):
+                    continue
+                kuerzel = os.path.basename(path)[:-len(".txt")]
+                self.records.pop(kuerzel, None)
+                if kind == "deleted":
+                    self.index.discard(kuerzel, save=False)
+                    self.trie.discard(kuerzel)
+                    changed = True
+                    continue
+
+                record = self.get(kuerzel)
+                if record is None:
+                    continue
+                try:
+                    modified = os.path.getmtime(path)
+                except OSError:
+                    modified = None
+                self.index.add(kuerzel, record, modified, save=False)
+                changed = True
+                if self.trie_ready:
+                    self.trie.add(kuerzel, record)
+            if changed:
+                self.index.save()
+
+    def build_trie(self):
+        """builds the kuerzel trie out of the search index. Runs in a background
+        thread at startup"""
+
+        logging.debug("StammdatenRepository.build_trie() called")
+
+        listing = self.list()
+        self.index.refresh(listing)
+
+        with self.lock:
+            trie = KuerzelTrie()
+            for kuerzel, doc in self.index.docs.items():
+                trie.add(kuerzel, StammdatenRecord.from_lines(doc[1].split("\n")))
+            self.trie = trie
+            self.trie_ready = True
+
+        logging.info(f"built kuerzel trie of {len(trie.entries)} patients")
+
+    def complete(self, prefix: str, limit: int = 8) -> list:
+        """returns up to limit (kuerzel, name) starting with prefix. Empty as long
+        as the trie is being built"""
+
+        return self.trie.complete(prefix, limit)
+
+    def known(self, kuerzel: str) -> bool:
+        """checks if there are stammdaten for kuerzel, out of the trie once it is
+        built"""
+
+        if self.trie_ready:
+            return kuerzel in self.trie
+        return self.exists(kuerzel)
+
+    def search(self, query: str, art: str = "Alle") -> list:
+        """returns the sorted kuerzel of the stammdaten containing query, out of the
+        index in memory. The index is refreshed at startup (build_trie) and kept up
+        to date by store/remove and the file events"""
+
+        return self.index.search(query, art)
+
+    def store(self, stammdaten: list):
+        """stores the stammdaten (lines or record)"""
+
+        with self.lock:
+            self.storage.store_stammdaten(list(stammdaten))
+            self.records.pop(stammdaten[0], None)
+            record = StammdatenRecord.from_lines(stammdaten)
+            self.index.add(stammdaten[0], record)
+            self.trie.add(stammdaten[0], record)
+
+    def store_many(self, rows: list):
+        """stores many stammdaten (lines) in one batch, the search index is saved
+        once"""
+
+        with self.lock:
+            self.storage.store_stammdaten_batch([list(i) for i in rows])
+            for stammdaten in rows:
+                self.records.pop(stammdaten[0], None)
+                record = StammdatenRecord.from_lines(stammdaten)
+                self.index.add(stammdaten[0], record, save=False)
+                self.trie.add(stammdaten[0], record)
+            self.index.save()
+
+    def remove(self, kuerzel: str):
+        """removes the stammdaten of kuerzel"""
+
+        with self.lock:
+            self.storage.remove_stammdaten(kuerzel)
+            self.records.pop(kuerzel, None)
+            self.index.discard(kuerzel)
+            self.trie.discard(kuerzel)
+
+
+class Storage(abc.ABC):
+    """Base class of the storage backends. Holds the rechnungen rows, drafts and
+    stammdaten behind the same operations, so the interfaces don't have to know
+    where the data is kept. Use Storage.create() to get the configured backend.
+    A backend missing one of the abstract operations can't be created."""
+
+    name = ""
+
+    def __init__(self, rechnungen_location: str, stammdaten_location: str):
+        self.rechnungen_location = rechnungen_location
+        self.stammdaten_location = stammdaten_location
+
+    @staticmethod
+    def create(backend: str, rechnungen_location: str, stammdaten_location: str):
+        """returns the storage backend with the given name. Defaults to csv"""
+
+        logging.debug(f"Storage.create() called, backend={backend}")
+
+        if backend == "sqlite":
+            return SqliteStorage(rechnungen_location, stammdaten_location)
+        return CsvStorage(rechnungen_location, stammdaten_location)
+
+    @staticmethod
+    def cells(row) -> list:
+        """converts a row into strings the same way csv.writer does"""
+
+        return ["" if i is None else str(i) for i in row]
+
+    def copy_from(self, source):
+        """copies all rechnungen, drafts and stammdaten of source into this storage.
+        Used to migrate to and export from a storage backend"""
+
+        logging.debug(f"Storage.copy_from() called, {source.name} -> {self.name}")
+
+        for year in source.rechnungen_years():
+            self.write_rechnungen(year, source.iter_rechnungen(year))
+
+        for draft in source.list_drafts():
+            row = source.load_draft(draft.rechnungsnummer)
+            if row is not None:
+                self.store_draft(draft.rechnungsnummer, row, draft.created, draft.modified)
+
+        for kuerzel, created, modified in source.list_stammdaten():
+            stammdaten = source.load_stammdaten(kuerzel)
+            if stammdaten is not None:
+                self.store_stammdaten(stammdaten, created, modified)
+
+        logging.info(f"copied data from {source.name} to {self.name} storage")
+
+    def close(self):
+        """releases the resources of the storage"""
+
+    def compact(self, year=None):
+        """removes deleted rows of year (all years if None) for good"""
+
+    def sync(self):
+        """makes all stored rechnungen durable on disk"""
+
+    @abc.abstractmethod
+    def rechnungen_years(self) -> list:
+        """returns all years that have stored rechnungen"""
+
+    @abc.abstractmethod
+    def check_rechnungen(self, year) -> bool:
+        """returns False if the rechnungen storage of year was missing"""
+
+    @abc.abstractmethod
+    def store_rechnung(self, year, rechnungsdaten: list):
+        """stores a new row of rechnungsdaten"""
+
+    def store_rechnungen(self, year, rows: list):
+        """stores many new rows at once"""
+
+        for row in rows:
+            self.store_rechnung(year, row)
+
+    @abc.abstractmethod
+    def find_rechnung(self, year, rechnungsnummer: str) -> list:
+        """returns all rows with the given rechnungsnummer"""
+
+    @abc.abstractmethod
+    def iter_rechnungen(self, year, reverse: bool = False):
+        """yields all rows of year in the order they were stored (newest first with
+        reverse)"""
+
+    @abc.abstractmethod
+    def remove_rechnung(self, year, rechnungsnummer: str):
+        """removes all rows with the given rechnungsnummer"""
+
+    @abc.abstractmethod
+    def write_rechnungen(self, year, rows):
+        """replaces all rows of year with rows"""
+
+    @abc.abstractmethod
+    def list_drafts(self) -> list:
+        """returns the DraftRecords of all drafts"""
+
+    @abc.abstractmethod
+    def load_draft(self, rechnungsnummer: str):
+        """returns the row of the draft or None if there is no draft"""
+
+    @abc.abstractmethod
+    def store_draft(self, rechnungsnummer: str, row: list, created=None, modified=None):
+        """stores or overwrites the draft of rechnungsnummer"""
+
+    @abc.abstractmethod
+    def remove_drafts(self, name: str):
+        """removes all drafts whose filename contains name"""
+
+    @abc.abstractmethod
+    def list_stammdaten(self) -> list:
+        """returns (kuerzel, created, modified) of all stammdaten"""
+
+    @abc.abstractmethod
+    def load_stammdaten(self, kuerzel: str):
+        """returns the lines of the stammdatei or None if it doesn't exist"""
+
+    @abc.abstractmethod
+    def store_stammdaten(self, stammdaten: list, created=None, modified=None):
+        """stores or overwrites the stammdatei. stammdaten[0] is the kuerzel"""
+
+    def store_stammdaten_batch(self, rows: list):
+        """stores many stammdaten at once"""
+
+        for stammdaten in rows:
+            self.store_stammdaten(stammdaten)
+
+    @abc.abstractmethod
+    def remove_stammdaten(self, kuerzel: str):
+        """removes the stammdatei of kuerzel"""
+
+    @abc.abstractmethod
+    def stammdaten_exists(self, kuerzel: str) -> bool:
+        """checks if there is a stammdatei for kuerzel"""
+
+    @abc.abstractmethod
+    def stammdaten_signature(self, kuerzel: str):
+        """returns a value that changes whenever the stammdaten of kuerzel change,
+        None if there are none"""
+
+    @abc.abstractmethod
+    def stammdatei_path(self, kuerzel: str) -> str:
+        """returns the path of a file holding the stammdatei, for opening it"""
+
+
+class CsvStorage(Storage):
+    """The legacy file layout: rechnungen-csv/rechnungen-{year}.csv,
+    drafts/{rechnungsnummer}DRAFT.csv and one {kuerzel}.txt per stammdatei."""
+
+    name = "csv"
+
+    # share of dead rows at which a year is compacted in the background
+    compaction_ratio = 0.25
+
+    def __init__(self, rechnungen_location: str, stammdaten_location: str):
+        super().__init__(rechnungen_location, stammdaten_location)
+        self.rechnungen_indexes = {}
+        self.compacting = set()
+        self.unsynced = set()
+
+    def rechnungen_path(self, year) -> str:
+        """returns the path of rechnungen-{year}.csv"""
+
+        return f"{self.rechnungen_location}/rechnungen-csv/rechnungen-{year}.csv"
+
+    def rechnungen_index(self, year) -> RechnungenIndex:
+        """returns the RechnungenIndex of rechnungen-{year}.csv"""
+
+        year = str(year)
+        index = self.rechnungen_indexes.get(year)
+        if index is None:
+            index = RechnungenIndex(self.rechnungen_path(year))
+            self.rechnungen_indexes[year] = index
+        return index
+
+    def rechnungen_years(self) -> list:
+        """returns all years that have a rechnungen-{year}.csv"""
+
+        try:
+            files = os.listdir(f"{self.rechnungen_location}/rechnungen-csv/")
+        except FileNotFoundError:
+            return []
+
+        return sorted(
+            i[len("rechnungen-"):-len(".csv")]
+            for i in files
+            if re.match(r"^rechnungen-\d{4}\.csv$", i)
+        )
+
+    def check_rechnungen(self, year) -> bool:
+        """creates rechnungen-{year}.csv if it is missing"""
+
+        if os.path.exists(self.rechnungen_path(year)):
+            return True
+
+        os.makedirs(os.path.dirname(self.rechnungen_path(year)), exist_ok=True)
+        with open(self.rechnungen_path(year), "w", encoding="utf-8"):
+            pass
+        return False
+
+    def append_row(self, year, row: list, tombstone=False):
+        """appends the row to rechnungen-{year}.csv and updates the index"""
+
+        index = self.rechnungen_index(year)
+
+        line = io.StringIO()
+        csv.writer(line, delimiter=";").writerow(row)
+        line = line.getvalue().encode("utf-8")
+
+        with index.lock:
+            with open(index.csv_path, "ab") as f:
+                offset = f.tell()
+                f.write(line)
+            index.add(str(row[1]), offset, offset + len(line), tombstone)
+            self.unsynced.add(str(year))
+
+    def sync(self):
+        """fsyncs the csv files appended to since the last sync"""
+
+        for year in list(self.unsynced):
+            with self.rechnungen_index(year).lock:
+                with open(self.rechnungen_path(year), "ab") as f:
+                    os.fsync(f.fileno())
+            self.unsynced.discard(year)
+
+    def store_rechnung(self, year, rechnungsdaten: list):
+        """appends the rechnungsdaten to rechnungen-{year}.csv"""
+
+        logging.debug("CsvStorage.store_rechnung() called")
+
+        self.append_row(year, rechnungsdaten)
+        logging.info("wrote new line in RechnungenInsgesamt")
+
+    def store_rechnungen(self, year, rows: list):
+        """appends all rows with one write to the csv file and one to the index"""
+
+        logging.debug("CsvStorage.store_rechnungen() called")
+
+        index = self.rechnungen_index(year)
+
+        line = io.StringIO()
+        csvfile = csv.writer(line, delimiter=";")
+        chunks = []
+        entries = []
+        position = 0
+        for row in rows:
+            csvfile.writerow(row)
+            chunks.append(line.getvalue().encode("utf-8"))
+            line.seek(0)
+            line.truncate()
+            entries.append((str(row[1]), position))
+            position += len(chunks[-1])
+
+        with index.lock:
+            with open(index.csv_path, "ab") as f:
+                offset = f.tell()
+                f.write(b"".join(chunks))
+            index.add_many(
+                [(i, offset + o) for i, o in entries], offset, offset + position
+            )
+            self.unsynced.add(str(year))
+        logging.info(f"wrote {len(rows)} new lines in RechnungenInsgesamt")
+
+    def find_rechnung(self, year, rechnungsnummer: str) -> list:
+        """index lookup -> one seek instead of scanning the csv file"""
+
+        return self.rechnungen_index(year).find(rechnungsnummer)
+
+    def iter_rechnungen(self, year, reverse: bool = False):
+        """streams the live rows of rechnungen-{year}.csv out of the memory-mapped
+        file. Rows hidden by a later tombstone are skipped"""
+
+        reader = LedgerReader(self.rechnungen_path(year))
+        live_offsets = None
+        if reverse:
+            reader.open()
+        else:
+            index = self.rechnungen_index(year)
+            with index.lock:
+                if index.is_stale():
+                    index.rebuild()
+                live_offsets = {i for offsets in index.offsets.values() for i in offsets}
+                # mapped before the lock is released: a compaction replacing the file
+                # afterwards doesn't touch the mapped file the offsets belong to
+                reader.open()
+
+        try:
+            for record in reader.live_records(reverse, live_offsets):
+                yield record.cells
+        finally:
+            reader.close()
+
+    def remove_rechnung(self, year, rechnungsnummer: str):
+        """appends a tombstone for rechnungsnummer to rechnungen-{year}.csv. Starts
+        the compaction in the background once the dead row ratio is reached"""
+
+        logging.debug("CsvStorage.remove_rechnung() called")
+
+        if not self.check_rechnungen(year):
+            return
+
+        index = self.rechnungen_index(year)
+        with index.lock:
+            if not index.find(rechnungsnummer):
+                return
+            self.append_row(year, [RechnungenIndex.tombstone, rechnungsnummer], True)
+            logging.info("deleted line in RechnungenInsgesamt")
+
+            if (
+                    index.dead_ratio() >= self.compaction_ratio
+                    and str(year) not in self.compacting
+            ):
+                self.compacting.add(str(year))
+                threading.Thread(target=self.compact, args=(year,), daemon=True).start()
+
+    def compact(self, year=None):
+        """rewrites rechnungen-{year}.csv without dead rows and tombstones"""
+
+        logging.debug(f"CsvStorage.compact() called, year={year}")
+
+        years = [str(year)] if year is not None else self.rechnungen_years()
+        for i in years:
+            try:
+                index = self.rechnungen_index(i)
+                with index.lock:
+                    if index.is_stale():
+                        index.rebuild()
+                    if index.dead_rows:
+                        self.write_rechnungen(i, list(self.iter_rechnungen(i)))
+                        logging.info(f"compacted rechnungen-{i}.csv")
+            except OSError as e:
+                # windows can't replace a file that is still mapped by a reader
+                logging.warning(f"compaction of rechnungen-{i}.csv failed: {e}")
+            finally:
+                self.compacting.discard(i)
+
+    def write_rechnungen(self, year, rows):
+        """rewrites rechnungen-{year}.csv with rows and rebuilds the index"""
+
+        logging.debug("CsvStorage.write_rechnungen() called")
+
+        os.makedirs(os.path.dirname(self.rechnungen_path(year)), exist_ok=True)
+        index = self.rechnungen_index(year)
+        with index.lock:
+            with open(
+                    f"{self.rechnungen_path(year)}.tmp", "w", newline="", encoding="utf-8"
+            ) as f:
+                csv.writer(f, delimiter=";").writerows(rows)
+            os.replace(f"{self.rechnungen_path(year)}.tmp", self.rechnungen_path(year))
+            index.rebuild()
+
+    def drafts_path(self) -> str:
+        """returns the path of the drafts dir"""
+
+        return f"{self.rechnungen_location}/drafts"
+
+    def list_drafts(self) -> list:
+        """returns the DraftRecords of all files in drafts/"""
+
+        if not os.path.exists(self.drafts_path()):
+            os.makedirs(self.drafts_path())
+
+        drafts = []
+        for i in os.listdir(self.drafts_path()):
+            # .DS_Store and drafts being written
+            if i.startswith("."):
+                continue
+            drafts.append(
+                DraftRecord(
+                    i,
+                    os.path.getctime(f"{self.drafts_path()}/{i}"),
+                    os.path.getmtime(f"{self.drafts_path()}/{i}"),
+                )
+            )
+        return drafts
+
+    def load_draft(self, rechnungsnummer: str):
+        """returns the first row of {rechnungsnummer}DRAFT.csv"""
+
+        filepath = f"{self.drafts_path()}/{rechnungsnummer}DRAFT.csv"
+        if not os.path.exists(filepath):
+            return None
+
+        with open(filepath, newline="", encoding="utf-8") as f:
+            return next(csv.reader(f, delimiter=";"), [])
+
+    def store_draft(self, rechnungsnummer: str, row: list, created=None, modified=None):
+        """writes the row into {rechnungsnummer}DRAFT.csv"""
+
+        if not os.path.exists(self.drafts_path()):
+            os.makedirs(self.drafts_path())
+
+        # written next to it and renamed, a crash never leaves half a draft
+        filepath = f"{self.drafts_path()}/{rechnungsnummer}DRAFT.csv"
+        tmp_path = f"{self.drafts_path()}/.{rechnungsnummer}DRAFT.csv.tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f, delimiter=";").writerow(row)
+        if modified is not None:
+            os.utime(tmp_path, (modified, modified))
+        os.replace(tmp_path, filepath)
+
+    def remove_drafts(self, name: str):
+        """removes all drafts whose filename contains name"""
+
+        try:
+            for i in os.listdir(self.drafts_path()):
+                if name.lower() in i.lower():
+                    os.remove(f"{self.drafts_path()}/{i}")
+                    logging.info(f"removed draft {i}")
+        except FileNotFoundError:
+            logging.info("drafts dir doesn't exist")
+
+    def list_stammdaten(self) -> list:
+        """returns (kuerzel, created, modified) of all stammdateien"""
+
+        stammdaten = []
+        for i in os.listdir(f"{self.stammdaten_location}/"):
+            if not i.endswith(".txt"):
+                continue
+            stammdaten.append(
+                (
+                    i[:-len(".txt")],
+                    os.path.getctime(f"{self.stammdaten_location}/{i}"),
+                    os.path.getmtime(f"{self.stammdaten_location}/{i}"),
+                )
+            )
+        return stammdaten
+
+    def load_stammdaten(self, kuerzel: str):
+        """returns the lines of {kuerzel}.txt"""
+
+        if not self.stammdaten_exists(kuerzel):
+            return None
+
+        with open(self.stammdatei_path(kuerzel), "r") as f:
+            return [line.replace("\n", "") for line in f.readlines()]
+
+    def store_stammdaten(self, stammdaten: list, created=None, modified=None):
+        """writes the stammdaten into {kuerzel}.txt, one value per line"""
+
+        filepath = self.stammdatei_path(stammdaten[0])
+        with open(filepath, "w") as f:
+            f.write("\n".join(stammdaten))
+        if modified is not None:
+            os.utime(filepath, (modified, modified))
+
+    def remove_stammdaten(self, kuerzel: str):
+        """removes {kuerzel}.txt"""
+
+        if self.stammdaten_exists(kuerzel):
+            os.remove(self.stammdatei_path(kuerzel))
+
+    def stammdaten_exists(self, kuerzel: str) -> bool:
+        """checks if {kuerzel}.txt exists"""
+
+        return os.path.exists(self.stammdatei_path(kuerzel))
+
+    def stammdaten_signature(self, kuerzel: str):
+        """returns (mtime, size) of {kuerzel}.txt"""
+
+        try:
+            stat = os.stat(self.stammdatei_path(kuerzel))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def stammdatei_path(self, kuerzel: str) -> str:
+        """returns the path of {kuerzel}.txt"""
+
+        return f"{self.stammdaten_location}/{kuerzel}.txt"
+
+
+class SqliteStammdaten:
+    """The stammdaten operations on a sqlite table stammdaten (kuerzel, created,
+    modified, data). Shared by SqliteStorage and StammdatenDatenbank, which provide
+    execute() and cells()."""
+
+    def list_stammdaten(self) -> list:
+        """returns (kuerzel, created, modified) of all stammdaten"""
+
+        return self.execute(
+            "SELECT kuerzel, created, modified FROM stammdaten ORDER BY kuerzel"
+        )
+
+    def load_stammdaten(self, kuerzel: str):
+        """returns the lines of the stammdatei"""
+
+        result = self.execute(
+            "SELECT data FROM stammdaten WHERE kuerzel = ?", (kuerzel,)
+        )
+        return json.loads(result[0][0]) if result else None
+
+    def store_stammdaten(self, stammdaten: list, created=None, modified=None):
+        """stores the stammdaten, keeping the created time of an existing one"""
+
+        now = time.time()
+        self.execute(
+            "INSERT INTO stammdaten (kuerzel, created, modified, data) "
+            "VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (kuerzel) DO UPDATE SET modified = excluded.modified, "
+            "data = excluded.data",
+            (
+                stammdaten[0],
+                created or now,
+                modified or now,
+                json.dumps(self.cells(stammdaten), ensure_ascii=False),
+            ),
+        )
+
+    def store_stammdaten_batch(self, rows: list):
+        """stores all stammdaten in one transaction"""
+
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO stammdaten (kuerzel, created, modified, data) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (kuerzel) DO UPDATE SET modified = excluded.modified, "
+                "data = excluded.data",
+                (
+                    (i[0], now, now, json.dumps(self.cells(i), ensure_ascii=False))
+                    for i in rows
+                ),
+            )
+
+    def remove_stammdaten(self, kuerzel: str):
+        """removes the stammdaten of kuerzel"""
+
+        self.execute("DELETE FROM stammdaten WHERE kuerzel = ?", (kuerzel,))
+
+    def stammdaten_exists(self, kuerzel: str) -> bool:
+        """checks if there are stammdaten for kuerzel"""
+
+        return bool(
+            self.execute("SELECT 1 FROM stammdaten WHERE kuerzel = ?", (kuerzel,))
+        )
+
+    def stammdaten_signature(self, kuerzel: str):
+        """returns the modified time of the stammdaten"""
+
+        result = self.execute(
+            "SELECT modified FROM stammdaten WHERE kuerzel = ?", (kuerzel,)
+        )
+        return result[0][0] if result else None
+
+    def stammdatei_path(self, kuerzel: str) -> str:
+        """writes the stammdaten into ./system/tmp/{kuerzel}.txt to open it"""
+
+        os.makedirs("./system/tmp", exist_ok=True)
+        filepath = f"./system/tmp/{kuerzel}.txt"
+        with open(filepath, "w") as f:
+            f.write("\n".join(self.load_stammdaten(kuerzel) or []))
+        return filepath
+
+
+class StammdatenDatenbank(SqliteStammdaten):
+    """Consolidated patient store: all stammdaten in one indexed file
+    ({stammdaten_location}/stammdaten.db) instead of one {kuerzel}.txt per patient.
+    Listing the patients is one query instead of a directory listing and one open
+    per file, every update is one atomic transaction. stammdatei_path() writes a
+    text file on demand to open it. Works with both storage backends."""
+
+    name = "datei"
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS stammdaten (
+            kuerzel TEXT PRIMARY KEY,
+            created REAL NOT NULL,
+            modified REAL NOT NULL,
+            data TEXT NOT NULL
+        );
+    """
+
+    cells = staticmethod(Storage.cells)
+
+    def __init__(self, stammdaten_location: str):
+        self.stammdaten_location = stammdaten_location
+        self.db_path = f"{stammdaten_location}/stammdaten.db"
+        self.lock = threading.RLock()
+
+        os.makedirs(stammdaten_location, exist_ok=True)
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.executescript(self.schema)
+
+    def close(self):
+        """closes the database connection"""
+
+        with self.lock:
+            self.connection.close()
+
+    def execute(self, sql: str, params=()) -> list:
+        """runs sql in its own transaction and returns all result rows"""
+
+        with self.lock, self.connection:
+            return self.connection.execute(sql, params).fetchall()
+
+
+class SqliteStorage(SqliteStammdaten, Storage):
+    """Keeps rechnungen, drafts and stammdaten in one sqlite database
+    ({rechnungen_location}/rechnungsprogramm.db), so it is part of the backup.
+    Rows are stored as json lists of strings, the same cells the csv files hold."""
+
+    name = "sqlite"
+    # rows fetched at once by iter_rechnungen
+    fetch_size = 256
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS rechnungen (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            year TEXT NOT NULL,
+            rechnungsnummer TEXT NOT NULL,
+            kuerzel TEXT NOT NULL,
+            datum TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS rechnungen_rechnungsnummer
+            ON rechnungen (year, rechnungsnummer);
+        CREATE INDEX IF NOT EXISTS rechnungen_kuerzel ON rechnungen (kuerzel);
+        CREATE INDEX IF NOT EXISTS rechnungen_datum ON rechnungen (datum);
+        CREATE TABLE IF NOT EXISTS drafts (
+            name TEXT PRIMARY KEY,
+            created REAL NOT NULL,
+            modified REAL NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS stammdaten (
+            kuerzel TEXT PRIMARY KEY,
+            created REAL NOT NULL,
+            modified REAL NOT NULL,
+            data TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, rechnungen_location: str, stammdaten_location: str):
+        super().__init__(rechnungen_location, stammdaten_location)
+        self.db_path = f"{rechnungen_location}/rechnungsprogramm.db"
+        self.lock = threading.RLock()
+
+        os.makedirs(rechnungen_location, exist_ok=True)
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.executescript(self.schema)
+
+    def close(self):
+        """closes the database connection"""
+
+        with self.lock:
+            self.connection.close()
+
+    def execute(self, sql: str, params=()) -> list:
+        """runs sql in its own transaction and returns all result rows"""
+
+        with self.lock, self.connection:
+            return self.connection.execute(sql, params).fetchall()
+
+    @staticmethod
+    def datum(rechnungsnummer: str):
+        """returns the iso date of the rechnungsnummer (kuerzel + ddmmyy [+ H])"""
+
+        match = re.search(r"(\d{2})(\d{2})(\d{2})H?$", rechnungsnummer)
+        if not match:
+            return None
+        return f"20{match.group(3)}-{match.group(2)}-{match.group(1)}"
+
+    def rechnungen_years(self) -> list:
+        """returns all years that have stored rechnungen"""
+
+        return [
+            i[0]
+            for i in self.execute("SELECT DISTINCT year FROM rechnungen ORDER BY year")
+        ]
+
+    def check_rechnungen(self, year) -> bool:
+        """the tables always exist"""
+
+        return True
+
+    def insert_rechnungen(self, year, rows):
+        """inserts rows without committing"""
+
+        self.connection.executemany(
+            "INSERT INTO rechnungen (year, rechnungsnummer, kuerzel, datum, data) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                (
+                    str(year),
+                    row[1],
+                    row[0],
+                    self.datum(row[1]),
+                    json.dumps(row, ensure_ascii=False),
+                )
+                for row in map(self.cells, rows)
+            ),
+        )
+
+    def store_rechnung(self, year, rechnungsdaten: list):
+        """inserts the rechnungsdaten"""
+
+        logging.debug("SqliteStorage.store_rechnung() called")
+
+        with self.lock, self.connection:
+            self.insert_rechnungen(year, [rechnungsdaten])
+        logging.info("wrote new row in RechnungenInsgesamt")
+
+    def store_rechnungen(self, year, rows: list):
+        """inserts all rows in one transaction"""
+
+        logging.debug("SqliteStorage.store_rechnungen() called")
+
+        with self.lock, self.connection:
+            self.insert_rechnungen(year, rows)
+        logging.info(f"wrote {len(rows)} new rows in RechnungenInsgesamt")
+
+    def find_rechnung(self, year, rechnungsnummer: str) -> list:
+        """uses the (year, rechnungsnummer) index"""
+
+        return [
+            json.loads(i[0])
+            for i in self.execute(
+                "SELECT data FROM rechnungen WHERE year = ? AND rechnungsnummer = ? "
+                "ORDER BY id",
+                (str(year), rechnungsnummer),
+            )
+        ]
+
+    def iter_rechnungen(self, year, reverse: bool = False):
+        """yields all rows of year in the order they were stored. Streams the rows
+        off the cursor in batches, the lock is only held while fetching one"""
+
+        with self.lock:
+            cursor = self.connection.execute(
+                "SELECT data FROM rechnungen WHERE year = ? "
+                f"ORDER BY id {'DESC' if reverse else 'ASC'}",
+                (str(year),),
+            )
+        try:
+            while True:
+                with self.lock:
+                    rows = cursor.fetchmany(self.fetch_size)
+                if not rows:
+                    break
+                for i in rows:
+                    yield json.loads(i[0])
+        finally:
+            cursor.close()
+
+    def remove_rechnung(self, year, rechnungsnummer: str):
+        """deletes the rows of rechnungsnummer"""
+
+        logging.debug("SqliteStorage.remove_rechnung() called")
+
+        self.execute(
+            "DELETE FROM rechnungen WHERE year = ? AND rechnungsnummer = ?",
+            (str(year), rechnungsnummer),
+        )
+
+    def write_rechnungen(self, year, rows):
+        """replaces all rows of year in one transaction"""
+
+        logging.debug("SqliteStorage.write_rechnungen() called")
+
+        rows = list(rows)
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM rechnungen WHERE year = ?", (str(year),))
+            self.insert_rechnungen(year, rows)
+
+    def list_drafts(self) -> list:
+        """returns the DraftRecords of all drafts"""
+
+        return [
+            DraftRecord(*i)
+            for i in self.execute("SELECT name, created, modified FROM drafts ORDER BY name")
+        ]
+
+    def load_draft(self, rechnungsnummer: str):
+        """returns the row of the draft"""
+
+        result = self.execute(
+            "SELECT data FROM drafts WHERE name = ?", (f"{rechnungsnummer}DRAFT.csv",)
+        )
+        return json.loads(result[0][0]) if result else None
+
+    def store_draft(self, rechnungsnummer: str, row: list, created=None, modified=None):
+        """stores the draft, keeping the created time of an existing draft"""
+
+        now = time.time()
+        self.execute(
+            "INSERT INTO drafts (name, created, modified, data) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET modified = excluded.modified, "
+            "data = excluded.data",
+            (
+                f"{rechnungsnummer}DRAFT.csv",
+                created or now,
+                modified or now,
+                json.dumps(self.cells(row), ensure_ascii=False),
+            ),
+        )
+
+    def remove_drafts(self, name: str):
+        """removes all drafts whose name contains name"""
+
+        self.execute(
+            "DELETE FROM drafts WHERE instr(lower(name), ?) > 0", (name.lower(),)
+        )
+
+
+class RechnungenJournal:
+    """Write-ahead journal for the rechnungen of a storage backend
+    ({rechnungen_location}/journal.log).
+
+    Every operation (saving or removing a Rechnung) is written as one json line
+    with a crc32 checksum and fsynced before it is applied to the storage. Once
+    the storage is synced the journal is truncated again. Records left in the
+    journal after a crash are replayed on the next startup. A torn last line
+    fails the checksum and is dropped. Applying a record twice has the same
+    result as applying it once.
+
+    Inside batch() the records are collected and committed with a single fsync
+    (group commit)."""
+
+    def __init__(self, storage: Storage, rollups=None):
+        self.storage = storage
+        self.rollups = rollups
+        self.path = f"{storage.rechnungen_location}/journal.log"
+        self.lock = threading.RLock()
+        self.batch_depth = 0
+        self.pending = []
+
+    @staticmethod
+    def encode(ops: list) -> str:
+        """returns the journal line of ops"""
+
+        data = json.dumps(ops, ensure_ascii=False, separators=(",", ":"))
+        return json.dumps(
+            {"crc": zlib.crc32(data.encode("utf-8")), "ops": data},
+            ensure_ascii=False,
+        ) + "\n"
+
+    @staticmethod
+    def decode(line: str):
+        """returns the ops of a journal line or None if the line is corrupt"""
+
+        try:
+            record = json.loads(line)
+            if zlib.crc32(record["ops"].encode("utf-8")) != record["crc"]:
+                return None
+            return json.loads(record["ops"])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+    def save(self, year, rechnungsdaten: list):
+        """journals replacing all rows of the rechnungsnummer with rechnungsdaten"""
+
+        self.commit(
+            [
+                {
+                    "op": "save",
+                    "year": str(year),
+                    "row": RechnungCodec.encode(rechnungsdaten),
+                }
+            ]
+        )
+
+    def remove(self, year, rechnungsnummer: str):
+        """journals removing all rows of the rechnungsnummer"""
+
+        self.commit([{"op": "remove", "year": str(year), "nummer": rechnungsnummer}])
+
+    def import_rows(self, year, rows: list):
+        """journals storing many new rows at once (bulk import)"""
+
+        self.commit(
+            [
+                {
+                    "op": "import",
+                    "year": str(year),
+                    "rows": [RechnungCodec.encode(i) for i in rows],
+                }
+            ]
+        )
+
+    def commit(self, ops: list):
+        """writes ops as one atomic record and applies them, or collects them until
+        the end of the batch"""
+
+        with self.lock:
+            self.pending.append(ops)
+            if not self.batch_depth:
+                self.flush()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """group commit: all records of the batch share one fsync"""
+
+        with self.lock:
+            self.batch_depth += 1
+            try:
+                yield self
+            finally:
+                self.batch_depth -= 1
+                if not self.batch_depth:
+                    self.flush()
+
+    def flush(self):
+        """writes the pending records with one fsync, applies them and truncates
+        the journal"""
+
+        with self.lock:
+            if not self.pending:
+                return
+
+            pending, self.pending = self.pending, []
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(self.encode(ops) for ops in pending)
+                f.flush()
+                os.fsync(f.fileno())
+
+            for ops in pending:
+                self.apply(ops)
+            if self.rollups is not None:
+                self.rollups.flush()
+            self.checkpoint()
+
+    def apply(self, ops: list):
+        """applies the ops of one record to the storage"""
+
+        for op in ops:
+            if op["op"] == "save":
+                removed = self.storage.find_rechnung(op["year"], op["row"][1])
+                self.storage.remove_rechnung(op["year"], op["row"][1])
+                self.storage.store_rechnung(op["year"], op["row"])
+                if self.rollups is not None:
+                    self.rollups.update(op["year"], removed, [op["row"]])
+            elif op["op"] == "remove":
+                removed = self.storage.find_rechnung(op["year"], op["nummer"])
+                self.storage.remove_rechnung(op["year"], op["nummer"])
+                if self.rollups is not None:
+                    self.rollups.update(op["year"], removed)
+            elif op["op"] == "import":
+                # rows of a replayed import may already be stored
+                removed = []
+                for i in op["rows"]:
+                    existing = self.storage.find_rechnung(op["year"], i[1])
+                    if existing:
+                        removed.extend(existing)
+                        self.storage.remove_rechnung(op["year"], i[1])
+                self.storage.store_rechnungen(op["year"], op["rows"])
+                if self.rollups is not None:
+                    self.rollups.update(op["year"], removed, op["rows"])
+
+    def checkpoint(self):
+        """syncs the storage and empties the journal"""
+
+        self.storage.sync()
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.flush()
+            os.fsync(f.fileno())
+
+    def replay(self):
+        """applies the records left in the journal by a crash"""
+
+        logging.debug("RechnungenJournal.replay() called")
+
+        with self.lock:
+            if not os.path.exists(self.path) or not os.path.getsize(self.path):
+                return
+
+            replayed = 0
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    ops = self.decode(line)
+                    if ops is None:
+                        logging.warning("journal.log: dropped torn record")
+                        break
+                    self.apply(ops)
+                    replayed += 1
+            self.checkpoint()
+
+            # the rollups may have been saved before or after the crash
+            if replayed and self.rollups is not None:
+                self.rollups.rebuild()
+
+            logging.info(f"journal.log: replayed {replayed} record(s)")
+
+
+class RechnungenRollups:
+    """Revenue and mileage rollups of the stored rechnungen
+    ({rechnungen_location}/rollups.json).
+
+    Keyed by (year, month, kuerzel, KG/HP), every entry holds the number of
+    rechnungen, the sum of the gesamtpreise and the sum of km total. The journal
+    updates the entries of every saved/removed rechnung, so reading the summary
+    never touches the stored rows. rebuild() recomputes everything.
+
+    Updated entries are appended to rollups.log ("key|..." and the entry, None
+    for a removed one) once per journal batch, instead of rewriting rollups.json.
+    load() applies the log on top of rollups.json. The log is folded into
+    rollups.json by rebuild(), close() and once it holds compact_after entries."""
+
+    # log entries after which rollups.json is rewritten
+    compact_after = 1000
+
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        self.path = f"{storage.rechnungen_location}/rollups.json"
+        self.log_path = f"{storage.rechnungen_location}/rollups.log"
+        self.lock = threading.RLock()
+        self.rollups = {}
+        # keys changed since the last flush
+        self.dirty = set()
+        self.log_entries = 0
+
+        self.load()
+
+    def load(self):
+        """reads rollups.json. Rebuilds the rollups if the file is missing or corrupt"""
+
+        logging.debug("RechnungenRollups.load() called")
+
+        with self.lock:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.rollups = {
+                        tuple(key.split("|")): value for key, value in json.load(f).items()
+                    }
+            except FileNotFoundError:
+                self.rebuild()
+                return
+            except (ValueError, AttributeError):
+                logging.info("rollups.json corrupt, rebuilding")
+                self.rebuild()
+                return
+
+            try:
+                with open(self.log_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            key, value = json.loads(line)
+                        except ValueError:
+                            logging.warning("rollups.log: dropped torn entry")
+                            break
+                        if value is None:
+                            self.rollups.pop(tuple(key.split("|")), None)
+                        else:
+                            self.rollups[tuple(key.split("|"))] = value
+                        self.log_entries += 1
+            except FileNotFoundError:
+                pass
+
+    def save(self):
+        """writes rollups.json and empties rollups.log"""
+
+        with self.lock:
+            with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(
+                    {"|".join(key): value for key, value in self.rollups.items()}, f
+                )
+            os.replace(f"{self.path}.tmp", self.path)
+            with open(self.log_path, "w", encoding="utf-8"):
+                pass
+            self.dirty.clear()
+            self.log_entries = 0
+
+    def flush(self):
+        """appends the entries changed since the last flush to rollups.log. Called by
+        the journal once per batch, before the journal is emptied"""
+
+        with self.lock:
+            if not self.dirty:
+                return
+            if self.log_entries + len(self.dirty) >= self.compact_after:
+                self.save()
+                return
+
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.writelines(
+                    json.dumps(["|".join(key), self.rollups.get(key)]) + "\n"
+                    for key in self.dirty
+                )
+                f.flush()
+                os.fsync(f.fileno())
+            self.log_entries += len(self.dirty)
+            self.dirty.clear()
+
+    def close(self):
+        """folds rollups.log into rollups.json"""
+
+        with self.lock:
+            if self.dirty or self.log_entries:
+                self.save()
+
+    @staticmethod
+    def key(year, row: list) -> tuple:
+        """returns (year, month, kuerzel, KG/HP) of the row. The month comes out of
+        the rechnungsnummer (kuerzel + ddmmyy [+ H])"""
+
+        match = re.search(r"\d{2}(\d{2})\d{2}H?$", row[1])
+        month = match.group(1) if match else "00"
+        return str(year), month, row[0], "HP" if row[1].endswith("H") else "KG"
+
+    @staticmethod
+    def number(cell) -> float:
+        """returns the cell as float, 0 for empty/corrupt cells"""
+
+        try:
+            return float(cell)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def add(self, year, row: list, sign: int = 1):
+        """adds (sign=1) or subtracts (sign=-1) the row"""
+
+        if len(row) < 7:
+            return
+
+        key = self.key(year, row)
+        self.dirty.add(key)
+        entry = self.rollups.setdefault(key, [0, 0.0, 0.0])
+        entry[0] += sign
+        entry[1] = round(entry[1] + sign * self.number(row[6]), 2)
+        entry[2] = round(entry[2] + sign * self.number(row[4]), 2)
+        if entry[0] <= 0:
+            self.rollups.pop(key)
+
+    def update(self, year, removed_rows: list, rows=()):
+        """subtracts the removed rows and adds the new rows. Written by flush()"""
+
+        with self.lock:
+            for i in removed_rows:
+                self.add(year, i, -1)
+            for i in rows:
+                self.add(year, i)
+
+    def rebuild(self):
+        """recomputes all rollups out of the stored rechnungen"""
+
+        logging.debug("RechnungenRollups.rebuild() called")
+
+        with self.lock:
+            self.rollups = {}
+            for year in self.storage.rechnungen_years():
+                for row in self.storage.iter_rechnungen(year):
+                    self.add(year, row)
+            self.save()
+
+        logging.info("rebuilt rollups.json")
+
+    def years(self) -> list:
+        """returns the years with rollups, newest first"""
+
+        with self.lock:
+            return sorted({key[0] for key in self.rollups}, reverse=True)
+
+    def summary(self, year, art: str = "Alle", kuerzel: str = "") -> list:
+        """returns (month, kuerzel, KG/HP, anzahl, umsatz, km) of year, sorted by
+        month and kuerzel"""
+
+        with self.lock:
+            return sorted(
+                (key[1], key[2], key[3], *value)
+                for key, value in self.rollups.items()
+                if key[0] == str(year)
+                and art in ("Alle", key[3])
+                and kuerzel.upper() in key[2].upper()
+            )
+
+
+class RechnungValidator:
+    """Validation rules of the KG/HP rechnung entries, shared by the interfaces and
+    the bulk import"""
+
+    datum_pattern = r"(^0[1-9]|[12][0-9]|3[01]).(0[1-9]|1[0-2]).(\d{2}$)"
+
+    @classmethod
+    def is_datum(cls, text: str) -> bool:
+        """checks if text is a date formatted dd.mm.yy"""
+
+        return bool(re.match(cls.datum_pattern, text))
+
+    @staticmethod
+    def preis(text) -> float:
+        """converts a price with , or . as decimal separator. Raises ValueError"""
+
+        return float(str(text).replace(",", "."))
+
+    @staticmethod
+    def stammdaten_error(stammdaten: StammdatenRecord):
+        """returns the warning for invalid stammdaten, None if they are valid"""
+
+        for index, i in enumerate(stammdaten):
+            if index == 9:
+                try:
+                    float(i)
+                except ValueError:
+                    return (
+                        "Stammdatei - Kilometer keine Zahl: -> z.B. 3.40 oder 10; Ändern "
+                        "unter stammdaten!"
+                    )
+            if i == "" and index not in (8, 10, 11, 12, 13):
+                return (
+                    f"Stammdatei hat keinen Wert in Linie {index + 1}. Stammdatei "
+                    f"überprüfen!"
+                )
+        return None
+
+
+class RechnungenImport:
+    """Bulk import of rechnungen out of a csv (; delimited, with header) or json
+    file (list of objects). The fields of a rechnung are:
+
+    art: KG or HP, kuerzel, rechnungsdatum (dd.mm.yy)
+    KG: behandlungsdaten, behandlungsarten, einzelpreise (lists, in csv separated
+        by | or as json list)
+    HP: behandlungsdaten (json list of {datum, ziffern, behandlungen, betraege}),
+        diagnose
+
+    The rows are validated with the rules of the interfaces (RechnungValidator)
+    and written through the journal in batches that share one fsync. Every
+    rejected row is reported in errors. Optionally renders the pdfs in a process
+    pool. run() is meant to be called in a thread, progress is readable meanwhile."""
+
+    batch_size = 1000
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.errors = []
+        self.imported = 0
+        self.progress = ""
+        self.done = False
+
+    @staticmethod
+    def read_file(filepath: str) -> list:
+        """returns the rechnungen of the file as dicts"""
+
+        with open(filepath, "r", newline="", encoding="utf-8-sig") as f:
+            if filepath.lower().endswith(".json"):
+                return json.load(f)
+            return list(csv.DictReader(f, delimiter=";"))
+
+    @staticmethod
+    def split_cell(cell) -> list:
+        """returns the list out of a json list, a | separated string or a list"""
+
+        if isinstance(cell, (list, tuple)):
+            return list(cell)
+        cell = str(cell or "").strip()
+        if cell.startswith("["):
+            return json.loads(cell)
+        return [i.strip() for i in cell.split("|")] if cell else []
+
+    @staticmethod
+    def lines(cell) -> list:
+        """returns the non empty lines of a cell (list or \\n separated string)"""
+
+        if isinstance(cell, (list, tuple)):
+            return [str(i) for i in cell if str(i) != ""]
+        return list(filter(None, str(cell or "").split("\n")))
+
+    def validate(self, entry: dict) -> tuple:
+        """returns (year, rechnungsdaten, pdf task) of the entry. Raises ValueError
+        with the warning of the interfaces"""
+
+        kuerzel = str(entry.get("kuerzel") or "").strip()
+        if len(kuerzel) != 4:
+            raise ValueError("Kürzel muss 4 Zeichen lang sein!")
+        stammdaten = self.parent.stammdaten_repository.get(kuerzel)
+        if stammdaten is None:
+            raise ValueError("Kürzel/Stammdatei nicht gefunden.")
+        error = RechnungValidator.stammdaten_error(stammdaten)
+        if error:
+            raise ValueError(error)
+
+        rechnungsdatum = str(entry.get("rechnungsdatum") or "").strip()
+        if not RechnungValidator.is_datum(rechnungsdatum):
+            raise ValueError("Rechnungsdatum nicht richtig formatiert: dd.mm.yy")
+        year = f"20{rechnungsdatum[-2:]}"
+
+        if str(entry.get("art") or "").strip().upper() == "HP":
+            return (year,) + self.validate_hp(entry, stammdaten, rechnungsdatum)
+        return (year,) + self.validate_kg(entry, stammdaten, rechnungsdatum)
+
+    def validate_kg(self, entry: dict, stammdaten: StammdatenRecord, rechnungsdatum: str) -> tuple:
+        """rules of KGRechnungInterface.validate_kg_entries"""
+
+        dates = [str(i) for i in self.split_cell(entry.get("behandlungsdaten"))]
+        if len(dates) > 10:
+            raise ValueError("Mehr als 10 Behandlungsdaten!")
+        for index, i in enumerate(dates):
+            if not RechnungValidator.is_datum(i):
+                raise ValueError(f"Datum {index + 1} nicht richtig formatiert: dd.mm.yy")
+
+        behandlungsarten = [str(i) for i in self.split_cell(entry.get("behandlungsarten"))]
+        einzelpreise_text = self.split_cell(entry.get("einzelpreise"))
+        if len(behandlungsarten) != len(einzelpreise_text):
+            raise ValueError("Anzahl Behandlungsarten und Einzelpreise stimmt nicht überein!")
+        if (
+                self.parent.behandlungsarten_limiter
+                and len(behandlungsarten) > self.parent.behandlungsarten_limit
+        ):
+            raise ValueError(
+                f"Mehr als {self.parent.behandlungsarten_limit} Behandlungsarten!"
+            )
+
+        einzelpreise = []
+        for index, (art, preis) in enumerate(zip(behandlungsarten, einzelpreise_text)):
+            if art == "":
+                raise ValueError(f"Behandlungsart {index + 1} braucht eine Eingabe!")
+            try:
+                einzelpreise.append(RechnungValidator.preis(preis))
+            except ValueError:
+                raise ValueError(
+                    f"Einzelpreis {index + 1} keine Zahl: {preis} -> z.B. 3.40"
+                ) from None
+
+        datenanzahl = len(dates)
+        dates.extend([""] * (10 - datenanzahl))
+        km_total = 2 * stammdaten.kilometer * float(datenanzahl)
+        gesamtpreis = 0
+        for i in einzelpreise:
+            gesamtpreis += float(datenanzahl) * i
+
+        rechnung = KgRechnungRecord(
+            stammdaten.kuerzel,
+            f'{stammdaten.kuerzel}{rechnungsdatum.replace(".", "")}',
+            stammdaten.km,
+            "km",
+            km_total,
+            "km",
+            gesamtpreis,
+            "Euro",
+            *dates,
+            behandlungsarten,
+            einzelpreise,
+        )
+        return rechnung, ("KG", (stammdaten, rechnung))
+
+    def validate_hp(self, entry: dict, stammdaten: StammdatenRecord, rechnungsdatum: str) -> tuple:
+        """rules of HPRechnungInterface.validate_hp_entries"""
+
+        behandlungsdaten = []
+        gesamtpreis = 0
+        for index, i in enumerate(self.split_cell(entry.get("behandlungsdaten")), 1):
+            if isinstance(i, dict):
+                i = [i.get("datum"), i.get("ziffern"), i.get("behandlungen"), i.get("betraege")]
+            if not isinstance(i, (list, tuple)) or len(i) != 4:
+                raise ValueError(f"Reihe {index} hat nicht 4 Spalten!")
+
+            datum = self.lines(i[0])
+            if len(datum) != 1:
+                raise ValueError(f"Es wurde in Reihe {index} mehr/weniger als 1 Datum eingegeben")
+            if not RechnungValidator.is_datum(datum[0].replace("\t", "")):
+                raise ValueError(f"Datum in Reihe {index} nicht richtig formatiert: dd.m.yy")
+
+            ziffern, behandlungen, betraege = (self.lines(a) for a in i[1:])
+            if len(ziffern) == 0:
+                raise ValueError(f"Keine Daten in Reihe {index} eingegeben!")
+            if not len(ziffern) == len(behandlungen) == len(betraege):
+                raise ValueError(
+                    f"Die eingegebenen Datenanzahl stimmt nicht mit den anderen in Reihe "
+                    f"{index} überein"
+                )
+
+            einzelpreise = []
+            for index_2, c in enumerate(betraege):
+                try:
+                    c = RechnungValidator.preis(c)
+                except ValueError:
+                    raise ValueError(
+                        f"Einzelpreis {index_2} in Reihe {index} keine Zahl: {c} -> z.B. 3.40"
+                    ) from None
+                einzelpreise.append(f"{round(c, 2):.2f}".replace(".", ","))
+                gesamtpreis += c
+
+            behandlungsdaten.append(
+                [datum[0], "\n".join(ziffern), "\n".join(behandlungen), "\n".join(einzelpreise)]
+            )
+
+        diagnose = str(entry.get("diagnose") or "")
+        km_total = 2 * stammdaten.kilometer * float(len(behandlungsdaten))
+
+        rechnung = HpRechnungRecord(
+            stammdaten.kuerzel,
+            f'{stammdaten.kuerzel}{rechnungsdatum.replace(".", "")}H',
+            stammdaten.km,
+            "km",
+            km_total,
+            "km",
+            gesamtpreis,
+            "Euro",
+            behandlungsdaten,
+            diagnose,
+        )
+        return rechnung, ("HP", (stammdaten, rechnung))
+
+    def run(self, filepath: str, create_pdfs: bool = False):
+        """imports the rechnungen of the file"""
+
+        logging.debug("RechnungenImport.run() called")
+
+        try:
+            self.progress = "Datei wird gelesen..."
+            entries = self.read_file(filepath)
+
+            # header line of csv files is line 1
+            first_line = 1 if filepath.lower().endswith(".json") else 2
+            rows = {}
+            pdf_tasks = []
+            seen = set()
+            for line, entry in enumerate(entries, first_line):
+                if line % 1000 == 0:
+                    self.progress = f"{line - first_line}/{len(entries)} Rechnungen geprüft"
+                try:
+                    if not isinstance(entry, dict):
+                        raise ValueError("Kein gültiger Eintrag!")
+                    year, rechnung, pdf_task = self.validate(entry)
+                    if rechnung.rechnungsnummer in seen:
+                        raise ValueError("Rechnungsnummer mehrmals in der Datei!")
+                    if self.parent.storage.find_rechnung(year, rechnung.rechnungsnummer):
+                        raise ValueError("Rechnung existiert bereits!")
+                except ValueError as e:
+                    rechnungsnummer = ""
+                    if isinstance(entry, dict):
+                        rechnungsnummer = str(entry.get("kuerzel") or "")
+                    self.errors.append((line, rechnungsnummer, str(e)))
+                    continue
+
+                seen.add(rechnung.rechnungsnummer)
+                rows.setdefault(year, []).append(rechnung)
+                pdf_tasks.append((year, pdf_task))
+
+            self.progress = "Rechnungen werden gespeichert..."
+            with self.parent.journal.batch():
+                for year, year_rows in rows.items():
+                    for i in range(0, len(year_rows), self.batch_size):
+                        self.parent.journal.import_rows(
+                            year, year_rows[i:i + self.batch_size]
+                        )
+                        self.imported += len(year_rows[i:i + self.batch_size])
+            logging.info(f"imported {self.imported} rechnungen out of {filepath}")
+
+            if create_pdfs:
+                self.render_pdfs(pdf_tasks)
+        except (OSError, ValueError) as e:
+            logging.error(f"import of {filepath} failed: {e}")
+            self.errors.append((0, "", f"Import abgebrochen: {e}"))
+        finally:
+            self.done = True
+
+    def render_pdfs(self, pdf_tasks: list):
+        """renders the pdfs of the imported rechnungen in a process pool"""
+
+        logging.debug("RechnungenImport.render_pdfs() called")
+
+        tasks = []
+        for year, (kind, pdf_args) in pdf_tasks:
+            path = f"{self.parent.rechnungen_location}/rechnungen-{year}/"
+            os.makedirs(path, exist_ok=True)
+            tasks.append(
+                (
+                    kind,
+                    pdf_args,
+                    f"{path}{pdf_args[1].rechnungsnummer}.pdf",
+                    self.parent.steuer_id,
+                    self.parent.iban,
+                    self.parent.bic,
+                )
+            )
+
+        # the same RenderCache bookkeeping as re-rendering a year
+        renderer = RechnungenRender(self.parent)
+        pending = renderer.pending(tasks)
+        for index, (task, error) in enumerate(
+                renderer.render(pending, chunksize=16), renderer.unchanged + 1
+        ):
+            if index % 100 == 0:
+                self.progress = f"{index}/{len(tasks)} PDFs erstellt"
+            if error:
+                self.errors.append(
+                    (0, task[1][1].rechnungsnummer, f"PDF Fehler: {error}")
+                )
+
+    def write_report(self) -> str:
+        """writes the errors into {rechnungen_location}/import-fehler-{time}.csv and
+        returns the path"""
+
+        filepath = (
+            f"{self.parent.rechnungen_location}/"
+            f"import-fehler-{time.strftime('%Y%m%d-%H%M%S')}.csv"
+        )
+        with open(filepath, "w", newline="", encoding="utf-8") as f:
+            csvfile = csv.writer(f, delimiter=";")
+            csvfile.writerow(["Zeile", "Kürzel/Rechnungsnummer", "Fehler"])
+            csvfile.writerows(self.errors)
+        return filepath
+
+
+class RechnungenRender:
+    """Renders the pdfs of the stored rechnungen of a year again, e.g. after the
+    logo or the bank details changed. The rechnungen are read out of the ledger,
+    optionally filtered by kuerzel and rechnungsdatum, and rendered in a process
+    pool on all cores. Every pdf is written to a hidden temp file and moved over
+    the old one, so a pdf is never half written. PDFs whose inputs are unchanged
+    (RenderCache) are skipped. run() is meant to be called in a thread, progress is
+    readable meanwhile."""
+
+    chunksize = 8
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.errors = []
+        self.rendered = 0
+        self.unchanged = 0
+        self.total = 0
+        self.duration = 0.0
+        self.progress = ""
+        self.done = False
+
+    @staticmethod
+    def document(task: tuple) -> tuple:
+        """returns the document class and its arguments of a task"""
+
+        kind, (stammdaten, rechnung), filepath, steuer_id, iban, bic = task
+        kwargs = {
+            "stammdaten": stammdaten,
+            "rechnung": rechnung,
+            "steuer_id": steuer_id,
+            "iban": iban,
+            "bic": bic,
+        }
+        return (KgRechnung if kind == "KG" else HpRechnung), kwargs
+
+    @classmethod
+    def render_pdf(cls, task: tuple):
+        """renders one pdf atomically. Runs in a worker process, returns the error
+        or None"""
+
+        document_class, kwargs = cls.document(task)
+        return PdfRenderer.render(document_class, task[2], kwargs)
+
+    @staticmethod
+    def in_range(rechnung: RechnungRecord, von: str = "", bis: str = "") -> bool:
+        """checks if the rechnungsdatum is within von and bis (dd.mm.yy, empty for
+        no limit)"""
+
+        try:
+            datum = time.strptime(rechnung.rechnungsdatum, "%d.%m.%y")
+        except ValueError:
+            return False
+        if von and datum < time.strptime(von, "%d.%m.%y"):
+            return False
+        if bis and datum > time.strptime(bis, "%d.%m.%y"):
+            return False
+        return True
+
+    def tasks(self, year, kuerzel: str = "", von: str = "", bis: str = "") -> list:
+        """returns the render tasks of the stored rechnungen of year matching the
+        filter"""
+
+        path = f"{self.parent.rechnungen_location}/rechnungen-{year}/"
+        tasks = []
+        for cells in self.parent.storage.iter_rechnungen(year):
+            rechnung = RechnungRecord.create(RechnungCodec.decode(cells))
+            if kuerzel and rechnung.kuerzel.upper() != kuerzel.upper():
+                continue
+            if (von or bis) and not self.in_range(rechnung, von, bis):
+                continue
+
+            stammdaten = self.parent.stammdaten_repository.get(rechnung.kuerzel)
+            if stammdaten is None:
+                self.errors.append(
+                    (rechnung.rechnungsnummer, "Kürzel/Stammdatei nicht gefunden.")
+                )
+                continue
+            tasks.append(
+                (
+                    "HP" if rechnung.is_hp else "KG",
+                    (stammdaten, rechnung),
+                    f"{path}{rechnung.rechnungsnummer}.pdf",
+                    self.parent.steuer_id,
+                    self.parent.iban,
+                    self.parent.bic,
+                )
+            )
+        return tasks
+
+    def pending(self, tasks: list) -> list:
+        """returns (task, digest) of the tasks whose pdf isn't current, the others
+        are counted as unchanged"""
+
+        render_cache = self.parent.render_cache
+        pending = []
+        for task in tasks:
+            digest = render_cache.digest(*self.document(task))
+            if render_cache.is_current(task[2], digest):
+                self.unchanged += 1
+            else:
+                pending.append((task, digest))
+        return pending
+
+    def render(self, pending: list, chunksize: int = None):
+        """renders the pending tasks in a process pool and records their digests in
+        the RenderCache, a failed pdf loses its digest. Yields (task, error) of every
+        task as it is done"""
+
+        render_cache = self.parent.render_cache
+        tasks = [task for task, digest in pending]
+        try:
+            with ProcessPoolExecutor() as executor:
+                results = executor.map(
+                    self.render_pdf, tasks, chunksize=chunksize or self.chunksize
+                )
+                for (task, digest), error in zip(pending, results):
+                    if error:
+                        render_cache.discard(task[2])
+                    else:
+                        self.rendered += 1
+                        render_cache.store(task[2], digest, save=False)
+                    yield task, error
+        finally:
+            render_cache.save()
+
+    def run(self, year, kuerzel: str = "", von: str = "", bis: str = ""):
+        """renders the pdfs of year matching the filter"""
+
+        logging.debug("RechnungenRender.run() called")
+
+        started = time.perf_counter()
+        try:
+            self.progress = "Rechnungen werden gelesen..."
+            tasks = self.tasks(year, kuerzel, von, bis)
+            self.total = len(tasks)
+            if tasks:
+                os.makedirs(
+                    f"{self.parent.rechnungen_location}/rechnungen-{year}/", exist_ok=True
+                )
+
+            pending = self.pending(tasks)
+            for index, (task, error) in enumerate(self.render(pending), self.unchanged + 1):
+                if error:
+                    self.errors.append((task[1][1].rechnungsnummer, error))
+                elapsed = time.perf_counter() - started
+                self.progress = (
+                    f"{index}/{self.total} PDFs, "
+                    f"{self.rendered / elapsed:.1f} PDFs/s"
+                )
+        except (OSError, ValueError, sqlite3.Error) as e:
+            logging.error(f"rendering the pdfs of {year} failed: {e}")
+            self.errors.append(("", f"Abgebrochen: {e}"))
+        finally:
+            self.duration = time.perf_counter() - started
+            logging.info(
+                f"rendered {self.rendered}/{self.total} pdfs of {year} in "
+                f"{self.duration:.1f}s ({self.unchanged} unchanged, "
+                f"{len(self.errors)} errors)"
+            )
+            self.done = True
+
+
+class PdfRenderer:
+    """Renders the pdfs of the interfaces in a long-lived worker process, so the
+    window keeps responding while a long rechnung is laid out. Jobs run in the order
+    they were submitted. Their results are picked up on the Tk thread with after(),
+    reported in the bottom nav and the pdf is opened. A pdf whose inputs are
+    unchanged (RenderCache) is only touched instead of rendered."""
+
+    # ms between two checks for finished jobs
+    poll_interval = 100
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.executor = None
+        # (future, filepath, message, digest) of the submitted jobs
+        self.jobs = []
+        self.start()
+
+    def start(self):
+        """starts the worker process and loads the pdf assets in it"""
+
+        logging.debug("PdfRenderer.start() called")
+
+        self.executor = ProcessPoolExecutor(max_workers=1)
+        self.executor.submit(PdfAssets.load)
+
+    @staticmethod
+    def render(document_class, filepath: str, kwargs: dict):
+        """renders document_class(filepath=..., **kwargs) atomically. Runs in a worker
+        process, returns the error or None"""
+
+        directory, filename = os.path.split(filepath)
+        tmp_path = os.path.join(directory, f".{filename}.tmp")
+        try:
+            document_class(filepath=tmp_path, **kwargs)
+            os.replace(tmp_path, filepath)
+        except Exception as e:  # reported to the caller, must not stop the worker
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            return str(e)
+        return None
+
+    def submit(self, document_class, filepath: str, message: str, **kwargs):
+        """queues the pdf. message is shown when it is done"""
+
+        logging.debug(f"PdfRenderer.submit() called; {document_class.__name__} {filepath}")
+
+        digest = self.parent.render_cache.digest(document_class, kwargs)
+        if self.parent.render_cache.is_current(filepath, digest):
+            try:
+                os.utime(filepath)
+            except OSError:
+                self.parent.render_cache.discard(filepath)
+            else:
+                logging.info(f"{filepath} unchanged, not rendered")
+                self.parent.bottom_nav.bottom_nav_warning.configure(
+                    text=message, fg_color="green"
+                )
+                self.parent.open_file(filepath)
+                return
+
+        if self.executor is None:
+            self.start()
+        self.parent.bottom_nav.bottom_nav_warning.configure(
+            text="PDF wird erstellt...", fg_color="orange"
+        )
+        future = self.executor.submit(self.render, document_class, filepath, kwargs)
+        self.jobs.append((future, filepath, message, digest))
+        if len(self.jobs) == 1:
+            self.parent.after(self.poll_interval, self.poll)
+
+    def poll(self):
+        """reports the finished jobs and opens their pdfs"""
+
+        for job in [i for i in self.jobs if i[0].done()]:
+            self.jobs.remove(job)
+            future, filepath, message, digest = job
+            try:
+                error = future.result()
+            except Exception as e:  # worker died, e.g. BrokenProcessPool
+                error = str(e) or type(e).__name__
+                self.executor = None
+
+            if error:
+                self.parent.render_cache.discard(filepath)
+                logging.error(f"pdf {filepath} failed: {error}")
+                self.parent.bottom_nav.bottom_nav_warning.configure(
+                    text=f"PDF konnte nicht erstellt werden: {error}", fg_color="red"
+                )
+                continue
+            logging.info(f"rendered {filepath}")
+            self.parent.render_cache.store(filepath, digest)
+            self.parent.bottom_nav.bottom_nav_warning.configure(
+                text=message, fg_color="green"
+            )
+            self.parent.open_file(filepath)
+
+        if self.jobs and self.parent.running:
+            self.parent.after(self.poll_interval, self.poll)
+
+    def close(self):
+        """waits for the queued pdfs and stops the worker process"""
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+
+class RenderCache:
+    """Digests of the inputs of the rendered pdfs in the rechnungen location
+    ({rechnungen_location}/render-cache.json), keyed by the path of the pdf. The
+    digest covers the document class and its template_version, the logo, the
+    stammdaten, the rechnung and the bank details, so a pdf with the same digest
+    doesn't need to be rendered again. Entries are dropped when the pdf is removed
+    (clean_remove, file watcher) or its rendering fails."""
+
+    def __init__(self, rechnungen_location: str):
+        self.rechnungen_location = os.path.normpath(rechnungen_location)
+        self.path = f"{rechnungen_location}/render-cache.json"
+        self.lock = threading.RLock()
+        # pdf path relative to the rechnungen location -> digest
+        self.digests = {}
+
+        self.load()
+
+    def load(self):
+        """reads render-cache.json, starts empty if it is missing or corrupt"""
+
+        logging.debug("RenderCache.load() called")
+
+        with self.lock:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.digests = dict(json.load(f))
+            except FileNotFoundError:
+                self.digests = {}
+            except (ValueError, TypeError):
+                logging.info("render-cache.json corrupt, starting empty")
+                self.digests = {}
+
+    def save(self):
+        """writes render-cache.json. A failed write only costs renderings"""
+
+        with self.lock:
+            try:
+                with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                    json.dump(self.digests, f)
+                os.replace(f"{self.path}.tmp", self.path)
+            except OSError as e:
+                logging.error(f"couldn't write render-cache.json: {e}")
+
+    def prune(self):
+        """drops the entries whose pdf was removed while the program wasn't running"""
+
+        with self.lock:
+            missing = [
+                i for i in self.digests
+                if not os.path.exists(os.path.join(self.rechnungen_location, i))
+            ]
+            for i in missing:
+                del self.digests[i]
+            if missing:
+                self.save()
+        logging.debug(f"render cache: {len(self.digests)} pdfs, {len(missing)} pruned")
+
+    def key(self, filepath: str):
+        """returns the key of the pdf, None if it is outside the rechnungen location"""
+
+        key = os.path.relpath(os.path.normpath(filepath), self.rechnungen_location)
+        if key.startswith(".."):
+            return None
+        return key.replace(os.sep, "/")
+
+    @staticmethod
+    def canonical(value):
+        """returns value with every scalar as str. The form holds floats where the
+        rechnung read out of the ledger holds their str, both hash the same"""
+
+        if isinstance(value, dict):
+            return {key: RenderCache.canonical(i) for key, i in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [RenderCache.canonical(i) for i in value]
+        return "" if value is None else str(value)
+
+    @staticmethod
+    def digest(document_class, kwargs: dict) -> str:
+        """returns the hash of everything the pdf is rendered from"""
+
+        return hashlib.blake2b(
+            json.dumps(
+                [
+                    document_class.__name__,
+                    document_class.template_version,
+                    PdfAssets.version(),
+                    RenderCache.canonical(kwargs),
+                ],
+                sort_keys=True,
+                ensure_ascii=False,
+                default=str,
+            ).encode("utf-8"),
+            digest_size=16,
+        ).hexdigest()
+
+    def is_current(self, filepath: str, digest: str) -> bool:
+        """checks if the pdf was rendered out of the same inputs and still exists"""
+
+        key = self.key(filepath)
+        with self.lock:
+            if key is None or self.digests.get(key) != digest:
+                return False
+        return os.path.exists(filepath)
+
+    def store(self, filepath: str, digest: str, save: bool = True):
+        """records the digest of a rendered pdf"""
+
+        key = self.key(filepath)
+        if key is None:
+            return
+        with self.lock:
+            self.digests[key] = digest
+            if save:
+                self.save()
+
+    def discard(self, filepath: str):
+        """forgets the pdf"""
+
+        key = self.key(filepath)
+        with self.lock:
+            if self.digests.pop(key, None) is not None:
+                self.save()
+
+    def file_events(self, events: dict):
+        """forgets the pdfs deleted outside the program"""
+
+        for path, kind in events.items():
+            if kind == "deleted" and path.endswith(".pdf"):
+                self.discard(path)
+
+
+class StammdatenImport:
+    """Bulk import of stammdaten out of a csv (; delimited, the header holds the
+    labels of StammdatenInterface or the StammdatenRecord fields) or vcard file.
+    Kürzel, kilometer, KG/HP and hausarzt are read out of the vcard properties
+    X-KUERZEL, X-KILOMETER, X-KG-HP and X-HAUSARZT.
+
+    The file is streamed, every entry is checked with the rules of
+    StammdatenInterface.validate_stammdaten_entries. Kürzel that already exist or
+    appear twice are rejected, nothing is overwritten. The valid entries are
+    written in batches. run() is meant to be called in a thread."""
+
+    batch_size = 500
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.errors = []
+        self.imported = 0
+        self.progress = ""
+        self.done = False
+
+    @staticmethod
+    def entry_error(stammdaten: list):
+        """returns (index, warning) of the first invalid line of the stammdaten,
+        None if they are valid"""
+
+        if len(stammdaten[0]) != 4:
+            return 0, "Kürzel mehr/weniger als 4 Buchstaben!"
+        if stammdaten[1] != "Mann" and stammdaten[1] != "Frau":
+            return 1, 'Mann/Frau muss "Mann" oder "Frau" sein'
+        try:
+            float(stammdaten[9])
+        except ValueError:
+            return 9, "Kilometer zu fahren muss int oder float sein!"
+        if stammdaten[12] != "HP" and stammdaten[12] != "KG":
+            return 12, "Nicht HP oder KG eingegeben!"
+        return None
+
+    @staticmethod
+    def iter_csv(f):
+        """yields the stammdaten lines of the csv rows"""
+
+        columns = {i.lower(): index for index, i in enumerate(StammdatenRecord._fields)}
+        columns.update(
+            (i.lower(), index)
+            for index, i in enumerate(StammdatenInterface.stammdaten_label_names)
+        )
+
+        reader = csv.reader(f, delimiter=";")
+        header = [columns.get(i.strip().lower()) for i in next(reader, [])]
+        for row in reader:
+            stammdaten = [""] * len(StammdatenRecord._fields)
+            for index, cell in zip(header, row):
+                if index is not None:
+                    stammdaten[index] = cell.strip()
+            yield stammdaten
+
+    @staticmethod
+    def vcard_value(value: str) -> str:
+        """unescapes a vcard value"""
+
+        return re.sub(
+            r"\\(.)", lambda m: "\n" if m.group(1) in "nN" else m.group(1), value
+        )
+
+    @staticmethod
+    def vcard_split(value: str) -> list:
+        """splits a structured vcard value (N, ADR) at the unescaped ;"""
+
+        return re.split(r"(?<!\\);", value)
+
+    @classmethod
+    def iter_vcard(cls, f):
+        """yields the stammdaten lines of the vcards"""
+
+        card = None
+        previous = None
+        for line in itertools.chain(f, [""]):
+            line = line.rstrip("\r\n")
+            # folded lines continue the previous one
+            if line[:1] in (" ", "\t") and previous is not None:
+                previous += line[1:]
+                continue
+            if previous is not None:
+                name, _, value = previous.partition(":")
+                name = name.split(";")[0].upper()
+                if name == "BEGIN":
+                    card = {}
+                elif name == "END" and card is not None:
+                    yield cls.vcard_stammdaten(card)
+                    card = None
+                elif card is not None:
+                    card.setdefault(name, value)
+            previous = line if line else None
+
+    @classmethod
+    def vcard_stammdaten(cls, card: dict) -> list:
+        """returns the stammdaten lines of one vcard (property -> raw value)"""
+
+        nachname, vorname = (cls.vcard_split(card.get("N", "")) + ["", ""])[:2]
+        adresse = (cls.vcard_split(card.get("ADR", "")) + [""] * 7)[:7]
+        strasse, _, hausnummer = adresse[2].rpartition(" ")
+        if not strasse or not hausnummer[:1].isdigit():
+            strasse, hausnummer = adresse[2], ""
+
+        geschlecht = card.get("X-GENDER", card.get("GENDER", "")).upper()[:1]
+        geburtsdatum = card.get("X-GEBURTSDATUM", "")
+        if not geburtsdatum:
+            match = re.match(r"(\d{4})-?(\d{2})-?(\d{2})", card.get("BDAY", ""))
+            if match:
+                geburtsdatum = f"{match.group(3)}.{match.group(2)}.{match.group(1)}"
+
+        stammdaten = [
+            card.get("X-KUERZEL", ""),
+            {"M": "Mann", "F": "Frau"}.get(geschlecht, ""),
+            nachname,
+            vorname,
+            strasse,
+            hausnummer,
+            adresse[5],
+            adresse[3],
+            geburtsdatum,
+            card.get("X-KILOMETER", ""),
+            card.get("X-HAUSARZT", ""),
+            card.get("EMAIL", ""),
+            card.get("X-KG-HP", ""),
+            card.get("TEL", ""),
+        ]
+        return [cls.vcard_value(i).strip() for i in stammdaten]
+
+    def store(self, batch: list):
+        """writes a batch of valid stammdaten"""
+
+        self.parent.stammdaten_repository.store_many(batch)
+        self.imported += len(batch)
+        batch.clear()
+
+    def run(self, filepath: str):
+        """imports the stammdaten of the file"""
+
+        logging.debug("StammdatenImport.run() called")
+
+        repository = self.parent.stammdaten_repository
+        try:
+            with open(filepath, "r", newline="", encoding="utf-8-sig") as f:
+                if filepath.lower().endswith((".vcf", ".vcard")):
+                    entries = self.iter_vcard(f)
+                else:
+                    entries = self.iter_csv(f)
+
+                batch = []
+                seen = set()
+                for number, stammdaten in enumerate(entries, 1):
+                    if number % 100 == 0:
+                        self.progress = f"{number} Stammdateien geprüft"
+
+                    error = self.entry_error(stammdaten)
+                    if error:
+                        self.errors.append((number, stammdaten[0], error[1]))
+                        continue
+                    if stammdaten[0] in seen:
+                        self.errors.append((number, stammdaten[0], "Kürzel mehrmals in der Datei!"))
+                        continue
+                    if repository.exists(stammdaten[0]):
+                        self.errors.append((number, stammdaten[0], "Stammdatei existiert bereits!"))
+                        continue
+
+                    seen.add(stammdaten[0])
+                    batch.append(stammdaten)
+                    if len(batch) >= self.batch_size:
+                        self.store(batch)
+                if batch:
+                    self.store(batch)
+            logging.info(f"imported {self.imported} stammdaten out of {filepath}")
+        except (OSError, ValueError, csv.Error, sqlite3.Error) as e:
+            logging.error(f"import of {filepath} failed: {e}")
+            self.errors.append((0, "", f"Import abgebrochen: {e}"))
+        finally:
+            self.done = True
+
+    def write_report(self) -> str:
+        """writes the errors into {stammdaten_location}/import-fehler-{time}.csv and
+        returns the path"""
+
+        filepath = (
+            f"{self.parent.stammdaten_location}/"
+            f"import-fehler-{time.strftime('%Y%m%d-%H%M%S')}.csv"
+        )
+        with open(filepath, "w", newline="", encoding="utf-8") as f:
+            csvfile = csv.writer(f, delimiter=";")
+            csvfile.writerow(["Eintrag", "Kürzel", "Fehler"])
+            csvfile.writerows(self.errors)
+        return filepath
+
+
+class StammdatenExport:
+    """Exports all stammdaten into a csv (; delimited, header with the labels of
+    StammdatenInterface) or vcard file (.vcf). Streams one stammdatei at a time
+    straight out of the storage, the repository cache is not filled. run() is meant
+    to be called in a thread."""
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.exported = 0
+        self.error = None
+        self.done = False
+
+    @staticmethod
+    def vcard_value(value: str) -> str:
+        """escapes a vcard value"""
+
+        return (
+            value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\n", "\\n")
+        )
+
+    @classmethod
+    def vcard(cls, record: StammdatenRecord) -> str:
+        """returns the vcard of the record"""
+
+        v = {i: cls.vcard_value(getattr(record, i)) for i in record._fields}
+        strasse = f"{v['strasse']} {v['hausnummer']}".strip()
+        lines = [
+            "BEGIN:VCARD",
+            "VERSION:3.0",
+            f"N:{v['nachname']};{v['vorname']};;;",
+            f"FN:{v['vorname']} {v['nachname']}".strip(),
+            f"ADR;TYPE=home:;;{strasse};{v['ort']};;{v['plz']};",
+            f"X-GENDER:{dict(Mann='M', Frau='F').get(record.mann_frau, '')}",
+        ]
+        match = re.fullmatch(r"(\d{1,2})\.(\d{1,2})\.(\d{4})", record.geburtsdatum)
+        if match:
+            lines.append(
+                f"BDAY:{match.group(3)}-{int(match.group(2)):02d}-{int(match.group(1)):02d}"
+            )
+        for name, field in (
+                ("EMAIL", "email"),
+                ("TEL", "telefon"),
+                ("X-KUERZEL", "kuerzel"),
+                ("X-KILOMETER", "km"),
+                ("X-KG-HP", "kg_hp"),
+                ("X-HAUSARZT", "hausarzt"),
+                ("X-GEBURTSDATUM", "geburtsdatum"),
+        ):
+            if v[field]:
+                lines.append(f"{name}:{v[field]}")
+        lines.append("END:VCARD")
+        return "\r\n".join(lines) + "\r\n"
+
+    def run(self, filepath: str):
+        """writes all stammdaten into filepath"""
+
+        logging.debug("StammdatenExport.run() called")
+
+        storage = self.parent.stammdaten_repository.storage
+        vcard = filepath.lower().endswith((".vcf", ".vcard"))
+        try:
+            with open(
+                    filepath, "w", newline="", encoding="utf-8" if vcard else "utf-8-sig"
+            ) as f:
+                if not vcard:
+                    csvfile = csv.writer(f, delimiter=";")
+                    csvfile.writerow(StammdatenInterface.stammdaten_label_names)
+
+                for kuerzel, created, modified in storage.list_stammdaten():
+                    lines = storage.load_stammdaten(kuerzel)
+                    if lines is None:
+                        continue
+                    record = StammdatenRecord.from_lines(lines)
+                    if vcard:
+                        f.write(self.vcard(record))
+                    else:
+                        csvfile.writerow(record)
+                    self.exported += 1
+            logging.info(f"exported {self.exported} stammdaten into {filepath}")
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"export into {filepath} failed: {e}")
+            self.error = str(e)
+        finally:
+            self.done = True
+
+
+class DraftAutosave:
+    """Autosave of the KG/HP forms. Every key or click restarts a debounce timer,
+    when it fires the form is snapshotted into a draft record and hashed. Only a
+    changed snapshot is written, on a single writer thread, so writes and removals
+    of drafts happen in the order they were queued. Whether a snapshot changed is
+    decided against the DraftRegistry, without touching the disk."""
+
+    # ms without input until the form is saved
+    debounce = 1500
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.timer = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="autosave")
+
+    def schedule(self, *args):
+        """(re)starts the debounce timer while a KG/HP interface is open"""
+
+        if self.parent.kg_interface is None and self.parent.hp_interface is None:
+            return
+        if self.timer is not None:
+            self.parent.after_cancel(self.timer)
+        self.timer = self.parent.after(self.debounce, self.flush)
+
+    def complete(self, kuerzel: str, rechnungsdatum: str) -> bool:
+        """checks if kuerzel is a known patient and rechnungsdatum a full
+        dd.mm.yy date. A half typed one would name the draft wrong"""
+
+        if len(kuerzel) != 4 or not self.parent.stammdaten_repository.known(kuerzel.upper()):
+            return False
+        try:
+            datum = time.strptime(rechnungsdatum, "%d.%m.%y")
+        except ValueError:
+            return False
+        return time.strftime("%d.%m.%y", datum) == rechnungsdatum
+
+    def snapshot(self) -> tuple:
+        """returns the open KG/HP interface and its draft record, the record is
+        None if there is nothing to save"""
+
+        for interface in (self.parent.kg_interface, self.parent.hp_interface):
+            if interface is not None and interface.winfo_exists():
+                return interface, interface.draft_record()
+        return None, None
+
+    @staticmethod
+    def digest(cells: list) -> str:
+        """returns the hash of the encoded draft row"""
+
+        return hashlib.blake2b(
+            json.dumps(cells, ensure_ascii=False).encode("utf-8"), digest_size=16
+        ).hexdigest()
+
+    def flush(self):
+        """snapshots the open form and queues the write if it changed"""
+
+        if self.timer is not None:
+            self.parent.after_cancel(self.timer)
+            self.timer = None
+
+        interface, record = self.snapshot()
+        if record is None:
+            return
+        rechnungsnummer = record.rechnungsnummer.upper()
+
+        registry = self.parent.draft_registry
+        # the form edits a stored rechnung
+        if registry.has_rechnung(rechnungsnummer):
+            return
+
+        cells = RechnungCodec.encode(record)
+        digest = self.digest(cells)
+        if registry.update(rechnungsnummer, digest):
+            self.executor.submit(self.write, rechnungsnummer, cells, digest)
+
+        # kuerzel or rechnungsdatum changed since the last save, the draft under
+        # the old rechnungsnummer is replaced by this one
+        previous = interface.draft_rechnungsnummer
+        interface.draft_rechnungsnummer = rechnungsnummer
+        if previous is not None and previous != rechnungsnummer:
+            self.remove_draft(previous)
+
+    def write(self, rechnungsnummer: str, cells: list, digest: str):
+        """writes the draft. Runs on the writer thread"""
+
+        try:
+            self.parent.storage.store_draft(rechnungsnummer, cells)
+            logging.debug(f"autosaved draft {rechnungsnummer}")
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"autosave of draft {rechnungsnummer} failed: {e}")
+            self.parent.draft_registry.discard(rechnungsnummer, digest)
+
+    def remove(self, name: str):
+        """queues removing all drafts whose filename contains name"""
+
+        self.parent.draft_registry.discard_matching(name)
+        self.executor.submit(self.parent.storage.remove_drafts, name)
+
+    def remove_draft(self, rechnungsnummer: str):
+        """queues removing the draft of rechnungsnummer only. remove() would also
+        take the HP draft ({rechnungsnummer}H) of a KG rechnungsnummer"""
+
+        self.parent.draft_registry.discard(rechnungsnummer)
+        self.executor.submit(self.parent.storage.remove_drafts, f"{rechnungsnummer}DRAFT")
+
+    def close(self):
+        """saves the open form and waits for all queued writes"""
+
+        if not self.parent.debug_mode:
+            self.flush()
+        self.executor.shutdown(wait=True)
+
+
+class DraftRegistry:
+    """In-memory state the autosave decides on: the digest of every stored draft by
+    rechnungsnummer and the rechnungen of the program year that have a pdf. Loaded
+    once in the background, then kept current by the autosave, clean_remove,
+    App.store_rechnung and the file watcher."""
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.lock = threading.Lock()
+        # rechnungsnummer -> digest of the stored draft
+        self.digests = {}
+        # rechnungsnummern with a pdf in rechnungen-{year}/
+        self.rechnungen = set()
+        self.year = None
+
+    def load(self):
+        """hashes the stored drafts and lists the pdfs of the program year"""
+
+        logging.debug("DraftRegistry.load() called")
+
+        storage = self.parent.storage
+        digests = {}
+        for draft in storage.list_drafts():
+            cells = storage.load_draft(draft.rechnungsnummer)
+            if cells is not None:
+                digests[draft.rechnungsnummer.upper()] = DraftAutosave.digest(cells)
+        with self.lock:
+            # digests set by the autosave meanwhile are newer
+            for rechnungsnummer, digest in digests.items():
+                self.digests.setdefault(rechnungsnummer, digest)
+        self.load_rechnungen()
+        logging.debug(f"draft registry: {len(digests)} drafts, {len(self.rechnungen)} pdfs")
+
+    def rechnungen_path(self, year) -> str:
+        """returns the normalized dir of the pdfs of year"""
+
+        return os.path.normpath(f"{self.parent.rechnungen_location}/rechnungen-{year}")
+
+    def load_rechnungen(self):
+        """lists the pdfs of the program year"""
+
+        year = str(self.parent.year)
+        try:
+            names = {
+                i[:-4].upper() for i in os.listdir(self.rechnungen_path(year))
+                if i.endswith(".pdf")
+            }
+        except FileNotFoundError:
+            names = set()
+        with self.lock:
+            self.rechnungen = names
+            self.year = year
+
+    def has_rechnung(self, rechnungsnummer: str) -> bool:
+        """checks if the rechnung has a pdf in the program year"""
+
+        if self.year != str(self.parent.year):
+            self.load_rechnungen()
+        with self.lock:
+            return rechnungsnummer.upper() in self.rechnungen
+
+    def add_rechnung(self, rechnungsnummer: str):
+        """records a rechnung stored in the program year"""
+
+        with self.lock:
+            self.rechnungen.add(rechnungsnummer.upper())
+
+    def discard_rechnung(self, rechnungsnummer: str):
+        """records a rechnung removed from the program year"""
+
+        with self.lock:
+            self.rechnungen.discard(rechnungsnummer.upper())
+
+    def update(self, rechnungsnummer: str, digest: str) -> bool:
+        """sets the digest of the draft, returns False if it is unchanged"""
+
+        with self.lock:
+            if self.digests.get(rechnungsnummer) == digest:
+                return False
+            self.digests[rechnungsnummer] = digest
+            return True
+
+    def discard(self, rechnungsnummer: str, digest=None):
+        """forgets the draft, with a digest only if it is still the current one"""
+
+        with self.lock:
+            if digest is None or self.digests.get(rechnungsnummer) == digest:
+                self.digests.pop(rechnungsnummer, None)
+
+    def discard_matching(self, name: str):
+        """forgets all drafts whose rechnungsnummer contains name, like
+        Storage.remove_drafts"""
+
+        with self.lock:
+            for rechnungsnummer in [i for i in self.digests if name.lower() in i.lower()]:
+                del self.digests[rechnungsnummer]
+
+    def file_events(self, events: dict):
+        """follows pdfs added or deleted in the program year and drafts deleted outside
+        the program"""
+
+        rechnungen_path = self.rechnungen_path(self.year)
+        for path, kind in events.items():
+            dirname, filename = os.path.split(path)
+            if filename.startswith("."):
+                continue
+            if dirname == rechnungen_path and filename.endswith(".pdf"):
+                if kind == "deleted":
+                    self.discard_rechnung(filename[:-4])
+                else:
+                    self.add_rechnung(filename[:-4])
+            elif filename.endswith("DRAFT.csv") and kind == "deleted":
+                self.discard(filename[:-len("DRAFT.csv")].upper())
+
+
+class IntegrityScanner:
+    """Checks the consistency of the stored rechnungen, the pdfs in
+    rechnungen-{year}/, the drafts and the stammdaten in one linear pass with
+    hash sets. Runs in a background thread. The findings are kept until one of
+    the scanned files/dirs changes (signature of their mtime and size).
+
+    Findings are (kategorie, year, name) with kategorie out of kategorien."""
+
+    kategorien = {
+        "doppelt": "Rechnungsnummer mehrmals gespeichert",
+        "ohne_pdf": "Rechnung ohne PDF",
+        "ohne_rechnung": "PDF ohne gespeicherte Rechnung",
+        "entwurf": "Verwaister Entwurf",
+        "stammdaten": "Stammdatei fehlt",
+    }
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.lock = threading.Lock()
+        self.thread = None
+        self.signature = None
+        self.findings = []
+        self.progress = ""
+
+    def current_signature(self) -> tuple:
+        """returns (path, mtime, size) of everything the result depends on. Dirs
+        change their mtime when files are added or removed"""
+
+        location = self.parent.rechnungen_location
+        paths = [f"{location}/drafts", f"{location}/rechnungsprogramm.db"]
+        paths.append(self.parent.stammdaten_location)
+        paths.append(f"{self.parent.stammdaten_location}/stammdaten.db")
+        try:
+            for i in os.listdir(location):
+                if re.match(r"^rechnungen-\d{4}$", i):
+                    paths.append(f"{location}/{i}")
+            for i in os.listdir(f"{location}/rechnungen-csv"):
+                if i.endswith(".csv"):
+                    paths.append(f"{location}/rechnungen-csv/{i}")
+        except FileNotFoundError:
+            pass
+
+        signature = []
+        for i in sorted(paths):
+            try:
+                stat = os.stat(i)
+            except FileNotFoundError:
+                continue
+            signature.append((i, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    @property
+    def running(self) -> bool:
+        """checks if a scan is in progress"""
+
+        return self.thread is not None and self.thread.is_alive()
+
+    def is_current(self) -> bool:
+        """checks if the findings still match the files"""
+
+        return self.signature is not None and self.signature == self.current_signature()
+
+    def start(self, force: bool = False) -> bool:
+        """starts a scan in the background unless one is running or the cached
+        findings are still current. Returns True if a scan was started"""
+
+        logging.debug("IntegrityScanner.start() called")
+
+        with self.lock:
+            if self.running or (not force and self.is_current()):
+                return False
+            self.progress = "Prüfung gestartet..."
+            self.thread = threading.Thread(target=self.scan, daemon=True)
+            self.thread.start()
+            return True
+
+    def scan(self):
+        """the scan itself, runs in the background thread"""
+
+        logging.debug("IntegrityScanner.scan() called")
+
+        # taken before scanning, changes during the scan invalidate the findings
+        signature = self.current_signature()
+        storage = self.parent.storage
+        location = self.parent.rechnungen_location
+
+        findings = []
+        try:
+            years = set(storage.rechnungen_years())
+            for i in os.listdir(location):
+                if re.match(r"^rechnungen-\d{4}$", i):
+                    years.add(i[len("rechnungen-"):])
+            stammdaten = {i[0] for i in self.parent.stammdaten_repository.list()}
+
+            stored = set()
+            for number, year in enumerate(sorted(years), 1):
+                self.progress = f"Jahr {year} ({number}/{len(years)})"
+
+                seen = set()
+                duplicates = set()
+                for row in storage.iter_rechnungen(year):
+                    if len(row) < 2:
+                        continue
+                    if row[1] in seen:
+                        duplicates.add(row[1])
+                        continue
+                    seen.add(row[1])
+                    if row[0] not in stammdaten:
+                        findings.append(("stammdaten", year, row[1]))
+
+                path = f"{location}/rechnungen-{year}"
+                pdfs = set()
+                if os.path.isdir(path):
+                    pdfs = {i[:-len(".pdf")] for i in os.listdir(path) if i.endswith(".pdf")}
+
+                findings.extend(("doppelt", year, i) for i in sorted(duplicates))
+                findings.extend(("ohne_pdf", year, i) for i in sorted(seen - pdfs))
+                findings.extend(("ohne_rechnung", year, i) for i in sorted(pdfs - seen))
+                stored |= seen
+
+            # drafts of stored rechnungen or of deleted stammdaten are left overs
+            self.progress = "Entwürfe"
+            for draft in storage.list_drafts():
+                rechnungsnummer = draft.rechnungsnummer
+                if rechnungsnummer in stored or rechnungsnummer[:4] not in stammdaten:
+                    findings.append(("entwurf", "", draft.filename))
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"integrity scan failed: {e}")
+            self.progress = f"Prüfung fehlgeschlagen: {e}"
+            return
+
+        self.findings = findings
+        self.signature = signature
+        self.progress = ""
+        logging.info(f"integrity scan done, {len(findings)} finding(s)")
+
+    def report(self) -> str:
+        """returns the findings as text, grouped by kategorie"""
+
+        if not self.findings:
+            return "Keine Probleme gefunden."
+
+        lines = []
+        for kategorie, text in self.kategorien.items():
+            findings = [i for i in self.findings if i[0] == kategorie]
+            if not findings:
+                continue
+            lines.append(f"{text} ({len(findings)}):")
+            lines.extend(
+                f"    {year}  {name}" if year else f"    {name}"
+                for _, year, name in findings
             )
+            lines.append("")
+        return "\n".join(lines)
+
+
+class FileWatcher:
+    """Watches rechnungen_location with its rechnungen-{year} dirs, drafts/ and
+    stammdaten_location for added, modified and deleted files. Uses inotify on
+    Linux and falls back to polling the dirs on other systems (or if inotify
+    isn't available). The events (kind, path) are collected in a queue,
+    App.poll_file_events() hands them to the caches and the open interface on
+    the Tk thread."""
+
+    # seconds between two scans of the polling fallback
+    poll_interval = 2
+
+    # inotify event masks (linux/inotify.h)
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+
+    def __init__(self, rechnungen_location: str, stammdaten_location: str):
+        self.rechnungen_location = rechnungen_location
+        self.stammdaten_location = stammdaten_location
+        self.events = queue.Queue()
+        self.running = False
+        self.thread = None
+        self.mode = ""
+
+    def dirs(self) -> list:
+        """returns the existing dirs to watch"""
+
+        dirs = [
+            self.rechnungen_location,
+            f"{self.rechnungen_location}/drafts",
+            self.stammdaten_location,
+        ]
+        try:
+            for i in os.listdir(self.rechnungen_location):
+                if re.match(r"^rechnungen-\d{4}$", i):
+                    dirs.append(f"{self.rechnungen_location}/{i}")
         except FileNotFoundError:
             pass
-        self.set_font("helvetica", "B", 14)
-        self.cell(0, new_x=XPos.LMARGIN, new_y=YPos.TMARGIN)
-        self.ln(2.5)
-        self.cell(25)
-        self.cell(0, text="Mervi Fischbach", align="L")
-        # self.cell(0, text='Test', align='R')
-        self.ln()
-        self.cell(25)
-        self.set_font("helvetica", "B", 12)
-        self.set_text_color(150)
-        self.cell(0, text="Heilpraktikerin &", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        self.cell(25)
-        self.cell(0, text="Physiotherapeutin")
-        self.ln(23)
+        return [i for i in dict.fromkeys(dirs) if os.path.isdir(i)]
 
-    # Page footer
-    def footer(self):
-        """New PDF footer section"""
+    def start(self):
+        """starts watching in a background thread"""
 
-        # Position at 3.5 cm from bottom
-        self.set_y(-35)
-        # helvetica italic 8
-        self.set_font("helvetica", "B", 8)
-        self.cell(0, 5, "Bankverbindung", align="C")
-        self.ln(3)
-        self.cell(0, 5, f"IBAN: {self.iban}", align="C")
-        self.ln(3)
-        self.cell(0, 5, f"BIC: {self.bic}", align="C")
-        self.ln(3)
-        self.set_font("helvetica", "", 6)
-        self.cell(1, 5, f"Rechnungsnummer: {self.rechnungsnummer}", align="L")
-        self.cell(
-            0,
-            5,
-            f"Steuer Nummer: {self.steuer_id} - Ust. Befreit nach §4 UStG",
-            align="C",
-        )
-        # Page number
-        self.cell(0, 5, "Seite " + str(self.page_no()) + " von {nb}", align="R")
+        logging.debug("FileWatcher.start() called")
+
+        self.running = True
+        if platform.system() == "Linux":
+            target = self.run_inotify
+        else:
+            target = self.run_polling
+        self.thread = threading.Thread(target=target, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """stops the background thread"""
 
+        self.running = False
 
-class HpPdf(FPDF):
-    """overwrites the default FPDF2 header and footer functions for HP Rechnung."""
+    def run_inotify(self):
+        """reads the inotify events of the watched dirs"""
 
-    def __init__(self, rechnungsnummer: str, steuer_id: str, iban: str, bic: str):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init()
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init failed")
+        except (OSError, AttributeError) as e:
+            logging.info(f"inotify not available ({e}), polling instead")
+            return self.run_polling()
+
+        self.mode = "inotify"
+        mask = (
+                self.IN_ATTRIB
+                | self.IN_CLOSE_WRITE
+                | self.IN_MOVED_FROM
+                | self.IN_MOVED_TO
+                | self.IN_CREATE
+                | self.IN_DELETE
+        )
+        watches = {}
+
+        def add_watch(directory: str):
+            """starts watching directory"""
+
+            wd = libc.inotify_add_watch(fd, os.fsencode(directory), mask)
+            if wd >= 0:
+                watches[wd] = directory
+            else:
+                logging.info(f"couldn't watch {directory}")
+
+        for i in self.dirs():
+            add_watch(i)
+        logging.info(f"watching {len(watches)} dirs with inotify")
+
+        try:
+            while self.running:
+                if not select.select([fd], [], [], 1)[0]:
+                    continue
+                data = os.read(fd, 64 * 1024)
+
+                offset = 0
+                while offset < len(data):
+                    wd, event_mask, _, length = struct.unpack_from("iIII", data, offset)
+                    name = os.fsdecode(data[offset + 16:offset + 16 + length].rstrip(b"\0"))
+                    offset += 16 + length
+
+                    if event_mask & self.IN_IGNORED:
+                        watches.pop(wd, None)
+                        continue
+                    directory = watches.get(wd)
+                    if directory is None or not name:
+                        continue
+                    path = f"{directory}/{name}"
+
+                    if event_mask & self.IN_ISDIR:
+                        # new rechnungen-{year} or drafts dir
+                        if event_mask & (self.IN_CREATE | self.IN_MOVED_TO) and path in self.dirs():
+                            add_watch(path)
+                        continue
+
+                    if event_mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                        self.events.put(("added", path))
+                    elif event_mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                        self.events.put(("deleted", path))
+                    else:
+                        self.events.put(("modified", path))
+        except OSError as e:
+            logging.error(f"inotify watcher stopped: {e}")
+        finally:
+            os.close(fd)
+
+    def snapshot(self) -> dict:
+        """returns (mtime, size) of every file in the watched dirs"""
+
+        files = {}
+        for directory in self.dirs():
+            try:
+                with os.scandir(directory) as entries:
+                    for i in entries:
+                        if i.is_file():
+                            stat = i.stat()
+                            files[f"{directory}/{i.name}"] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                continue
+        return files
+
+    def run_polling(self):
+        """compares snapshots of the watched dirs every poll_interval seconds"""
+
+        self.mode = "polling"
+        logging.info("watching dirs by polling")
+
+        previous = self.snapshot()
+        while self.running:
+            time.sleep(self.poll_interval)
+            current = self.snapshot()
+            for path in current.keys() - previous.keys():
+                self.events.put(("added", path))
+            for path in previous.keys() - current.keys():
+                self.events.put(("deleted", path))
+            for path in current.keys() & previous.keys():
+                if current[path] != previous[path]:
+                    self.events.put(("modified", path))
+            previous = current
+
+
+class PdfAssets:
+    """Resources shared by all pdfs of a process. The logo is read and decoded once
+    and every new document gets the decoded image handed over, instead of reading
+    the png again. Reloaded when the logo file changed."""
+
+    logo_path = "./system/components/images/logo.png"
+    lock = threading.Lock()
+
+    loaded = False
+    # mtime of the loaded logo, None without logo
+    logo_mtime = None
+    images = {}
+    icc_profiles = {}
+
+    @classmethod
+    def version(cls):
+        """returns the mtime of the logo, None without logo"""
+
+        try:
+            return os.stat(cls.logo_path).st_mtime_ns
+        except OSError:
+            return None
+
+    @classmethod
+    def load(cls):
+        """decodes the logo if it is not loaded or changed since"""
+
+        mtime = cls.version()
+        with cls.lock:
+            if cls.loaded and mtime == cls.logo_mtime:
+                return
+            loader = FPDF()
+            if mtime is not None:
+                try:
+                    loader.preload_image(cls.logo_path)
+                except (OSError, ValueError) as e:
+                    logging.warning(f"couldn't load logo: {e}")
+            cls.images = loader.image_cache.images
+            cls.icc_profiles = loader.image_cache.icc_profiles
+            cls.logo_mtime = mtime
+            cls.loaded = True
+
+    @classmethod
+    def install(cls, pdf: FPDF):
+        """hands the decoded assets to the image cache of pdf"""
+
+        cls.load()
+        for name, info in cls.images.items():
+            info = type(info)(info)
+            info["usages"] = 0
+            pdf.image_cache.images[name] = info
+        pdf.image_cache.icc_profiles.update(cls.icc_profiles)
+
+
+class PraxisPdf(FPDF):
+    """overwrites the default FPDF2 header for all pdfs of the praxis. The logo
+    comes out of PdfAssets"""
+
+    # part of the RenderCache digest, raise it when the layout changes
+    template_version = 1
+
+    # second line of the header, the third is shown in gray or hidden (white)
+    berufsbezeichnung = "Heilpraktikerin"
+    berufsbezeichnung_2_color = 255
+
+    def __init__(self):
         super().__init__()
-        self.rechnungsnummer = rechnungsnummer
-        self.steuer_id = steuer_id
-        self.iban = iban
-        self.bic = bic
+        PdfAssets.install(self)
 
     def header(self):
         """New PDF header section"""
 
         # Logo
-        try:
+        if PdfAssets.logo_path in self.image_cache.images:
             self.image(
                 x=22,
                 y=17,
-                name="./system/components/images/logo.png",
+                name=PdfAssets.logo_path,
                 w=18,
                 alt_text="Logo",
             )
-        except FileNotFoundError:
-            pass
         self.set_font("helvetica", "B", 14)
         self.cell(0, new_x=XPos.LMARGIN, new_y=YPos.TMARGIN)
         self.ln(2.5)
         self.cell(25)
         self.cell(0, text="Mervi Fischbach", align="L")
-        # self.cell(0, text='Test', align='R')
         self.ln()
         self.cell(25)
         self.set_font("helvetica", "B", 12)
         self.set_text_color(150)
-        self.cell(0, text="Heilpraktikerin", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        self.cell(0, text=self.berufsbezeichnung, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
         self.cell(25)
-        self.set_text_color(255)
+        self.set_text_color(self.berufsbezeichnung_2_color)
         self.cell(0, text="Physiotherapeutin")
         self.ln(23)
 
+
+class RechnungPdf(PraxisPdf):
+    """overwrites the default FPDF2 footer with the bank details for the
+    rechnungen"""
+
+    def __init__(self, rechnungsnummer: str, steuer_id: str, iban: str, bic: str):
+        super().__init__()
+        self.rechnungsnummer = rechnungsnummer
+        self.steuer_id = steuer_id
+        self.iban = iban
+        self.bic = bic
+
     # Page footer
     def footer(self):
         """New PDF footer section"""
@@ -5145,43 +9821,24 @@ class HpPdf(FPDF):
         self.cell(0, 5, "Seite " + str(self.page_no()) + " von {nb}", align="R")
 
 
-class DocumentPdf(FPDF):
-    """overwrites the default FPDF2 header and footer functions for HP Rechnung."""
+class KgPdf(RechnungPdf):
+    """header and footer for KG Rechnung."""
+
+    berufsbezeichnung = "Heilpraktikerin &"
+    berufsbezeichnung_2_color = 150
+
+
+class HpPdf(RechnungPdf):
+    """header and footer for HP Rechnung."""
+
+
+class DocumentPdf(PraxisPdf):
+    """overwrites the default FPDF2 footer for the documents."""
 
     def __init__(self, footer_note: str):
         super().__init__()
         self.footer_note = footer_note
 
-    def header(self):
-        """New PDF header section"""
-
-        # Logo
-        try:
-            self.image(
-                x=22,
-                y=17,
-                name="./system/components/images/logo.png",
-                w=18,
-                alt_text="Logo",
-            )
-        except FileNotFoundError:
-            pass
-        self.set_font("helvetica", "B", 14)
-        self.cell(0, new_x=XPos.LMARGIN, new_y=YPos.TMARGIN)
-        self.ln(2.5)
-        self.cell(25)
-        self.cell(0, text="Mervi Fischbach", align="L")
-        # self.cell(0, text='Test', align='R')
-        self.ln()
-        self.cell(25)
-        self.set_font("helvetica", "B", 12)
-        self.set_text_color(150)
-        self.cell(0, text="Heilpraktikerin", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        self.cell(25)
-        self.set_text_color(255)
-        self.cell(0, text="Physiotherapeutin")
-        self.ln(23)
-
     # Page footer
     def footer(self):
         """New PDF footer section"""
@@ -5206,54 +9863,25 @@ class KgRechnung(KgPdf):
 
     def __init__(
             self,
-            parent,
-            stammdaten: list,
-            rechnungsnummer: str,
-            rechnungsdatum: str,
-            gesamtpreis: float,
-            rechnungsdaten: list,
-            rechnungsdaten_anzahl: int,
-            behandlungsarten: list,
-            einzelpreise: list,
+            stammdaten: StammdatenRecord,
+            rechnung: KgRechnungRecord,
             filepath: str,
             steuer_id: str,
             iban: str,
             bic: str,
     ):
-        super().__init__(rechnungsnummer, steuer_id, iban, bic)
-        self.parent = parent
+        super().__init__(rechnung.rechnungsnummer, steuer_id, iban, bic)
 
         self.set_margins(17, 17, 17)
 
-        self.prepare_data(
-            stammdaten,
-            rechnungsnummer,
-            rechnungsdatum,
-            gesamtpreis,
-            rechnungsdaten,
-            rechnungsdaten_anzahl,
-            behandlungsarten,
-            einzelpreise,
-        )
+        self.prepare_data(stammdaten, rechnung)
         self.create_pages(filepath)
 
-    def prepare_data(
-            self,
-            stammdaten,
-            rechnungsnummer,
-            rechnungsdatum,
-            gesamtpreis,
-            rechnungsdaten,
-            rechnungsdaten_anzahl,
-            behandlungsarten,
-            einzelpreise,
-    ):
+    def prepare_data(self, stammdaten: StammdatenRecord, rechnung: KgRechnungRecord):
         """prepares the passed data so table creation is working!"""
 
         self.table_data_1 = [["Patientenkürzel", "Rechnungsnummer", "Rechnungsdatum"]]
 
-        self.table_data_2 = []
-
         self.table_data_3 = [
             ["Anzahl", "Art der Behandlung", "Einzelpreis", "Gesamtpreis", ""],
             ["1", "Anamnese und Befunderhebung", "0,00", "0,00", "\u00a0"],
@@ -5261,40 +9889,40 @@ class KgRechnung(KgPdf):
 
         self.table_data_4 = [["", "", "", ""]]
 
-        self.kuerzel = stammdaten[0]
-        self.mann_frau = stammdaten[1]
-        self.nachname = stammdaten[2]
-        self.vorname = stammdaten[3]
-        self.strasse = stammdaten[4]
-        self.hausnummer = stammdaten[5]
-        self.plz = stammdaten[6]
-        self.ort = stammdaten[7]
-        self.geburtsdatum = stammdaten[8]
-
-        self.table_data_1.append([self.kuerzel, rechnungsnummer, rechnungsdatum])
-
-        for i in range(int(len(rechnungsdaten) / 2)):
-            array_1d = []
-            for _ in range(2):
-                array_1d.append(rechnungsdaten.pop(-1))
-            array_1d.reverse()
-            self.table_data_2.insert(0, array_1d)
-
-        self.rechnungsdaten_anzahl = rechnungsdaten_anzahl
-        if behandlungsarten:
-            for index, i in enumerate(behandlungsarten):
-                self.table_data_3.append(
-                    [
-                        str(self.rechnungsdaten_anzahl),
-                        i,
-                        f"{round(float(einzelpreise[index]), 2):.2f}".replace(".", ","),
-                        f"{round(float(einzelpreise[index]) * rechnungsdaten_anzahl, 2):.2f}"
-                        f"".replace(".", ","),
-                        "\u00a0",
-                    ]
-                )
+        self.kuerzel = stammdaten.kuerzel
+        self.mann_frau = stammdaten.mann_frau
+        self.nachname = stammdaten.nachname
+        self.vorname = stammdaten.vorname
+        self.strasse = stammdaten.strasse
+        self.hausnummer = stammdaten.hausnummer
+        self.plz = stammdaten.plz
+        self.ort = stammdaten.ort
+        self.geburtsdatum = stammdaten.geburtsdatum
 
-        self.gesamtpreis = f"{round(float(gesamtpreis), 2):.2f}".replace(".", ",")
+        self.table_data_1.append(
+            [self.kuerzel, rechnung.rechnungsnummer, rechnung.rechnungsdatum]
+        )
+
+        # two behandlungsdaten per row
+        dates = rechnung.behandlungsdaten
+        self.table_data_2 = [list(dates[i:i + 2]) for i in range(0, len(dates), 2)]
+
+        self.rechnungsdaten_anzahl = rechnung.datenanzahl
+        for behandlungsart, einzelpreis in zip(
+                rechnung.behandlungsarten, rechnung.einzelpreise
+        ):
+            self.table_data_3.append(
+                [
+                    str(self.rechnungsdaten_anzahl),
+                    behandlungsart,
+                    f"{round(float(einzelpreis), 2):.2f}".replace(".", ","),
+                    f"{round(float(einzelpreis) * self.rechnungsdaten_anzahl, 2):.2f}"
+                    f"".replace(".", ","),
+                    "\u00a0",
+                ]
+            )
+
+        self.gesamtpreis = f"{round(float(rechnung.gesamtpreis), 2):.2f}".replace(".", ",")
         self.table_data_4.insert(0, ["", "Gesamtbetrag:", self.gesamtpreis, "\u00a0"])
 
     def create_pages(self, filepath):
@@ -5453,6 +10081,44 @@ class KgRechnung(KgPdf):
         self.output(filepath)
 
 
+class HpTable(Table):
+    """FPDF table that keeps the row layout it measured once. HpRechnung plans its
+    page breaks with it and render() reuses it instead of measuring again."""
+
+    row_info = None
+
+    def _process_rowpans_entries(self):
+        if self.row_info is None:
+            self.row_info = list(super()._process_rowpans_entries())
+        return self.row_info
+
+    @property
+    def heading_rows(self) -> int:
+        return self._num_heading_rows
+
+    def measure(self):
+        """lays out the rows without rendering"""
+
+        self._cols_count = max(row.cols_count for row in self.rows)
+        self._process_rowpans_entries()
+
+    def row_heights(self) -> list:
+        """returns (index, height, pagebreak height) of the measured rows"""
+
+        return [
+            (index, info.height, info.pagebreak_height)
+            for index, info in enumerate(self.row_info)
+        ]
+
+    def part(self, indices) -> "HpTable":
+        """returns a table of the rows at indices, keeping their measurements"""
+
+        table = copy.copy(self)
+        table.rows = [self.rows[i] for i in indices]
+        table.row_info = [self.row_info[i] for i in indices]
+        return table
+
+
 class HpRechnung(HpPdf):
     """Creates the HP PDF and outputs to given filepath"""
 
@@ -5465,39 +10131,24 @@ class HpRechnung(HpPdf):
 
     def __init__(
             self,
-            stammdaten: list,
-            rechnungsnummer: str,
-            rechnungsdatum: str,
-            gesamtpreis: float,
-            rechnungsdaten: list,
-            diagnose: str,
+            stammdaten: StammdatenRecord,
+            rechnung: HpRechnungRecord,
             filepath: str,
             steuer_id: str,
             iban: str,
             bic: str,
     ):
-        super().__init__(rechnungsnummer, steuer_id, iban, bic)
+        super().__init__(rechnung.rechnungsnummer, steuer_id, iban, bic)
 
         self.set_margins(17, 17, 17)
 
-        self.prepare_data(
-            stammdaten,
-            rechnungsnummer,
-            rechnungsdatum,
-            gesamtpreis,
-            rechnungsdaten,
-            diagnose,
-        )
+        self.prepare_data(stammdaten, rechnung)
         self.create_pages(filepath)
 
     def prepare_data(
             self,
-            stammdaten,
-            rechnungsnummer,
-            rechnungsdatum,
-            gesamtpreis,
-            rechnungsdaten,
-            diagnose,
+            stammdaten: StammdatenRecord,
+            rechnung: HpRechnungRecord,
     ):
         """prepares the passed data so table creation is working!"""
 
@@ -5507,41 +10158,138 @@ class HpRechnung(HpPdf):
 
         self.table_data_3 = [["", "", "", "", ""]]
 
-        self.kuerzel = stammdaten[0]
-        self.mann_frau = stammdaten[1]
-        self.nachname = stammdaten[2]
-        self.vorname = stammdaten[3]
-        self.strasse = stammdaten[4]
-        self.hausnummer = stammdaten[5]
-        self.plz = stammdaten[6]
-        self.ort = stammdaten[7]
-        self.geburtsdatum = stammdaten[8]
+        self.kuerzel = stammdaten.kuerzel
+        self.mann_frau = stammdaten.mann_frau
+        self.nachname = stammdaten.nachname
+        self.vorname = stammdaten.vorname
+        self.strasse = stammdaten.strasse
+        self.hausnummer = stammdaten.hausnummer
+        self.plz = stammdaten.plz
+        self.ort = stammdaten.ort
+        self.geburtsdatum = stammdaten.geburtsdatum
 
-        self.table_data_1.append([self.kuerzel, rechnungsnummer, rechnungsdatum])
+        self.table_data_1.append(
+            [self.kuerzel, rechnung.rechnungsnummer, rechnung.rechnungsdatum]
+        )
 
         self.manual_pagebreak = False
-        for i in rechnungsdaten:
-            length = len(list(filter(None, i[3].split())))
-            col_5 = []
-            for _ in range(length):
-                col_5.append("\u00a0\n")
-            i.insert(4, "".join(col_5))
-            self.table_data_2.append(i)
-
-        self.gesamtpreis = f"{round(float(gesamtpreis), 2):.2f}".replace(".", ",")
+        for i in rechnung.behandlungsdaten:
+            col_5 = "\u00a0\n" * len(i[3].split())
+            self.table_data_2.append([*i[:4], col_5, *i[4:]])
+
+        self.gesamtpreis = f"{round(float(rechnung.gesamtpreis), 2):.2f}".replace(".", ",")
         self.table_data_3.insert(
             0, ["", "", "Gesamtbetrag:", self.gesamtpreis, "\u00a0"]
         )
 
-        self.diagnose = diagnose
+        self.diagnose = rechnung.diagnose
+
+    def behandlungen_table(self) -> "HpTable":
+        """returns table 2 (Datum | Ziffer | Art der Behandlung | Betrag) with its
+        rows measured"""
+
+        table = HpTable(
+            self,
+            cell_fill_color=230,
+            cell_fill_mode="ROWS",
+            line_height=int(1.7 * self.font_size),
+            text_align=("CENTER", "RIGHT", "LEFT", "RIGHT", "LEFT"),
+            col_widths=(10, 8, 70, 10, 4),
+        )
+        for data_row in self.table_data_2:
+            row = table.row()
+            for index, datum in enumerate(data_row):
+                if index == 4:
+                    self.set_font("symbol", size=self.honorar_font_size + 1)
+                    row.cell(datum)
+                    self.set_font("helvetica", style="", size=self.honorar_font_size)
+                else:
+                    row.cell(datum)
+        table.measure()
+        return table
+
+    def gesamtbetrag_table(self, row_info: list = None) -> "HpTable":
+        """returns table 3 (Gesamtbetrag) with its row measured, or with the
+        row_info measured before"""
+
+        table = HpTable(
+            self,
+            borders_layout="NONE",
+            col_widths=(10, 8, 70, 10, 4),
+            line_height=int(1.7 * self.font_size),
+            text_align=("CENTER", "LEFT", "RIGHT", "RIGHT", "LEFT"),
+            cell_fill_color=180,
+            cell_fill_mode="NONE",
+            first_row_as_headings=False,
+        )
+        for data_row in self.table_data_3:
+            row = table.row()
+            for index, datum in enumerate(data_row):
+                if index == 4:
+                    self.set_font("symbol", "", size=self.honorar_font_size + 1)
+                    row.cell(datum)
+                    self.set_font("helvetica", style="", size=self.honorar_font_size)
+                else:
+                    self.set_font("helvetica", style="B", size=self.honorar_font_size)
+                    row.cell(datum)
+                    self.set_font("helvetica", style="", size=self.honorar_font_size)
+        if row_info is None:
+            table.measure()
+        else:
+            table.row_info = row_info
+        return table
+
+    def plan_rows(self, table: "HpTable", y: float) -> tuple:
+        """follows the page breaks FPDF will make rendering the measured table at y.
+        Returns the y after the table and the number of page breaks"""
+
+        page_breaks = 0
+        for index, height, pagebreak_height in table.row_heights():
+            if y > self.t_margin and y + pagebreak_height > self.page_break_trigger:
+                page_breaks += 1
+                y = self.page_top
+                # the headings are repeated on the new page
+                if index >= table.heading_rows:
+                    y += sum(i[1] for i in table.row_heights()[:table.heading_rows])
+            y += height
+        return y, page_breaks
+
+    def schluss_fits(self) -> bool:
+        """checks if the closing text fits on the current page by writing it with
+        writing disabled"""
+
+        page = self.page
+        # a page break in the header would tag the logo in the structure tree
+        struct_builder = self.struct_builder
+        self.struct_builder = copy.deepcopy(struct_builder)
+        with self._disable_writing():
+            self.write(6.5, text=f"Ich bitte Sie, den Gesamtbetrag von {self.gesamtpreis} ")
+            self.set_font("symbol", size=self.normal_font_size + 1)
+            self.write(6.5, text="\u00a0 ")
+            self.set_font("helvetica", size=self.normal_font_size)
+            self.write(
+                6.5,
+                text="innerhalb von 14 Tagen unter Angabe der Rechnungsnummer auf unten "
+                     "stehendes Konto zu überweisen.",
+            )
+            self.ln(13)
+            self.write(text="Mit freundlichen Grüßen")
+            self.ln(10)
+            self.write(text="Mervi Fischbach")
+            fits = self.page == page and self.y <= self.page_break_trigger
+        self.struct_builder = struct_builder
+        return fits
 
     def create_pages(self, filepath):
-        """Creates the PDF. Checks also checks for linebreak so content is not
-        split between 2 pages"""
+        """Creates the PDF. The rows of the tables are measured once and the page
+        breaks are planned before anything is rendered, so the total is not split
+        from the behandlungen"""
 
         self.set_auto_page_break(True, 35)
 
         self.add_page()
+        # y below the header, where every page starts
+        self.page_top = self.y
 
         self.set_font("helvetica", size=7)
         self.cell(self.rechnungsempfaenger_offset)
@@ -5594,92 +10342,6 @@ class HpRechnung(HpPdf):
         self.set_font("helvetica", style="", size=self.normal_font_size)
         self.multi_cell(135, text=f"{self.diagnose}")
 
-        # offset rendering the main table and the total
-        # making sure it is not split in half
-        with self.offset_rendering() as dummy:
-            dummy.cell(175, 0, border=1, center=True)
-            dummy.ln(10)
-            if self.mann_frau == "Mann":
-                dummy.write(
-                    text=f"Sehr geehrter Herr {self.nachname},\n\n"
-                         f"hiermit erlaube ich mir, für meine Bemühungen folgendes "
-                         f"Honorar zu berechnen:"
-                )
-            if self.mann_frau == "Frau":
-                dummy.write(
-                    text=f"Sehr geehrte Frau {self.nachname},\n\n"
-                         f"hiermit erlaube ich mir, für meine Bemühungen "
-                         f"folgendes Honorar zu berechnen:"
-                )
-            dummy.ln(7)
-            dummy.set_font("helvetica", size=self.honorar_font_size)
-
-            # Table 2
-            # -----------------
-            # Date | Ziffern | Descriptions | Costs
-            with dummy.table(
-                    cell_fill_color=230,
-                    cell_fill_mode="ROWS",
-                    line_height=int(1.7 * self.font_size),
-                    text_align=("CENTER", "RIGHT", "LEFT", "RIGHT", "LEFT"),
-                    col_widths=(10, 8, 70, 10, 4),
-            ) as table:
-                for index1, data_row in enumerate(self.table_data_2):
-                    row = table.row()
-                    for index2, datum in enumerate(data_row):
-                        if index2 == 4:
-                            dummy.set_font("symbol", size=self.honorar_font_size + 1)
-                            row.cell(datum)
-                            dummy.set_font(
-                                "helvetica", style="", size=self.honorar_font_size
-                            )
-                        else:
-                            row.cell(datum)
-
-            dummy.ln(1)
-            dummy.cell(175, 0, border=1, center=True)
-
-            # Table 3
-            # --------------
-            #      |      | Gesamtbetrag | Total
-            with dummy.table(
-                    borders_layout="NONE",
-                    col_widths=(10, 8, 70, 10, 4),
-                    line_height=int(1.7 * self.font_size),
-                    text_align=("CENTER", "LEFT", "RIGHT", "RIGHT", "LEFT"),
-                    cell_fill_color=180,
-                    cell_fill_mode="NONE",
-                    first_row_as_headings=False,
-            ) as table:
-                page_before = dummy.page_no()
-                for data_row in self.table_data_3:
-                    row = table.row()
-                    for index, datum in enumerate(data_row):
-                        if index == 4:
-                            dummy.set_font("symbol", "", size=self.honorar_font_size + 1)
-                            row.cell(datum)
-                            dummy.set_font(
-                                "helvetica", style="", size=self.honorar_font_size
-                            )
-                        else:
-                            dummy.set_font(
-                                "helvetica", style="B", size=self.honorar_font_size
-                            )
-                            row.cell(datum)
-                            dummy.set_font(
-                                "helvetica", style="", size=self.honorar_font_size
-                            )
-
-            man_page_break = False
-            if page_before != dummy.page_no():
-                man_page_break = True
-
-        if man_page_break:
-            self.table_data_2_1 = list(self.table_data_2)
-            while len(self.table_data_2_1) > 2:
-                self.table_data_2_1.pop(1)
-            self.table_data_2.pop(-1)
-
         self.cell(175, 0, border=1, center=True)
         self.ln(10)
         if self.mann_frau == "Mann":
@@ -5700,24 +10362,24 @@ class HpRechnung(HpPdf):
         # Table 2
         # -----------------
         # Date | Ziffern | Descriptions | Costs
-        with self.table(
-                cell_fill_color=230,
-                cell_fill_mode="ROWS",
-                line_height=int(1.7 * self.font_size),
-                text_align=("CENTER", "RIGHT", "LEFT", "RIGHT", "LEFT"),
-                col_widths=(10, 8, 70, 10, 4),
-        ) as table:
-            for data_row in self.table_data_2:
-                row = table.row()
-                for index, datum in enumerate(data_row):
-                    if index == 4:
-                        self.set_font("symbol", size=self.honorar_font_size + 1)
-                        row.cell(datum)
-                        self.set_font(
-                            "helvetica", style="", size=self.honorar_font_size
-                        )
-                    else:
-                        row.cell(datum)
+        table_2 = self.behandlungen_table()
+
+        # measured without output, the table is built after table 2 is rendered
+        with self._disable_writing():
+            gesamtbetrag = self.gesamtbetrag_table()
+
+        # the total is not split from the behandlungen: if it doesn't fit below
+        # table 2 anymore, the last row moves to the next page with it
+        y = self.plan_rows(table_2, self.y)[0] + 1
+        # below the trigger already the separator line breaks the page by itself
+        if y > self.page_break_trigger:
+            y = self.page_top
+        if self.plan_rows(gesamtbetrag, y)[1]:
+            last = len(table_2.rows) - 1
+            self.table_data_2_1 = table_2.part([0, last])
+            table_2 = table_2.part(range(last))
+
+        table_2.render()
 
         # only when table 2 and 3 are separated
         # Table 2.1
@@ -5725,24 +10387,7 @@ class HpRechnung(HpPdf):
         # Date | Ziffern | Descriptions | Costs
         if self.table_data_2_1:
             self.add_page()
-            with self.table(
-                    cell_fill_color=230,
-                    cell_fill_mode="ROWS",
-                    line_height=int(1.7 * self.font_size),
-                    text_align=("CENTER", "RIGHT", "LEFT", "RIGHT", "LEFT"),
-                    col_widths=(10, 8, 70, 10, 4),
-            ) as table:
-                for data_row in self.table_data_2_plus:
-                    row = table.row()
-                    for index, datum in enumerate(data_row):
-                        if index == 4:
-                            self.set_font("symbol", size=self.honorar_font_size + 1)
-                            row.cell(datum)
-                            self.set_font(
-                                "helvetica", style="", size=self.honorar_font_size
-                            )
-                        else:
-                            row.cell(datum)
+            self.table_data_2_1.render()
 
         self.ln(1)
         self.cell(175, 0, border=1, center=True)
@@ -5750,53 +10395,11 @@ class HpRechnung(HpPdf):
         # Table 3
         # --------------
         #      |      | Gesamtbetrag | Total
-        with self.table(
-                borders_layout="NONE",
-                col_widths=(10, 8, 70, 10, 4),
-                line_height=int(1.7 * self.font_size),
-                text_align=("CENTER", "LEFT", "RIGHT", "RIGHT", "LEFT"),
-                cell_fill_color=180,
-                cell_fill_mode="NONE",
-                first_row_as_headings=False,
-        ) as table:
-            for data_row in self.table_data_3:
-                row = table.row()
-                for index, datum in enumerate(data_row):
-                    if index == 4:
-                        self.set_font("symbol", "", size=self.honorar_font_size + 1)
-                        row.cell(datum)
-                        self.set_font(
-                            "helvetica", style="", size=self.honorar_font_size
-                        )
-                    else:
-                        self.set_font(
-                            "helvetica", style="B", size=self.honorar_font_size
-                        )
-                        row.cell(datum)
-                        self.set_font(
-                            "helvetica", style="", size=self.honorar_font_size
-                        )
+        self.gesamtbetrag_table(gesamtbetrag.row_info).render()
 
         self.ln(3)
 
-        with self.offset_rendering() as dummy:
-            dummy.write(
-                6.5, text=f"Ich bitte Sie, den Gesamtbetrag von {self.gesamtpreis} "
-            )
-            dummy.set_font("symbol", size=self.normal_font_size + 1)
-            dummy.write(6.5, text="\u00a0 ")
-            dummy.set_font("helvetica", size=self.normal_font_size)
-            dummy.write(
-                6.5,
-                text="innerhalb von 14 Tagen unter Angabe der Rechnungsnummer auf unten "
-                     "stehendes Konto zu überweisen.",
-            )
-            dummy.ln(13)
-            dummy.write(text="Mit freundlichen Grüßen")
-            dummy.ln(10)
-            dummy.write(text="Mervi Fischbach")
-
-        if dummy.page_break_triggered:
+        if not self.schluss_fits():
             self.add_page()
 
         self.set_font("helvetica", size=self.normal_font_size)
@@ -5831,7 +10434,7 @@ class Privacy(DocumentPdf):
 
     def __init__(
             self,
-            stammdaten: list,
+            stammdaten: StammdatenRecord,
             filepath: str,
     ):
         super().__init__("Datenschutzinformation und Einwilligungserklärung")
@@ -5839,23 +10442,17 @@ class Privacy(DocumentPdf):
         self.set_margins(17, 17, 17)
 
         # prepare data
-        self.kuerzel = stammdaten[0]
-        self.mann_frau = stammdaten[1]
-        self.nachname = stammdaten[2]
-        self.vorname = stammdaten[3]
-        self.strasse = stammdaten[4]
-        self.hausnummer = stammdaten[5]
-        self.plz = stammdaten[6]
-        self.ort = stammdaten[7]
-        self.geburtsdatum = stammdaten[8]
-        try:
-            self.email = stammdaten[11]
-        except IndexError:
-            self.email = ""
-        try:
-            self.telefon = stammdaten[13]
-        except IndexError:
-            self.telefon = ""
+        self.kuerzel = stammdaten.kuerzel
+        self.mann_frau = stammdaten.mann_frau
+        self.nachname = stammdaten.nachname
+        self.vorname = stammdaten.vorname
+        self.strasse = stammdaten.strasse
+        self.hausnummer = stammdaten.hausnummer
+        self.plz = stammdaten.plz
+        self.ort = stammdaten.ort
+        self.geburtsdatum = stammdaten.geburtsdatum
+        self.email = stammdaten.email
+        self.telefon = stammdaten.telefon
 
         self.create_pages(filepath)
 
@@ -6090,7 +10687,7 @@ class Therapy(DocumentPdf):
 
     def __init__(
             self,
-            stammdaten: list,
+            stammdaten: StammdatenRecord,
             filepath: str,
             price_from: str,
             price_to: str
@@ -6100,25 +10697,19 @@ class Therapy(DocumentPdf):
         self.set_margins(17, 17, 17)
 
         # prepare data
-        self.kuerzel = stammdaten[0]
-        self.mann_frau = stammdaten[1]
-        self.nachname = stammdaten[2]
-        self.vorname = stammdaten[3]
-        self.strasse = stammdaten[4]
-        self.hausnummer = stammdaten[5]
-        self.plz = stammdaten[6]
-        self.ort = stammdaten[7]
-        self.geburtsdatum = stammdaten[8]
+        self.kuerzel = stammdaten.kuerzel
+        self.mann_frau = stammdaten.mann_frau
+        self.nachname = stammdaten.nachname
+        self.vorname = stammdaten.vorname
+        self.strasse = stammdaten.strasse
+        self.hausnummer = stammdaten.hausnummer
+        self.plz = stammdaten.plz
+        self.ort = stammdaten.ort
+        self.geburtsdatum = stammdaten.geburtsdatum
         self.price_from = price_from
         self.price_to = price_to
-        try:
-            self.email = stammdaten[11]
-        except IndexError:
-            self.email = ""
-        try:
-            self.telefon = stammdaten[13]
-        except IndexError:
-            self.telefon = ""
+        self.email = stammdaten.email
+        self.telefon = stammdaten.telefon
 
         self.create_pages(filepath)
 